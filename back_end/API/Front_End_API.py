@@ -1,11 +1,18 @@
 # the purpose of this file is to act as an API for everything going to and coming from the front end of the application
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
 from functools import wraps
-from back_end.database.models import db, UserProfile, MachineDetail, SavedDashboard, MachineMetric
+from back_end.database.models import db, UserProfile, MachineDetail, SavedDashboard, MachineLatest, MachineDiskUsage
+from back_end.ELT.Machine_Data import resolve_machine_id, machine_id_cache
+from back_end.ELT.Dashboard import get_history
+from back_end.ELT.Live_Hub import live_hub, HubFull
+from back_end.ELT.Hypervisors import cached_hypervisor_aggregates
+from back_end.app.http_cache import conditional
 from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 import bcrypt
+import json
 import time
 
 # Create a Blueprint for the API
@@ -167,6 +174,7 @@ def profile_endpoint():
 
 @front_end_api.route('/api/front_end/admin/users', methods=['GET'])
 @admin_required
+@conditional('users')
 def list_all_users():
     """
     Admin-only endpoint to list all users and their admin status.
@@ -199,9 +207,38 @@ def admin_delete_user(user_id):
     return jsonify({"status": "success", "message": f"User '{user.Username}' deleted."}), 200
 # Machine related endpoints
 
+def machine_to_dict(machine):
+    return {
+        "Machine_ID": machine.Machine_ID,
+        "Hostname": machine.Hostname,
+        "Platform": machine.Platform,
+        "Is_Hypervisor": machine.Is_Hypervisor,
+        "Max_Cores": machine.Max_Cores,
+        "Max_Memory": machine.Max_Memory,
+        "Max_Disk": machine.Max_Disk,
+        "Owner_ID": machine.Owner_ID,
+        "Hosted_On_ID": machine.Hosted_On_ID
+    }
+
+def latest_to_dict(latest, disks):
+    return {
+        "Timestamp": latest.Timestamp,
+        "Current_CPU_Usage": latest.Current_CPU_Usage,
+        "Current_Memory_Usage": {
+            "total": latest.Memory_Total,
+            "used": latest.Memory_Used,
+            "percent": latest.Memory_Percent
+        },
+        "Current_Disk_Usage": [
+            {"mountpoint": d.Mountpoint, "total": d.Total, "used": d.Used, "percent": d.Percent}
+            for d in disks
+        ]
+    }
+
 # --- List All Machines ---
 @front_end_api.route('/api/front_end/machines/list', methods=['GET'])
 @jwt_required()
+@conditional('machines')
 def list_machines():
     claims = get_jwt()
     user_id = get_jwt_identity()
@@ -211,55 +248,222 @@ def list_machines():
     else:
         # Regular user: return only their machines
         machines = MachineDetail.query.filter_by(Owner_ID=user_id).all()
+    return jsonify([machine_to_dict(m) for m in machines])
+
+# --- Fleet Snapshot ---
+@front_end_api.route('/api/front_end/machines/snapshot', methods=['GET'])
+@jwt_required()
+def machines_snapshot():
+    """
+    Returns every machine visible to the caller together with its latest sample,
+    using one joined query. Applies the same owner/admin filtering as /machines/list.
+    Machines that have not reported yet have "Latest": null.
+    """
+    claims = get_jwt()
+    user_id = get_jwt_identity()
+    query = db.session.query(MachineDetail, MachineLatest, MachineDiskUsage).outerjoin(
+        MachineLatest, MachineLatest.Machine_ID == MachineDetail.Machine_ID
+    ).outerjoin(
+        MachineDiskUsage, MachineDiskUsage.Metrics_ID == MachineLatest.Metrics_ID
+    ).order_by(MachineDetail.Machine_ID)
+    if not claims.get("admin"):
+        query = query.filter(MachineDetail.Owner_ID == user_id)
+
+    # The join yields one row per mountpoint, so fold them back into one entry per machine
+    snapshot = {}
+    for machine, latest, disk in query:
+        entry = snapshot.get(machine.Machine_ID)
+        if entry is None:
+            entry = snapshot[machine.Machine_ID] = (machine, latest, [])
+        if disk is not None:
+            entry[2].append(disk)
     return jsonify([
-        {
-            "Machine_ID": m.Machine_ID,
-            "Hostname": m.Hostname,
-            "Platform": m.Platform,
-            "Is_Hypervisor": m.Is_Hypervisor,
-            "Max_Cores": m.Max_Cores,
-            "Max_Memory": m.Max_Memory,
-            "Max_Disk": m.Max_Disk,
-            "Owner_ID": m.Owner_ID,
-            "Hosted_On_ID": m.Hosted_On_ID
-        } for m in machines
+        dict(machine_to_dict(machine), Latest=latest_to_dict(latest, disks) if latest else None)
+        for machine, latest, disks in snapshot.values()
     ])
 
+# --- Fleet Disk Usage ---
+@front_end_api.route('/api/front_end/machines/disk_usage', methods=['GET'])
+@jwt_required()
+def machines_disk_usage():
+    """
+    Returns every mountpoint, on machines visible to the caller, whose latest sample is at or
+    above min_percent full (default 90). Filtered in SQL against machine_disk_usage.
+    """
+    claims = get_jwt()
+    user_id = get_jwt_identity()
+    try:
+        min_percent = float(request.args.get('min_percent', 90))
+    except ValueError:
+        return jsonify({"status": "error", "message": "min_percent must be a number"}), 400
+
+    query = db.session.query(MachineDetail.Machine_ID, MachineDetail.Hostname, MachineLatest.Timestamp, MachineDiskUsage).join(
+        MachineLatest, MachineLatest.Machine_ID == MachineDetail.Machine_ID
+    ).join(
+        MachineDiskUsage, MachineDiskUsage.Metrics_ID == MachineLatest.Metrics_ID
+    ).filter(MachineDiskUsage.Percent >= min_percent).order_by(MachineDiskUsage.Percent.desc())
+    if not claims.get("admin"):
+        query = query.filter(MachineDetail.Owner_ID == user_id)
+    return jsonify({"status": "success", "disks": [
+        {
+            "Machine_ID": machine_id,
+            "Hostname": hostname,
+            "Timestamp": timestamp,
+            "mountpoint": disk.Mountpoint,
+            "total": disk.Total,
+            "used": disk.Used,
+            "percent": disk.Percent
+        } for machine_id, hostname, timestamp, disk in query
+    ]})
+
+# --- Hypervisor Aggregates ---
+@front_end_api.route('/api/front_end/hypervisors', methods=['GET'])
+@jwt_required()
+def list_hypervisors():
+    """
+    Returns every hypervisor visible to the caller with its VM count, the hosted VMs' summed
+    allocation and their current summed usage. Applies the same owner/admin filtering as /machines/list.
+    """
+    claims = get_jwt()
+    owner_id = None if claims.get("admin") else get_jwt_identity()
+    return jsonify(cached_hypervisor_aggregates(owner_id=owner_id))
+
+@front_end_api.route('/api/front_end/hypervisors/<hostname>', methods=['GET'])
+@jwt_required()
+def get_hypervisor(hostname):
+    """
+    Returns one hypervisor's aggregates; 404 unless the caller is an admin or owns it.
+    """
+    claims = get_jwt()
+    owner_id = None if claims.get("admin") else get_jwt_identity()
+    machine_id = resolve_machine_id(hostname)
+    aggregates = cached_hypervisor_aggregates(hv_ids=[machine_id], owner_id=owner_id) if machine_id is not None else []
+    if not aggregates:
+        return jsonify({"status": "error", "message": "Hypervisor not found"}), 404
+    return jsonify(aggregates[0])
+
+# --- Live Metrics Stream ---
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@front_end_api.route('/api/front_end/machines/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def machines_stream():
+    """
+    Server-Sent Events stream of new samples, pushed from the ingest path as they are committed.
+    Query: hostnames=a,b,... (default: every machine visible to the caller). EventSource cannot set
+    headers, so the access token may also be passed as ?jwt=<token>.
+    Events: 'subscribed' (hostname -> Machine_ID map), 'metrics' (list of samples), and 'lagged'
+    (number of samples dropped because the connection fell behind).
+    """
+    claims = get_jwt()
+    user_id = get_jwt_identity()
+    hostnames = [h for h in request.args.get('hostnames', '').split(',') if h]
+    max_hostnames = current_app.config['LIVE_MAX_HOSTNAMES']
+    if len(hostnames) > max_hostnames:
+        return jsonify({"status": "error", "message": f"At most {max_hostnames} hostnames per stream"}), 400
+
+    query = db.session.query(MachineDetail.Hostname, MachineDetail.Machine_ID)
+    if hostnames:
+        query = query.filter(MachineDetail.Hostname.in_(hostnames))
+    if not claims.get("admin"):
+        query = query.filter(MachineDetail.Owner_ID == user_id)
+    machines = dict(query.all())
+    # An admin following everything also sees machines that register after subscribing
+    machine_ids = set(machines.values()) if hostnames or not claims.get("admin") else None
+
+    try:
+        subscription = live_hub.subscribe(machine_ids)
+    except HubFull as e:
+        response = jsonify({"status": "error", "message": str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    heartbeat = current_app.config['LIVE_HEARTBEAT_SECONDS']
+
+    # Runs after the request context (and its DB session) is gone; it only reads from the subscription
+    def generate():
+        try:
+            yield sse_message('subscribed', {"machines": machines})
+            while True:
+                events, dropped = subscription.drain(heartbeat)
+                if subscription.closed:
+                    return
+                if dropped:
+                    yield sse_message('lagged', {"dropped": dropped})
+                if events:
+                    yield sse_message('metrics', events)
+                elif not dropped:
+                    yield ": keepalive\n\n"
+        finally:
+            live_hub.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # stop reverse proxies from buffering the stream
+    })
+
 # --- Get Machine Info ---
 @front_end_api.route('/api/front_end/machine/info/<hostname>', methods=['GET'])
 @jwt_required()
+@conditional('machines')
 def get_machine_info(hostname):
-    machine = MachineDetail.query.filter_by(Hostname=hostname).first()
+    machine_id = resolve_machine_id(hostname)
+    machine = db.session.get(MachineDetail, machine_id) if machine_id is not None else None
     if not machine:
+        machine_id_cache.invalidate(hostname)
         return jsonify({"status": "error", "message": "Machine not found"}), 404
-    return jsonify({
-        "Machine_ID": machine.Machine_ID,
-        "Hostname": machine.Hostname,
-        "Platform": machine.Platform,
-        "Is_Hypervisor": machine.Is_Hypervisor,
-        "Max_Cores": machine.Max_Cores,
-        "Max_Memory": machine.Max_Memory,
-        "Max_Disk": machine.Max_Disk,
-        "Owner_ID": machine.Owner_ID,
-        "Hosted_On_ID": machine.Hosted_On_ID
-    })
+    return jsonify(machine_to_dict(machine))
 
 # --- Get Latest Metrics for a Machine ---
 @front_end_api.route('/api/front_end/machine/info/<hostname>/metrics', methods=['GET'])
 @jwt_required()
 def get_latest_metrics(hostname):
-    machine = MachineDetail.query.filter_by(Hostname=hostname).first()
-    if not machine:
+    machine_id = resolve_machine_id(hostname)
+    if machine_id is None:
         return jsonify({"status": "error", "message": "Machine not found"}), 404
-    metric = MachineMetric.query.filter_by(Machine_ID=machine.Machine_ID).order_by(MachineMetric.Timestamp.desc()).first()
+    # machine_latest is kept current by ingest, so this is a primary key lookup at any history size
+    metric = db.session.get(MachineLatest, machine_id)
     if not metric:
         return jsonify({"status": "error", "message": "No metrics found"}), 404
-    return jsonify({
-        "Timestamp": metric.Timestamp,
-        "Current_CPU_Usage": metric.Current_CPU_Usage,
-        "Current_Memory_Usage": json.loads(metric.Current_Memory_Usage),
-        "Current_Disk_Usage": json.loads(metric.Current_Disk_Usage)
-    })
+    disks = MachineDiskUsage.query.filter_by(Metrics_ID=metric.Metrics_ID).all()
+    return jsonify(latest_to_dict(metric, disks))
+
+# --- Get Metric History for a Machine ---
+
+def parse_query_time(value):
+    """
+    Parses an ISO-8601 query parameter into a naive UTC datetime. Raises ValueError if invalid.
+    """
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@front_end_api.route('/api/front_end/machine/info/<hostname>/history', methods=['GET'])
+@jwt_required()
+def get_metrics_history(hostname):
+    """
+    Returns CPU, memory and per-mountpoint disk series for a machine, downsampled on the server.
+    Query params: from, to (ISO-8601, default: the last hour) and points (max buckets per series).
+    Each bucket carries min/avg/max so short spikes survive downsampling. When rollups are enabled,
+    buckets of a minute or more are served from the coarsest rollup tier that fits.
+    """
+    machine_id = resolve_machine_id(hostname)
+    if machine_id is None:
+        return jsonify({"status": "error", "message": "Machine not found"}), 404
+
+    try:
+        end = parse_query_time(request.args['to']) if request.args.get('to') else datetime.utcnow()
+        start = parse_query_time(request.args['from']) if request.args.get('from') else end - timedelta(hours=1)
+        points = int(request.args.get('points', current_app.config['HISTORY_DEFAULT_POINTS']))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid from, to or points parameter"}), 400
+    if start >= end or points < 1:
+        return jsonify({"status": "error", "message": "'from' must be before 'to' and points must be positive"}), 400
+
+    points = min(points, current_app.config['HISTORY_MAX_POINTS'])
+    history = get_history(machine_id, start, end, points, use_rollups=current_app.config['ROLLUPS_ENABLED'])
+    return jsonify(dict(history, status="success", hostname=hostname))
 
 
 # Dashboard related endpoints
@@ -267,6 +471,7 @@ def get_latest_metrics(hostname):
 # --- Dashboard View Endpoint ---
 @front_end_api.route('/api/front_end/dashboard', methods=['GET', 'POST', 'PUT'])
 @jwt_required()
+@conditional('dashboards')
 def dashboard_view_endpoint():
     user_id = get_jwt_identity()
     user = UserProfile.query.get(user_id)
@@ -0,0 +1,36 @@
+# the purpose of this file is to expose internal operational endpoints, such as the Prometheus scrape target
+
+from functools import wraps
+import hmac
+from flask import Blueprint, Response, request, jsonify, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+
+internal_api = Blueprint('internal_api', __name__)
+
+def scrape_access_required(fn):
+    """
+    Restricts an operational endpoint to admins, or to a scraper sending 'Authorization: Bearer <token>'
+    with the configured METRICS_SCRAPE_TOKEN.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('METRICS_SCRAPE_TOKEN')
+        if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return fn(*args, **kwargs)
+        verify_jwt_in_request()
+        if not get_jwt().get("admin"):
+            return jsonify({"status": "error", "message": "Admin access required."}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+@internal_api.route('/api/internal/metrics', methods=['GET'])
+@scrape_access_required
+def prometheus_metrics():
+    """
+    Exposes request latency histograms, status counts and SQL statement metrics in the
+    Prometheus text format for scraping. Requires an admin JWT or the scrape token.
+    """
+    instrumentation = current_app.extensions.get('instrumentation')
+    if instrumentation is None:
+        return jsonify({"status": "error", "message": "Instrumentation is disabled"}), 404
+    return Response(instrumentation.render_prometheus(), mimetype='text/plain; version=0.0.4')
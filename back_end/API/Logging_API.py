@@ -1,7 +1,63 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from flask import Blueprint, request
+import queue
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from flask import Blueprint, request, jsonify, current_app
+
+# --- Asynchronous Logging ---
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the logging thread: when the queue is full the record
+    is dropped and counted instead.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+# Handlers and listener installed by the last setup_logging call, so a repeat call replaces them
+_installed_handlers = []
+_listener = None
+
+def _teardown_logging():
+    global _listener
+    root = logging.getLogger()
+    for handler in _installed_handlers:
+        root.removeHandler(handler)
+    if _listener is not None:
+        # Drains whatever is still queued through the file and console handlers
+        _listener.stop()
+        _listener = None
+    for handler in _installed_handlers:
+        handler.close()
+    _installed_handlers.clear()
+
+atexit.register(_teardown_logging)
+
+def logging_stats():
+    """
+    Returns the logging mode and, in queue mode, the queue depth and dropped record count.
+    """
+    queue_handler = next((h for h in _installed_handlers if isinstance(h, BoundedQueueHandler)), None)
+    if queue_handler is None:
+        return {"mode": "sync"}
+    return {
+        "mode": "queue",
+        "queue_depth": queue_handler.queue.qsize(),
+        "queue_capacity": queue_handler.queue.maxsize,
+        "dropped": queue_handler.dropped
+    }
 
 # --- Logging Setup Function ---
 def setup_logging(
@@ -10,8 +66,18 @@ def setup_logging(
     level=logging.INFO,
     max_bytes=5*1024*1024,  # 5MB per file
     backup_count=5,
-    console=True
+    console=True,
+    use_queue=False,
+    queue_size=10000
 ):
+    """
+    Configures the root logger with a rotating file handler and an optional console handler.
+    With use_queue, records are handed to a bounded queue and written by a background listener thread,
+    so request threads never wait on file I/O or rotation. Calling it again replaces the previous setup.
+    """
+    global _listener
+    _teardown_logging()
+
     # Ensure log directory exists
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
@@ -24,37 +90,45 @@ def setup_logging(
     file_handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count)
     file_handler.setLevel(level)
     file_handler.setFormatter(formatter)
-
-    # Get the root logger and set level
-    logger = logging.getLogger()
-    logger.setLevel(level)
-    logger.addHandler(file_handler)
+    handlers = [file_handler]
 
     # Optional: also log to console
     if console:
         console_handler = logging.StreamHandler()
         console_handler.setLevel(level)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
+
+    # Get the root logger and set level
+    logger = logging.getLogger()
+    logger.setLevel(level)
+
+    if use_queue:
+        queue_handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size))
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        _installed_handlers.extend([queue_handler] + handlers)
+        logger.addHandler(queue_handler)
+    else:
+        _installed_handlers.extend(handlers)
+        for handler in handlers:
+            logger.addHandler(handler)
 
     # Optional: suppress overly verbose loggers (e.g., Werkzeug in production)
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
-    logger.info("Logging is set up. Log file: %s", log_path)
+    logger.info("Logging is set up (%s mode). Log file: %s", "queue" if use_queue else "sync", log_path)
 
 # --- Blueprint for Frontend/Agent Logging ---
 logging_api = Blueprint('logging_api', __name__)
 
-@logging_api.route('/api/logging/frontend_log', methods=['POST'])
-def frontend_log():
+def write_frontend_log(entry):
     """
-    Receives log messages from agents or the frontend and writes them to the backend log.
-    Expects JSON with 'level', 'message', and optionally 'user'.
+    Writes one agent/frontend log entry ('level', 'message', optional 'user') to the backend log.
     """
-    data = request.get_json()
-    level = data.get('level', 'INFO').upper()
-    message = data.get('message', '')
-    user = data.get('user', 'anonymous')
+    level = str(entry.get('level', 'INFO')).upper()
+    message = entry.get('message', '')
+    user = entry.get('user', 'anonymous')
     logger = logging.getLogger('frontend')
 
     log_msg = f"[Frontend][{user}] {message}"
@@ -65,4 +139,39 @@ def frontend_log():
         logger.warning(log_msg)
     else:
         logger.info(log_msg)
-    return '', 204
\ No newline at end of file
+
+@logging_api.route('/api/logging/frontend_log', methods=['POST'])
+def frontend_log():
+    """
+    Receives log messages from agents or the frontend and writes them to the backend log.
+    Expects JSON with 'level', 'message', and optionally 'user'.
+    """
+    data = request.get_json()
+    write_frontend_log(data)
+    return '', 204
+
+@logging_api.route('/api/logging/frontend_log/batch', methods=['POST'])
+def frontend_log_batch():
+    """
+    Receives many log messages in one request, so agents can flush their buffered lines together.
+    Expects JSON with 'logs': a list of objects shaped like the frontend_log body.
+    """
+    data = request.get_json(silent=True) or {}
+    logs = data.get('logs')
+    if not isinstance(logs, list) or not all(isinstance(entry, dict) for entry in logs):
+        return jsonify({"status": "error", "message": "'logs' must be a list of objects"}), 400
+    if len(logs) > current_app.config['LOG_BATCH_MAX_RECORDS']:
+        return jsonify({
+            "status": "error",
+            "message": f"Batch exceeds {current_app.config['LOG_BATCH_MAX_RECORDS']} log records"
+        }), 413
+    for entry in logs:
+        write_frontend_log(entry)
+    return '', 204
+
+@logging_api.route('/api/logging/stats', methods=['GET'])
+def logging_pipeline_stats():
+    """
+    Returns the logging pipeline mode, queue depth and dropped record count.
+    """
+    return jsonify({"status": "success", "logging": logging_stats()})
@@ -1,10 +1,107 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app
+import gzip
 import json
-from back_end.database.models import db, MachineDetail, MachineMetric
+import zlib
+from sqlalchemy import select
+from core.wire_format import WIRE_MIMETYPE, WireFormatError, decode_samples
+from back_end.database.models import db, MachineDetail
+from back_end.ELT.Machine_Data import (
+    validate_sample, build_metric_row, resolve_machine_id, resolve_machine_ids, store_metrics, machine_id_cache,
+    machine_fingerprint
+)
+from back_end.ELT.Ingest_Queue import get_ingest_queue, IngestQueueFull
+from back_end.ELT.Live_Hub import live_hub
+from back_end.ELT.Hypervisors import hypervisor_cache
+from back_end.ELT.Topology import sync_hosted_vms
+from back_end.app.http_cache import mark_changed
+from back_end.API.Internal_API import scrape_access_required
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
 
 metrics_api = Blueprint('metrics_api', __name__)
 
+class PayloadError(Exception):
+    """Raised when a request body cannot be decoded. `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+BODY_READ_CHUNK = 64 * 1024
+
+def _read_limited(stream, limit):
+    # Reads a decompressing stream until EOF, failing once it yields more than `limit` bytes
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(BODY_READ_CHUNK)
+        if not chunk:
+            return b''.join(chunks)
+        size += len(chunk)
+        if size > limit:
+            raise PayloadError("Decompressed body too large", status=413)
+        chunks.append(chunk)
+
+def _read_body():
+    """
+    Returns the raw request body, decompressed when sent with 'Content-Encoding: gzip' or 'zstd'
+    (zstd only when the zstandard package is installed). Decompression stops at
+    METRICS_MAX_DECOMPRESSED_BYTES so a small body cannot expand without bound.
+    """
+    encoding = request.headers.get('Content-Encoding', 'identity').lower()
+    if encoding == 'identity':
+        return request.get_data()
+    limit = current_app.config['METRICS_MAX_DECOMPRESSED_BYTES']
+    if encoding == 'gzip':
+        try:
+            with gzip.GzipFile(fileobj=request.stream) as body:
+                return _read_limited(body, limit)
+        except (OSError, EOFError, zlib.error):
+            raise PayloadError("Invalid gzip body")
+    if encoding == 'zstd' and zstandard is not None:
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(request.stream) as body:
+                return _read_limited(body, limit)
+        except zstandard.ZstdError:
+            raise PayloadError("Invalid zstd body")
+    # 415 rather than 400: the samples may be fine, so a client can resend them in a supported encoding
+    raise PayloadError(f"Unsupported Content-Encoding '{encoding}'", status=415)
+
+def get_request_payload():
+    """
+    Returns the decoded body of an ingest request, supporting 'Content-Encoding: gzip' and 'zstd'.
+    An application/x-ndjson body (one sample per line, as streamed by the load generator) or a
+    binary application/x-metrics-samples body (see core/wire_format.py) is returned as a list of samples.
+    Raises PayloadError if the body cannot be decoded (status 415 for an unsupported Content-Type or
+    Content-Encoding).
+    """
+    if request.mimetype == WIRE_MIMETYPE:
+        try:
+            return decode_samples(_read_body())
+        except WireFormatError as e:
+            raise PayloadError(str(e))
+    if request.mimetype == NDJSON_MIMETYPE:
+        try:
+            return [json.loads(line) for line in _read_body().splitlines() if line.strip()]
+        except ValueError:
+            raise PayloadError("Invalid NDJSON line")
+    if not request.is_json:
+        raise PayloadError(f"Unsupported Content-Type '{request.mimetype}'", status=415)
+    if request.headers.get('Content-Encoding', 'identity').lower() == 'identity':
+        return request.get_json(silent=True)
+    try:
+        return json.loads(_read_body())
+    except ValueError:
+        raise PayloadError("Invalid JSON body")
+
+@metrics_api.errorhandler(PayloadError)
+def payload_error(error):
+    return jsonify({"status": "error", "message": str(error)}), error.status
+
 @metrics_api.route('/api/gathering/register_machine', methods=['POST'])
 def register_machine():
     data = request.get_json()
@@ -15,6 +112,25 @@ def register_machine():
     max_memory = data.get('max_memory')
     max_disk = data.get('max_disk')
     vm_list = data.get('vm_list', [])
+    if not isinstance(vm_list, list) or not all(isinstance(vm, str) for vm in vm_list):
+        return jsonify({"status": "error", "message": "vm_list must be a list of hostnames"}), 400
+
+    # Agents re-register on every start; identical facts are answered from one indexed read, with no write
+    fingerprint = machine_fingerprint(data)
+    known = db.session.execute(
+        select(MachineDetail.Machine_ID, MachineDetail.Register_Fingerprint).where(MachineDetail.Hostname == hostname)
+    ).first()
+    if known is not None and known.Register_Fingerprint == fingerprint:
+        machine_id_cache.set(hostname, known.Machine_ID)
+        # The fingerprint only covers this machine's own facts; another hypervisor may have claimed
+        # its VMs since, so the topology is still reconciled (which writes nothing when unchanged)
+        topology = None
+        if is_hypervisor:
+            topology = sync_hosted_vms(known.Machine_ID, vm_list)
+            if any(topology.values()):
+                mark_changed('machines')
+                db.session.commit()
+        return jsonify({"status": "success", "message": "Machine unchanged", "topology": topology}), 200
 
     # Find or create machine
     machine = MachineDetail.query.filter_by(Hostname=hostname).first()
@@ -25,7 +141,8 @@ def register_machine():
             Is_Hypervisor=is_hypervisor,
             Max_Cores=max_cores,
             Max_Memory=max_memory,
-            Max_Disk=max_disk
+            Max_Disk=max_disk,
+            Register_Fingerprint=fingerprint
         )
         db.session.add(machine)
     else:
@@ -34,46 +151,123 @@ def register_machine():
         machine.Max_Cores = max_cores
         machine.Max_Memory = max_memory
         machine.Max_Disk = max_disk
+        machine.Register_Fingerprint = fingerprint
 
-    db.session.commit()
+    db.session.flush()
 
-    # Optionally: Update VM-HV relationships here using vm_list
+    # Reconcile the VMs this hypervisor hosts in the same transaction
+    topology = None
+    if is_hypervisor:
+        topology = sync_hosted_vms(machine.Machine_ID, vm_list)
+        if any(topology.values()):
+            mark_changed('machines')
+
+    db.session.commit()
+    machine_id_cache.set(hostname, machine.Machine_ID)
 
-    return jsonify({"status": "success", "message": "Machine registered/updated"}), 201
+    return jsonify({"status": "success", "message": "Machine registered/updated", "topology": topology}), 201
 
 @metrics_api.route('/api/gathering/metrics', methods=['POST'])
 def receive_metrics():
-    data = request.get_json()
-    hostname = data.get('hostname')
-    timestamp_str = data.get('timestamp')
-    current_cpu_usage = data.get('current_cpu_usage')
-    current_memory_usage = data.get('current_memory_usage')
-    current_disk_usage = data.get('current_disk_usage')
-
-    # Convert timestamp string to a Python datetime object
-    if timestamp_str:
-        try:
-            # Handle both with and without 'Z'
-            if timestamp_str.endswith('Z'):
-                timestamp = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
-            else:
-                timestamp = datetime.fromisoformat(timestamp_str)
-        except Exception:
-            timestamp = datetime.utcnow()
-    else:
-        timestamp = datetime.utcnow()
+    data = get_request_payload()
+    if request.mimetype == WIRE_MIMETYPE:
+        # A binary body always carries a list; this endpoint takes exactly one sample
+        data = data[0] if len(data) == 1 else None
+    error = validate_sample(data)
+    if error:
+        return jsonify({"status": "error", "message": error}), 400
 
-    machine = MachineDetail.query.filter_by(Hostname=hostname).first()
-    if not machine:
+    machine_id = resolve_machine_id(data.get('hostname'))
+    if machine_id is None:
         return jsonify({"status": "error", "message": "Machine not registered"}), 400
 
-    metric = MachineMetric(
-        Machine_ID=machine.Machine_ID,
-        Timestamp=timestamp,
-        Current_CPU_Usage=current_cpu_usage,
-        Current_Memory_Usage=json.dumps(current_memory_usage),
-        Current_Disk_Usage=json.dumps(current_disk_usage)
+    row = build_metric_row(machine_id, data)
+    ingest_queue = get_ingest_queue()
+    if ingest_queue is None:
+        new = store_metrics([row])
+        return jsonify({
+            "status": "success",
+            "message": "Metrics received" if new else "Duplicate sample ignored",
+            "new": new,
+            "duplicates": 1 - new
+        }), 201
+
+    # Write-behind mode: the background writer commits the row with its next batch
+    try:
+        ingest_queue.put(row)
+    except IngestQueueFull:
+        response = jsonify({"status": "error", "message": "Ingest queue is full. Retry later."})
+        response.headers['Retry-After'] = str(current_app.config['INGEST_RETRY_AFTER'])
+        return response, 429
+    return jsonify({"status": "success", "message": "Metrics queued"}), 202
+
+@metrics_api.route('/api/gathering/metrics/batch', methods=['POST'])
+def receive_metrics_batch():
+    """
+    Accepts many samples, for any number of hostnames, in one request.
+    Expects JSON: { "samples": [ {<same fields as /api/gathering/metrics>}, ... ] } or a bare list,
+    NDJSON with one sample per line, or the binary wire format, optionally sent with
+    'Content-Encoding: gzip' or 'zstd'.
+    All hostnames are resolved in one query and the accepted samples are written with a
+    single bulk insert. Returns the accept/reject status of every sample by index, and how many
+    accepted samples were new rather than duplicates of already stored ones.
+    """
+    data = get_request_payload()
+    samples = data.get('samples') if isinstance(data, dict) else data
+    if not isinstance(samples, list):
+        return jsonify({"status": "error", "message": "Expected a list of samples"}), 400
+
+    max_samples = current_app.config['METRICS_BATCH_MAX_SAMPLES']
+    if len(samples) > max_samples:
+        return jsonify({
+            "status": "error",
+            "message": f"Batch too large. At most {max_samples} samples per request."
+        }), 413
+
+    # Malformed hostnames are left to validate_sample so they reject only their own item
+    machine_ids = resolve_machine_ids(
+        s.get('hostname') for s in samples if isinstance(s, dict) and isinstance(s.get('hostname'), str)
     )
-    db.session.add(metric)
-    db.session.commit()
-    return jsonify({"status": "success", "message": "Metrics received"}), 201
\ No newline at end of file
+
+    rows = []
+    results = []
+    for index, sample in enumerate(samples):
+        error = validate_sample(sample)
+        if not error and sample.get('hostname') not in machine_ids:
+            error = "Machine not registered"
+        if error:
+            results.append({"index": index, "status": "rejected", "message": error})
+            continue
+        rows.append(build_metric_row(machine_ids[sample['hostname']], sample))
+        results.append({"index": index, "status": "accepted"})
+
+    new = store_metrics(rows)
+    return jsonify({
+        "status": "success",
+        "accepted": len(rows),
+        "rejected": len(samples) - len(rows),
+        "new": new,
+        "duplicates": len(rows) - new,
+        "results": results
+    }), 201
+
+@metrics_api.route('/api/gathering/stats', methods=['GET'])
+@scrape_access_required
+def ingest_stats():
+    """
+    Returns ingest tuning counters: queue depth, batch sizes, flush latency and hostname cache hits.
+    'ingest_queue' is null when ingest runs in synchronous mode. Requires an admin JWT or the scrape token.
+    """
+    ingest_queue = get_ingest_queue()
+    compactor = current_app.extensions.get('rollup_compactor')
+    pruner = current_app.extensions.get('retention_pruner')
+    return jsonify({
+        "status": "success",
+        "ingest_mode": current_app.config['INGEST_MODE'],
+        "ingest_queue": ingest_queue.stats() if ingest_queue else None,
+        "machine_id_cache": machine_id_cache.stats(),
+        "rollups": compactor.stats() if compactor else None,
+        "retention": pruner.stats() if pruner else None,
+        "live_stream": live_hub.stats(),
+        "hypervisor_cache": hypervisor_cache.stats()
+    })
@@ -0,0 +1,154 @@
+# the purpose of this file is to hold the read-side queries that feed the dashboard graphs,
+# so that series are aggregated by the database rather than shipped raw to the browser
+
+from datetime import datetime, timedelta, timezone
+import math
+from sqlalchemy import select, func, cast, Integer
+from back_end.database.models import db, MachineMetric, MachineDiskUsage, MetricRollup
+
+# --- Time Bucketing ---
+
+def bucket_seconds_for(start, end, points):
+    """
+    Returns the whole number of seconds per bucket needed to fit [start, end) into at most `points` buckets.
+    """
+    span = max((end - start).total_seconds(), 1)
+    return max(1, math.ceil(span / points))
+
+def to_epoch(moment):
+    """
+    Converts a naive UTC datetime to whole epoch seconds.
+    """
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+def epoch_seconds(column):
+    """
+    SQL expression giving a timestamp column as whole epoch seconds.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return cast(func.extract('epoch', column), Integer)
+    return cast(func.strftime('%s', column), Integer)
+
+def _bucket_index(column, start, bucket_seconds):
+    """
+    SQL expression giving the zero-based bucket a timestamp column falls into.
+    """
+    return (epoch_seconds(column) - to_epoch(start)) // bucket_seconds
+
+def _series(rows, start, bucket_seconds):
+    return [
+        {
+            "timestamp": (start + timedelta(seconds=int(bucket) * bucket_seconds)).isoformat() + "Z",
+            "min": minimum,
+            "avg": average,
+            "max": maximum
+        }
+        for bucket, minimum, average, maximum in rows
+    ]
+
+# --- History Queries ---
+
+def pick_rollup_tier(bucket_seconds):
+    """
+    Returns the coarsest rollup resolution that is no wider than the requested bucket, or None.
+    """
+    tiers = [resolution for resolution in MetricRollup.RESOLUTIONS if resolution <= bucket_seconds]
+    return max(tiers) if tiers else None
+
+def get_history(machine_id, start, end, points, use_rollups=False):
+    """
+    Returns CPU, memory and per-mountpoint disk usage series for one machine over [start, end),
+    downsampled in SQL to at most `points` buckets of min/avg/max each.
+    With use_rollups, the coarsest rollup tier that fits the bucket width is read instead of raw rows.
+    `start` and `end` are naive UTC datetimes.
+    """
+    start = start.replace(microsecond=0)
+    bucket_seconds = bucket_seconds_for(start, end, points)
+    tier = pick_rollup_tier(bucket_seconds) if use_rollups else None
+
+    if tier:
+        # Align buckets to the tier so every rollup bucket falls into exactly one output bucket
+        start = datetime.utcfromtimestamp(to_epoch(start) // tier * tier)
+        bucket_seconds = math.ceil(bucket_seconds_for(start, end, points) / tier) * tier
+        series = _rollup_history(machine_id, start, end, bucket_seconds, tier)
+        source = f"rollup_{tier}s"
+    else:
+        series = _raw_history(machine_id, start, end, bucket_seconds)
+        source = "raw"
+
+    cpu, memory, disk = series
+    return {
+        "from": start.isoformat() + "Z",
+        "to": end.isoformat() + "Z",
+        "bucket_seconds": bucket_seconds,
+        "source": source,
+        "cpu": _series(cpu, start, bucket_seconds),
+        "memory": _series(memory, start, bucket_seconds),
+        "disk": {mount: _series(rows, start, bucket_seconds) for mount, rows in disk.items()}
+    }
+
+def _raw_history(machine_id, start, end, bucket_seconds):
+    bucket = _bucket_index(MachineMetric.Timestamp, start, bucket_seconds).label('bucket')
+    in_range = (
+        MachineMetric.Machine_ID == machine_id,
+        MachineMetric.Timestamp >= start,
+        MachineMetric.Timestamp < end
+    )
+
+    usage_rows = db.session.execute(
+        select(
+            bucket,
+            func.min(MachineMetric.Current_CPU_Usage),
+            func.avg(MachineMetric.Current_CPU_Usage),
+            func.max(MachineMetric.Current_CPU_Usage),
+            func.min(MachineMetric.Memory_Percent),
+            func.avg(MachineMetric.Memory_Percent),
+            func.max(MachineMetric.Memory_Percent)
+        ).where(*in_range).group_by(bucket).order_by(bucket)
+    ).all()
+
+    disk_rows = db.session.execute(
+        select(
+            MachineDiskUsage.Mountpoint,
+            bucket,
+            func.min(MachineDiskUsage.Percent),
+            func.avg(MachineDiskUsage.Percent),
+            func.max(MachineDiskUsage.Percent)
+        ).join(MachineDiskUsage, MachineDiskUsage.Metrics_ID == MachineMetric.Metrics_ID).where(*in_range)
+        .group_by(MachineDiskUsage.Mountpoint, bucket).order_by(MachineDiskUsage.Mountpoint, bucket)
+    ).all()
+
+    disk_series = {}
+    for row in disk_rows:
+        disk_series.setdefault(row[0], []).append(row[1:])
+
+    cpu = [row[0:4] for row in usage_rows]
+    memory = [(row[0],) + tuple(row[4:7]) for row in usage_rows]
+    return cpu, memory, disk_series
+
+def _rollup_history(machine_id, start, end, bucket_seconds, tier):
+    bucket = _bucket_index(MetricRollup.Bucket_Start, start, bucket_seconds).label('bucket')
+    rows = db.session.execute(
+        select(
+            MetricRollup.Metric,
+            bucket,
+            func.min(MetricRollup.Min_Value),
+            func.sum(MetricRollup.Avg_Value * MetricRollup.Sample_Count) / func.sum(MetricRollup.Sample_Count),
+            func.max(MetricRollup.Max_Value)
+        ).where(
+            MetricRollup.Machine_ID == machine_id,
+            MetricRollup.Resolution == tier,
+            MetricRollup.Bucket_Start >= start,
+            MetricRollup.Bucket_Start < end
+        ).group_by(MetricRollup.Metric, bucket).order_by(MetricRollup.Metric, bucket)
+    ).all()
+
+    cpu, memory, disk = [], [], {}
+    for metric, *values in rows:
+        if metric == 'cpu':
+            cpu.append(values)
+        elif metric == 'memory':
+            memory.append(values)
+        elif metric.startswith('disk:'):
+            disk.setdefault(metric[len('disk:'):], []).append(values)
+    return cpu, memory, disk
@@ -0,0 +1,148 @@
+# the purpose of this file is to compute per-hypervisor aggregates over the VMs they host (counts, allocated
+# capacity and current usage) in one grouped query, with a short-lived cache for pages that poll them
+
+from collections import OrderedDict
+import threading
+import time
+from sqlalchemy import select, func
+from sqlalchemy.orm import aliased
+from back_end.database.models import db, MachineDetail, MachineLatest, MachineDiskUsage
+
+# --- Aggregate Query ---
+
+def hypervisor_aggregates(hv_ids=None, owner_id=None):
+    """
+    Returns one dict per hypervisor with its hosted VM count, the VMs' summed allocated cores/memory/disk
+    and their summed usage from each VM's latest sample. Runs a single GROUP BY statement whatever
+    the number of VMs. Restrict to hv_ids and/or hypervisors owned by owner_id when given.
+    """
+    hv = MachineDetail
+    vm = aliased(MachineDetail)
+    disk_vm = aliased(MachineDetail)
+
+    # Disk usage of each hosted VM's latest sample, summed per VM first so its several mountpoint rows
+    # cannot multiply the CPU/memory sums of the outer query
+    disk_query = select(
+        MachineLatest.Machine_ID,
+        func.sum(MachineDiskUsage.Total).label('Disk_Total'),
+        func.sum(MachineDiskUsage.Used).label('Disk_Used')
+    ).join(
+        MachineDiskUsage, MachineDiskUsage.Metrics_ID == MachineLatest.Metrics_ID
+    ).join(
+        disk_vm, disk_vm.Machine_ID == MachineLatest.Machine_ID
+    ).group_by(MachineLatest.Machine_ID)
+    if hv_ids is not None:
+        disk_query = disk_query.where(disk_vm.Hosted_On_ID.in_(hv_ids))
+    else:
+        disk_query = disk_query.where(disk_vm.Hosted_On_ID.is_not(None))
+    disk = disk_query.subquery()
+
+    query = select(
+        hv.Machine_ID,
+        hv.Hostname,
+        hv.Max_Cores,
+        hv.Max_Memory,
+        hv.Max_Disk,
+        func.count(vm.Machine_ID).label('VM_Count'),
+        func.count(MachineLatest.Machine_ID).label('Reporting_VM_Count'),
+        func.sum(vm.Max_Cores).label('Allocated_Cores'),
+        func.sum(vm.Max_Memory).label('Allocated_Memory'),
+        func.sum(vm.Max_Disk).label('Allocated_Disk'),
+        # CPU usage is a percentage of the VM's own cores, so it is converted to cores before summing
+        func.sum(MachineLatest.Current_CPU_Usage * vm.Max_Cores / 100.0).label('CPU_Cores_Used'),
+        func.avg(MachineLatest.Current_CPU_Usage).label('CPU_Percent_Avg'),
+        func.sum(MachineLatest.Memory_Used).label('Memory_Used'),
+        func.sum(disk.c.Disk_Used).label('Disk_Used')
+    ).outerjoin(
+        vm, vm.Hosted_On_ID == hv.Machine_ID
+    ).outerjoin(
+        MachineLatest, MachineLatest.Machine_ID == vm.Machine_ID
+    ).outerjoin(
+        disk, disk.c.Machine_ID == vm.Machine_ID
+    ).where(hv.Is_Hypervisor.is_(True)).group_by(hv.Machine_ID).order_by(hv.Hostname)
+    if hv_ids is not None:
+        query = query.where(hv.Machine_ID.in_(hv_ids))
+    if owner_id is not None:
+        query = query.where(hv.Owner_ID == owner_id)
+
+    return [
+        {
+            "Machine_ID": row.Machine_ID,
+            "Hostname": row.Hostname,
+            "Max_Cores": row.Max_Cores,
+            "Max_Memory": row.Max_Memory,
+            "Max_Disk": row.Max_Disk,
+            "VM_Count": row.VM_Count,
+            "Reporting_VM_Count": row.Reporting_VM_Count,
+            "Allocated": {
+                "cores": row.Allocated_Cores or 0,
+                "memory": row.Allocated_Memory or 0,
+                "disk": row.Allocated_Disk or 0
+            },
+            "Usage": {
+                "cpu_cores": row.CPU_Cores_Used or 0.0,
+                "cpu_percent_avg": row.CPU_Percent_Avg,
+                "memory_used": row.Memory_Used or 0,
+                "disk_used": row.Disk_Used or 0
+            }
+        }
+        for row in db.session.execute(query)
+    ]
+
+# --- Short-TTL Cache ---
+
+class AggregateCache:
+    """
+    Small thread-safe cache whose entries expire `ttl` seconds after they are stored, so pages polling
+    the same hypervisors share one query per interval. A ttl of 0 disables caching.
+    """
+
+    def __init__(self, ttl=0.0, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+hypervisor_cache = AggregateCache()
+
+def cached_hypervisor_aggregates(hv_ids=None, owner_id=None):
+    """
+    hypervisor_aggregates() served through hypervisor_cache.
+    """
+    key = (tuple(sorted(hv_ids)) if hv_ids is not None else None, owner_id)
+    aggregates = hypervisor_cache.get(key)
+    if aggregates is None:
+        aggregates = hypervisor_aggregates(hv_ids, owner_id)
+        hypervisor_cache.set(key, aggregates)
+    return aggregates
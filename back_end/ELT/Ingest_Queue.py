@@ -0,0 +1,174 @@
+# the purpose of this file is to provide the optional write-behind ingest mode, where metrics
+# requests are answered as soon as the sample is queued and a background thread commits them in batches
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from flask import current_app
+from back_end.ELT.Machine_Data import store_metrics
+
+logger = logging.getLogger(__name__)
+
+class IngestQueueFull(Exception):
+    """Raised when a sample cannot be queued because the ingest queue is at capacity."""
+
+class IngestQueue:
+    """
+    Bounded in-process queue of metric rows drained by a single background writer thread.
+    The writer commits a batch once it holds batch_size rows or flush_interval seconds have passed.
+    """
+
+    def __init__(self, app, maxsize=10000, batch_size=500, flush_interval=1.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "written": 0,
+            "duplicates": 0,  # already-stored samples skipped by the insert
+            "dropped": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Stops the writer thread and commits whatever is still queued.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        remaining = self._drain(self._queue.qsize())
+        if remaining:
+            self._flush(remaining)
+
+    # --- Producer Side ---
+
+    def put(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise IngestQueueFull()
+        with self._lock:
+            self._stats["enqueued"] += 1
+
+    # --- Writer Thread ---
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+
+    def _collect_batch(self):
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self, limit):
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        written = duplicates = dropped = 0
+        try:
+            with self.app.app_context():
+                written = store_metrics(batch)
+            duplicates = len(batch) - written
+        except Exception:
+            dropped = len(batch)
+            logger.exception("Ingest writer failed to commit %d metric rows", len(batch))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            stats = self._stats
+            stats["written"] += written
+            stats["duplicates"] += duplicates
+            stats["dropped"] += dropped
+            stats["batches"] += 1
+            stats["last_batch_size"] = len(batch)
+            stats["max_batch_size"] = max(stats["max_batch_size"], len(batch))
+            stats["last_flush_ms"] = elapsed_ms
+            stats["max_flush_ms"] = max(stats["max_flush_ms"], elapsed_ms)
+            stats["total_flush_ms"] += elapsed_ms
+
+    # --- Introspection ---
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats["batches"]
+        total_flush_ms = stats.pop("total_flush_ms")
+        stats.update({
+            "depth": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "avg_batch_size": (stats["written"] + stats["duplicates"] + stats["dropped"]) / batches if batches else 0.0,
+            "avg_flush_ms": total_flush_ms / batches if batches else 0.0,
+            "running": bool(self._thread and self._thread.is_alive())
+        })
+        return stats
+
+def init_ingest_queue(app):
+    """
+    Creates and starts the ingest queue for an app when INGEST_MODE is 'queue'.
+    """
+    if app.config.get('INGEST_MODE') != 'queue':
+        return None
+    ingest_queue = IngestQueue(
+        app,
+        maxsize=app.config['INGEST_QUEUE_MAXSIZE'],
+        batch_size=app.config['INGEST_BATCH_SIZE'],
+        flush_interval=app.config['INGEST_FLUSH_INTERVAL']
+    )
+    ingest_queue.start()
+    atexit.register(ingest_queue.stop)
+    app.extensions['ingest_queue'] = ingest_queue
+    return ingest_queue
+
+def get_ingest_queue():
+    """
+    Returns the current app's ingest queue, or None when ingest is synchronous.
+    """
+    return current_app.extensions.get('ingest_queue')
@@ -0,0 +1,126 @@
+# the purpose of this file is to fan newly stored samples out to live subscribers (the SSE stream),
+# so one sample reaches every open dashboard without each of them re-querying the database
+
+import threading
+from collections import deque
+
+class HubFull(Exception):
+    """Raised when the hub already has its maximum number of subscribers."""
+
+class Subscription:
+    """
+    One live connection's view of the hub: the machines it follows and a bounded event buffer.
+    When the consumer falls behind, the oldest buffered events are dropped and counted, so a slow
+    connection can never hold more than max_events in memory or slow down ingest.
+    """
+
+    def __init__(self, machine_ids, max_events):
+        self.machine_ids = machine_ids  # None follows every machine
+        self.dropped = 0
+        self.closed = False
+        self._events = deque(maxlen=max_events)
+        self._condition = threading.Condition()
+
+    def wants(self, machine_id):
+        return self.machine_ids is None or machine_id in self.machine_ids
+
+    def offer(self, event):
+        with self._condition:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self._condition.notify()
+
+    def drain(self, timeout):
+        """
+        Waits up to `timeout` seconds for events. Returns (events, dropped since the last drain).
+        """
+        with self._condition:
+            if not self._events and not self.closed:
+                self._condition.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            dropped, self.dropped = self.dropped, 0
+            return events, dropped
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+
+class LiveHub:
+    """
+    In-process publish/subscribe hub. publish() is called by the ingest path after each commit and
+    only does a dict lookup and a bounded append per interested subscriber.
+    """
+
+    def __init__(self):
+        self.max_subscribers = 1000
+        self.max_events = 1000
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._published = 0
+        self._delivered = 0
+
+    def subscribe(self, machine_ids=None):
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                raise HubFull(f"Live stream limit of {self.max_subscribers} connections reached")
+            subscription = Subscription(machine_ids, self.max_events)
+            self._subscriptions.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def publish(self, events):
+        """
+        Delivers events (dicts with a 'machine_id') to every subscriber following that machine.
+        """
+        with self._lock:
+            self._published += len(events)
+            subscriptions = list(self._subscriptions)
+        delivered = 0
+        for subscription in subscriptions:
+            for event in events:
+                if subscription.wants(event["machine_id"]):
+                    subscription.offer(event)
+                    delivered += 1
+        with self._lock:
+            self._delivered += delivered
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscriptions),
+                "max_subscribers": self.max_subscribers,
+                "events_published": self._published,
+                "events_delivered": self._delivered
+            }
+
+live_hub = LiveHub()
+
+def metric_event(row):
+    """
+    Converts a stored metric row (as built by build_metric_row, with its Metrics_ID) to a live event.
+    """
+    return {
+        "machine_id": row["Machine_ID"],
+        "metrics_id": row["Metrics_ID"],
+        "timestamp": row["Timestamp"].isoformat() + "Z",
+        "current_cpu_usage": row["Current_CPU_Usage"],
+        "current_memory_usage": {
+            "total": row["Memory_Total"],
+            "used": row["Memory_Used"],
+            "percent": row["Memory_Percent"]
+        },
+        "current_disk_usage": [
+            {"mountpoint": d["Mountpoint"], "total": d["Total"], "used": d["Used"], "percent": d["Percent"]}
+            for d in row.get("disks", [])
+        ]
+    }
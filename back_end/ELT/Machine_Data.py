@@ -0,0 +1,300 @@
+# the purpose of this file is to hold the shared write path for machine metrics,
+# so that every ingest endpoint parses, resolves and stores samples the same way
+
+from collections import OrderedDict
+from datetime import datetime, timezone
+import hashlib
+import json
+import threading
+from sqlalchemy import insert, event
+from sqlalchemy.dialects import postgresql, sqlite
+from back_end.database.models import db, MachineDetail, MachineMetric, MachineLatest, MachineDiskUsage
+from back_end.ELT.Live_Hub import live_hub, metric_event
+
+# SQLite caps the number of bound parameters per statement, so large IN lists are split up
+HOSTNAME_LOOKUP_CHUNK = 500
+# Sample IDs are stored in a signed 64-bit column
+MAX_SAMPLE_ID = 2 ** 63 - 1
+
+# --- Sample Parsing ---
+
+def parse_timestamp(timestamp_str):
+    """
+    Converts an ISO-8601 timestamp string (with or without a trailing 'Z') to a naive UTC datetime.
+    Datetimes (as decoded from the binary wire format) are taken as-is.
+    Falls back to the current UTC time when the value is missing or invalid.
+    """
+    if isinstance(timestamp_str, datetime):
+        return timestamp_str
+    if timestamp_str:
+        try:
+            # Handle both with and without 'Z'
+            if timestamp_str.endswith('Z'):
+                timestamp = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
+            else:
+                timestamp = datetime.fromisoformat(timestamp_str)
+        except Exception:
+            return datetime.utcnow()
+        # Store everything as naive UTC so samples from different agents compare correctly
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp
+    return datetime.utcnow()
+
+def validate_sample(sample):
+    """
+    Returns an error message if a metrics sample is malformed, otherwise None.
+    """
+    if not isinstance(sample, dict):
+        return "Sample must be a JSON object"
+    hostname = sample.get('hostname')
+    if not hostname:
+        return "Missing hostname"
+    if not isinstance(hostname, str):
+        return "hostname must be a string"
+    cpu = sample.get('current_cpu_usage')
+    if cpu is not None and (isinstance(cpu, bool) or not isinstance(cpu, (int, float))):
+        return "current_cpu_usage must be a number"
+    sample_id = sample.get('sample_id')
+    if sample_id is not None and (isinstance(sample_id, bool) or not isinstance(sample_id, int)
+                                  or not 0 <= sample_id <= MAX_SAMPLE_ID):
+        return "sample_id must be a non-negative 63-bit integer"
+    memory = sample.get('current_memory_usage')
+    if memory is not None and not isinstance(memory, dict):
+        return "current_memory_usage must be an object"
+    disks = sample.get('current_disk_usage')
+    if disks is not None:
+        if not isinstance(disks, list) or not all(isinstance(d, dict) and d.get('mountpoint') for d in disks):
+            return "current_disk_usage must be a list of objects with a mountpoint"
+    return None
+
+def build_metric_row(machine_id, sample):
+    """
+    Converts a validated sample into a column dict ready for a bulk insert into machine_metrics.
+    Per-mountpoint disk usage is carried under "disks" and written to machine_disk_usage.
+    """
+    memory = sample.get('current_memory_usage') or {}
+    disks = {}
+    for disk in sample.get('current_disk_usage') or []:
+        # A mountpoint is reported once per sample; the last entry wins
+        disks[disk['mountpoint']] = {
+            "Mountpoint": disk['mountpoint'],
+            "Total": disk.get('total'),
+            "Used": disk.get('used'),
+            "Percent": disk.get('percent')
+        }
+    return {
+        "Machine_ID": machine_id,
+        "Timestamp": parse_timestamp(sample.get('timestamp')),
+        "Sample_ID": sample.get('sample_id'),
+        "Current_CPU_Usage": sample.get('current_cpu_usage'),
+        "Memory_Total": memory.get('total'),
+        "Memory_Used": memory.get('used'),
+        "Memory_Percent": memory.get('percent'),
+        "disks": list(disks.values())
+    }
+
+# --- Registration ---
+
+def machine_fingerprint(data):
+    """
+    Returns a SHA-256 hex digest of the static facts a register_machine payload sets, so a repeated
+    registration with identical facts can be recognised without comparing every column.
+    The VM list is order-insensitive.
+    """
+    facts = {
+        "hostname": data.get('hostname'),
+        "platform": data.get('platform'),
+        "is_hypervisor": bool(data.get('is_hypervisor', False)),
+        "max_cores": data.get('max_cores'),
+        "max_memory": data.get('max_memory'),
+        "max_disk": data.get('max_disk'),
+        "vm_list": sorted(set(data.get('vm_list') or []))
+    }
+    return hashlib.sha256(json.dumps(facts, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+# --- Hostname Resolution ---
+
+class MachineIdCache:
+    """
+    Bounded, thread-safe LRU map of hostname -> Machine_ID with hit/miss counters.
+    Only registered hostnames are cached, so a machine that registers later is never hidden.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, hostname):
+        with self._lock:
+            machine_id = self._entries.get(hostname)
+            if machine_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(hostname)
+            self.hits += 1
+            return machine_id
+
+    def set(self, hostname, machine_id):
+        with self._lock:
+            self._entries[hostname] = machine_id
+            self._entries.move_to_end(hostname)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, hostname=None):
+        """
+        Drops one hostname, or every entry when no hostname is given.
+        """
+        with self._lock:
+            if hostname is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(hostname, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+machine_id_cache = MachineIdCache()
+
+@event.listens_for(MachineDetail, 'after_delete')
+def _forget_deleted_machine(mapper, connection, machine):
+    machine_id_cache.invalidate(machine.Hostname)
+
+def resolve_machine_ids(hostnames):
+    """
+    Resolves many hostnames to Machine_IDs, serving what it can from the cache and
+    looking up the rest with one query per chunk of hostnames.
+    Returns a dict of hostname -> Machine_ID containing only registered machines.
+    """
+    unique = list(dict.fromkeys(h for h in hostnames if h))
+    resolved = {}
+    missing = []
+    for hostname in unique:
+        machine_id = machine_id_cache.get(hostname)
+        if machine_id is None:
+            missing.append(hostname)
+        else:
+            resolved[hostname] = machine_id
+    for start in range(0, len(missing), HOSTNAME_LOOKUP_CHUNK):
+        chunk = missing[start:start + HOSTNAME_LOOKUP_CHUNK]
+        rows = db.session.query(MachineDetail.Hostname, MachineDetail.Machine_ID).filter(
+            MachineDetail.Hostname.in_(chunk)
+        ).all()
+        for hostname, machine_id in rows:
+            machine_id_cache.set(hostname, machine_id)
+            resolved[hostname] = machine_id
+    return resolved
+
+def resolve_machine_id(hostname):
+    """
+    Returns the Machine_ID for one hostname, or None if it is not registered.
+    """
+    return resolve_machine_ids([hostname]).get(hostname)
+
+# --- Storage ---
+
+def upsert_insert(model):
+    """
+    Returns a dialect-specific INSERT that supports ON CONFLICT for the current engine.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+# machine_latest columns copied from the newest sample (besides the Machine_ID key)
+LATEST_COLUMNS = ["Metrics_ID", "Timestamp", "Current_CPU_Usage", "Memory_Total", "Memory_Used", "Memory_Percent"]
+
+def upsert_latest(rows):
+    """
+    Upserts the newest of the given rows for each machine into machine_latest.
+    Rows must already carry their Metrics_ID. An existing row is only replaced by a sample
+    that is at least as new, so late or replayed samples never move a machine's latest value backwards.
+    """
+    newest = {}
+    for row in rows:
+        current = newest.get(row["Machine_ID"])
+        if current is None or row["Timestamp"] >= current["Timestamp"]:
+            newest[row["Machine_ID"]] = row
+    if not newest:
+        return
+
+    columns = ["Machine_ID"] + LATEST_COLUMNS
+    stmt = upsert_insert(MachineLatest)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MachineLatest.Machine_ID],
+        set_={column: stmt.excluded[column] for column in LATEST_COLUMNS},
+        where=stmt.excluded.Timestamp >= MachineLatest.Timestamp
+    )
+    db.session.execute(stmt, [{column: row[column] for column in columns} for row in newest.values()])
+
+def _first_occurrences(rows):
+    """
+    Drops rows repeating the (Machine_ID, Timestamp) or (Machine_ID, Sample_ID) of an earlier row,
+    so every row left in a batch maps to at most one stored sample.
+    """
+    seen = set()
+    unique = []
+    for row in rows:
+        keys = [("ts", row["Machine_ID"], row["Timestamp"])]
+        if row.get("Sample_ID") is not None:
+            keys.append(("id", row["Machine_ID"], row["Sample_ID"]))
+        if any(key in seen for key in keys):
+            continue
+        seen.update(keys)
+        unique.append(row)
+    return unique
+
+def store_metrics(rows):
+    """
+    Writes metric rows and their per-mountpoint disk rows with one bulk insert each, updates
+    machine_latest, and commits everything as one transaction. Samples already stored (same machine
+    and timestamp, or same machine and sample_id) are skipped by the insert, so retried and replayed
+    uploads are harmless. Once committed, the new samples are published to live stream subscribers.
+    Returns the number of new samples written; the rest were duplicates.
+    """
+    if not rows:
+        return 0
+    rows = _first_occurrences(rows)
+    metric_rows = [{key: value for key, value in row.items() if key != "disks"} for row in rows]
+    try:
+        stmt = upsert_insert(MachineMetric).on_conflict_do_nothing().returning(
+            MachineMetric.Metrics_ID, MachineMetric.Machine_ID, MachineMetric.Timestamp
+        )
+        # Only inserted samples come back; they are matched to their rows by the unique key
+        inserted = {
+            (machine_id, timestamp): metric_id
+            for metric_id, machine_id, timestamp in db.session.execute(stmt, metric_rows)
+        }
+        new_rows = []
+        for row, metric_row in zip(rows, metric_rows):
+            metric_id = inserted.get((row["Machine_ID"], row["Timestamp"]))
+            if metric_id is not None:
+                metric_row["Metrics_ID"] = metric_id
+                new_rows.append((metric_id, row, metric_row))
+        disk_rows = [
+            dict(disk, Metrics_ID=metric_id)
+            for metric_id, row, _metric_row in new_rows
+            for disk in row.get("disks", [])
+        ]
+        if disk_rows:
+            db.session.execute(insert(MachineDiskUsage), disk_rows)
+        upsert_latest([metric_row for _metric_id, _row, metric_row in new_rows])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if new_rows and live_hub.has_subscribers():
+        live_hub.publish([metric_event(dict(row, Metrics_ID=metric_id)) for metric_id, row, _metric_row in new_rows])
+    return len(new_rows)
@@ -0,0 +1,197 @@
+# the purpose of this file is to enforce the metrics retention policy, deleting expired raw rows and
+# rollups in small indexed chunks so the SQLite write lock is never held long enough to stall ingest
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, tuple_
+from back_end.database.models import db, MachineMetric, MachineDiskUsage, MetricRollup, RollupState
+from back_end.ELT.Rollups import RAW_STATE
+
+logger = logging.getLogger(__name__)
+
+# --- Chunked Deletes ---
+
+def _expired_raw_ids(cutoff, chunk_size, compacted_through):
+    query = select(MachineMetric.Metrics_ID).where(MachineMetric.Timestamp < cutoff)
+    if compacted_through is not None:
+        # Never prune raw rows the rollup compactor has not folded in yet
+        query = query.where(MachineMetric.Metrics_ID <= compacted_through)
+    return query.limit(chunk_size)
+
+def _expired_rollup_keys(resolution, cutoff, chunk_size):
+    return select(
+        MetricRollup.Machine_ID, MetricRollup.Resolution, MetricRollup.Metric, MetricRollup.Bucket_Start
+    ).where(
+        MetricRollup.Resolution == resolution,
+        MetricRollup.Bucket_Start < cutoff
+    ).limit(chunk_size)
+
+def _delete_raw_chunk(cutoff, chunk_size, compacted_through):
+    ids = db.session.execute(_expired_raw_ids(cutoff, chunk_size, compacted_through)).scalars().all()
+    if not ids:
+        return 0
+    # Disk rows reference their sample, so they go first
+    db.session.execute(delete(MachineDiskUsage).where(MachineDiskUsage.Metrics_ID.in_(ids)))
+    return db.session.execute(delete(MachineMetric).where(MachineMetric.Metrics_ID.in_(ids))).rowcount
+
+def _delete_rollup_chunk(resolution, cutoff, chunk_size):
+    keys = _expired_rollup_keys(resolution, cutoff, chunk_size)
+    return db.session.execute(delete(MetricRollup).where(tuple_(
+        MetricRollup.Machine_ID, MetricRollup.Resolution, MetricRollup.Metric, MetricRollup.Bucket_Start
+    ).in_(keys))).rowcount
+
+# --- Background Pruner ---
+
+class RetentionPruner:
+    """
+    Background thread that prunes expired metrics every `interval` seconds.
+    Each chunk of at most chunk_size rows is deleted and committed on its own, followed by a
+    `pause` second sleep so queued ingest writers can take the lock in between.
+    """
+
+    def __init__(self, app, raw_days=7, rollup_days=None, chunk_size=1000, pause=0.05,
+                 interval=3600.0, respect_rollups=False):
+        self.app = app
+        self.raw_days = raw_days
+        self.rollup_days = rollup_days or {}
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.interval = interval
+        self.respect_rollups = respect_rollups
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "runs": 0,
+            "raw_rows_pruned": 0,
+            "rollup_rows_pruned": 0,
+            "last_run_rows": 0,
+            "last_run_seconds": 0.0,
+            "last_rows_per_second": 0.0,
+            "last_max_lock_ms": 0.0,
+            "max_lock_ms": 0.0,
+            "errors": 0
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="retention-pruner", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _prune(self, delete_chunk):
+        """
+        Repeats delete_chunk until it removes less than a full chunk.
+        Returns (rows deleted, longest single-chunk lock hold in ms).
+        """
+        total = 0
+        longest_ms = 0.0
+        while not self._stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                deleted = delete_chunk()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            longest_ms = max(longest_ms, (time.perf_counter() - started) * 1000)
+            total += deleted
+            if deleted < self.chunk_size:
+                break
+            # Yield the write lock to ingest before the next chunk
+            time.sleep(self.pause)
+        return total, longest_ms
+
+    def run_once(self, now=None):
+        """
+        Prunes everything currently past its retention period. Returns the number of rows deleted.
+        """
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        raw_pruned = rollup_pruned = 0
+        longest_ms = 0.0
+        try:
+            with self.app.app_context():
+                compacted_through = None
+                if self.respect_rollups:
+                    state = db.session.get(RollupState, RAW_STATE)
+                    compacted_through = state.Last_Metrics_ID if state else 0
+                raw_cutoff = now - timedelta(days=self.raw_days)
+                raw_pruned, chunk_ms = self._prune(
+                    lambda: _delete_raw_chunk(raw_cutoff, self.chunk_size, compacted_through)
+                )
+                longest_ms = max(longest_ms, chunk_ms)
+                for resolution, days in self.rollup_days.items():
+                    cutoff = now - timedelta(days=days)
+                    pruned, chunk_ms = self._prune(
+                        lambda: _delete_rollup_chunk(resolution, cutoff, self.chunk_size)
+                    )
+                    rollup_pruned += pruned
+                    longest_ms = max(longest_ms, chunk_ms)
+        except Exception:
+            logger.exception("Retention pruning failed")
+            with self._lock:
+                self._stats["errors"] += 1
+        elapsed = time.perf_counter() - started
+        total = raw_pruned + rollup_pruned
+        with self._lock:
+            stats = self._stats
+            stats["runs"] += 1
+            stats["raw_rows_pruned"] += raw_pruned
+            stats["rollup_rows_pruned"] += rollup_pruned
+            stats["last_run_rows"] = total
+            stats["last_run_seconds"] = elapsed
+            stats["last_rows_per_second"] = total / elapsed if elapsed else 0.0
+            stats["last_max_lock_ms"] = longest_ms
+            stats["max_lock_ms"] = max(stats["max_lock_ms"], longest_ms)
+        if total:
+            logger.info(
+                "Retention pruned %d raw and %d rollup rows in %.1fs (%.0f rows/s, longest lock %.1fms)",
+                raw_pruned, rollup_pruned, elapsed, total / elapsed if elapsed else 0.0, longest_ms
+            )
+        return total
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.run_once()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "raw_days": self.raw_days,
+            "rollup_days": self.rollup_days,
+            "chunk_size": self.chunk_size,
+            "running": bool(self._thread and self._thread.is_alive())
+        })
+        return stats
+
+def init_retention_pruner(app):
+    """
+    Creates and starts the retention pruner for an app when RETENTION_ENABLED is set.
+    """
+    if not app.config.get('RETENTION_ENABLED'):
+        return None
+    pruner = RetentionPruner(
+        app,
+        raw_days=app.config['RETENTION_RAW_DAYS'],
+        rollup_days=app.config['RETENTION_ROLLUP_DAYS'],
+        chunk_size=app.config['RETENTION_CHUNK_SIZE'],
+        pause=app.config['RETENTION_CHUNK_PAUSE'],
+        interval=app.config['RETENTION_INTERVAL'],
+        respect_rollups=app.config.get('ROLLUPS_ENABLED', False)
+    )
+    pruner.start()
+    atexit.register(pruner.stop)
+    app.extensions['retention_pruner'] = pruner
+    return pruner
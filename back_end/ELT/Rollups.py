@@ -0,0 +1,222 @@
+# the purpose of this file is to maintain the 1 minute / 5 minute / 1 hour rollups in metric_rollups,
+# folding newly ingested machine_metrics rows in incrementally from a background compactor thread
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import select, func
+from back_end.database.models import db, MachineMetric, MachineDiskUsage, MetricRollup, RollupState
+from back_end.ELT.Dashboard import epoch_seconds
+from back_end.ELT.Machine_Data import upsert_insert
+
+logger = logging.getLogger(__name__)
+
+RAW_STATE = 'machine_metrics'
+
+# --- Aggregation ---
+
+def _aggregate_raw(first_id, last_id, resolution):
+    """
+    Aggregates raw rows with first_id < Metrics_ID <= last_id into buckets of `resolution` seconds.
+    Returns {(Machine_ID, Metric, bucket_epoch): [min, sum, max, count]}.
+    """
+    bucket = (epoch_seconds(MachineMetric.Timestamp) // resolution * resolution).label('bucket')
+    in_delta = (MachineMetric.Metrics_ID > first_id, MachineMetric.Metrics_ID <= last_id)
+    buckets = {}
+
+    for metric, value in (
+        ('cpu', MachineMetric.Current_CPU_Usage),
+        ('memory', MachineMetric.Memory_Percent)
+    ):
+        rows = db.session.execute(
+            select(MachineMetric.Machine_ID, bucket,
+                   func.min(value), func.sum(value), func.max(value), func.count(value))
+            .where(*in_delta).group_by(MachineMetric.Machine_ID, bucket)
+        )
+        for machine_id, bucket_epoch, minimum, total, maximum, count in rows:
+            if count:
+                buckets[(machine_id, metric, bucket_epoch)] = [minimum, total, maximum, count]
+
+    value = MachineDiskUsage.Percent
+    rows = db.session.execute(
+        select(MachineMetric.Machine_ID, MachineDiskUsage.Mountpoint, bucket,
+               func.min(value), func.sum(value), func.max(value), func.count(value))
+        .join(MachineDiskUsage, MachineDiskUsage.Metrics_ID == MachineMetric.Metrics_ID).where(*in_delta)
+        .group_by(MachineMetric.Machine_ID, MachineDiskUsage.Mountpoint, bucket)
+    )
+    for machine_id, mount, bucket_epoch, minimum, total, maximum, count in rows:
+        if count:
+            buckets[(machine_id, f"disk:{mount}", bucket_epoch)] = [minimum, total, maximum, count]
+    return buckets
+
+def _coarsen(buckets, resolution):
+    """
+    Folds finer buckets into buckets of `resolution` seconds.
+    """
+    coarse = {}
+    for (machine_id, metric, bucket_epoch), (minimum, total, maximum, count) in buckets.items():
+        key = (machine_id, metric, bucket_epoch // resolution * resolution)
+        existing = coarse.get(key)
+        if existing is None:
+            coarse[key] = [minimum, total, maximum, count]
+        else:
+            existing[0] = min(existing[0], minimum)
+            existing[1] += total
+            existing[2] = max(existing[2], maximum)
+            existing[3] += count
+    return coarse
+
+def _merge_into_rollups(buckets, resolution):
+    """
+    Upserts buckets into metric_rollups, combining with any partial bucket already stored.
+    """
+    if not buckets:
+        return
+    rows = [
+        {
+            "Machine_ID": machine_id,
+            "Resolution": resolution,
+            "Metric": metric,
+            "Bucket_Start": datetime.utcfromtimestamp(bucket_epoch),
+            "Min_Value": minimum,
+            "Avg_Value": total / count,
+            "Max_Value": maximum,
+            "Sample_Count": count
+        }
+        for (machine_id, metric, bucket_epoch), (minimum, total, maximum, count) in buckets.items()
+    ]
+    least, greatest = (func.least, func.greatest) if db.engine.dialect.name == 'postgresql' else (func.min, func.max)
+    stmt = upsert_insert(MetricRollup)
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MetricRollup.Machine_ID, MetricRollup.Resolution, MetricRollup.Metric, MetricRollup.Bucket_Start],
+        set_={
+            "Min_Value": least(MetricRollup.Min_Value, new.Min_Value),
+            "Max_Value": greatest(MetricRollup.Max_Value, new.Max_Value),
+            "Avg_Value": (MetricRollup.Avg_Value * MetricRollup.Sample_Count + new.Avg_Value * new.Sample_Count)
+                         / (MetricRollup.Sample_Count + new.Sample_Count),
+            "Sample_Count": MetricRollup.Sample_Count + new.Sample_Count
+        }
+    )
+    db.session.execute(stmt, rows)
+
+def compact_once(max_rows=50000):
+    """
+    Folds up to max_rows raw rows added since the last run into every rollup tier,
+    and advances the high-water mark in the same transaction. Returns the number of raw rows covered.
+    """
+    state = db.session.get(RollupState, RAW_STATE)
+    if state is None:
+        state = RollupState(Name=RAW_STATE, Last_Metrics_ID=0)
+        db.session.add(state)
+    first_id = state.Last_Metrics_ID
+    newest_id = db.session.query(func.max(MachineMetric.Metrics_ID)).scalar() or 0
+    last_id = min(newest_id, first_id + max_rows)
+    if last_id <= first_id:
+        db.session.rollback()
+        return 0
+
+    try:
+        finest = MetricRollup.RESOLUTIONS[0]
+        buckets = _aggregate_raw(first_id, last_id, finest)
+        _merge_into_rollups(buckets, finest)
+        for resolution in MetricRollup.RESOLUTIONS[1:]:
+            _merge_into_rollups(_coarsen(buckets, resolution), resolution)
+        state.Last_Metrics_ID = last_id
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return last_id - first_id
+
+# --- Background Compactor ---
+
+class RollupCompactor:
+    """
+    Background thread that runs compact_once every `interval` seconds, catching up in
+    max_rows sized steps when it falls behind.
+    """
+
+    def __init__(self, app, interval=30.0, max_rows=50000):
+        self.app = app
+        self.interval = interval
+        self.max_rows = max_rows
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "runs": 0,
+            "rows_compacted": 0,
+            "last_run_ms": 0.0,
+            "max_run_ms": 0.0,
+            "errors": 0
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="rollup-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self):
+        """
+        Compacts until caught up. Returns the number of raw rows covered.
+        """
+        started = time.perf_counter()
+        total = 0
+        try:
+            with self.app.app_context():
+                while not self._stop_event.is_set():
+                    compacted = compact_once(self.max_rows)
+                    total += compacted
+                    if compacted < self.max_rows:
+                        break
+        except Exception:
+            logger.exception("Rollup compaction failed")
+            with self._lock:
+                self._stats["errors"] += 1
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["rows_compacted"] += total
+            self._stats["last_run_ms"] = elapsed_ms
+            self._stats["max_run_ms"] = max(self._stats["max_run_ms"], elapsed_ms)
+        return total
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.run_once()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "interval": self.interval,
+            "running": bool(self._thread and self._thread.is_alive())
+        })
+        return stats
+
+def init_rollup_compactor(app):
+    """
+    Creates and starts the rollup compactor for an app when ROLLUPS_ENABLED is set.
+    """
+    if not app.config.get('ROLLUPS_ENABLED'):
+        return None
+    compactor = RollupCompactor(
+        app,
+        interval=app.config['ROLLUP_COMPACT_INTERVAL'],
+        max_rows=app.config['ROLLUP_COMPACT_BATCH']
+    )
+    compactor.start()
+    atexit.register(compactor.stop)
+    app.extensions['rollup_compactor'] = compactor
+    return compactor
@@ -0,0 +1,53 @@
+# the purpose of this file is to keep the hypervisor -> VM topology (MachineDetail.Hosted_On_ID)
+# in line with the vm_list a hypervisor reports, using a handful of set-based statements
+
+from sqlalchemy import select, insert, update
+from back_end.database.models import db, MachineDetail
+from back_end.ELT.Machine_Data import HOSTNAME_LOOKUP_CHUNK
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), HOSTNAME_LOOKUP_CHUNK):
+        yield items[start:start + HOSTNAME_LOOKUP_CHUNK]
+
+def sync_hosted_vms(hv_id, vm_hostnames):
+    """
+    Makes the VMs hosted on hv_id exactly the machines named in vm_hostnames:
+    unknown hostnames get placeholder MachineDetail rows, listed VMs are pointed at the hypervisor,
+    and VMs no longer listed are detached. Nothing is written when the topology is unchanged.
+    Runs in the caller's transaction. Returns counts of created, attached and detached VMs.
+    """
+    hv_hostname = db.session.get(MachineDetail, hv_id).Hostname
+    desired = set(h for h in vm_hostnames if h and h != hv_hostname)
+
+    known = {}
+    for chunk in _chunks(desired):
+        rows = db.session.execute(
+            select(MachineDetail.Hostname, MachineDetail.Machine_ID, MachineDetail.Hosted_On_ID)
+            .where(MachineDetail.Hostname.in_(chunk))
+        )
+        known.update({hostname: (machine_id, hosted_on) for hostname, machine_id, hosted_on in rows})
+    currently_hosted = set(db.session.execute(
+        select(MachineDetail.Machine_ID).where(MachineDetail.Hosted_On_ID == hv_id)
+    ).scalars())
+
+    missing = sorted(desired - known.keys())
+    attach = [machine_id for machine_id, hosted_on in known.values() if hosted_on != hv_id]
+    detach = currently_hosted - {machine_id for machine_id, _hosted_on in known.values()}
+
+    if missing:
+        # Placeholders carry only the hostname until the VM's own agent registers it
+        db.session.execute(insert(MachineDetail), [
+            {"Hostname": hostname, "Is_Hypervisor": False, "Hosted_On_ID": hv_id} for hostname in missing
+        ])
+    for chunk in _chunks(attach):
+        db.session.execute(
+            update(MachineDetail).where(MachineDetail.Machine_ID.in_(chunk)).values(Hosted_On_ID=hv_id),
+            execution_options={"synchronize_session": False}
+        )
+    for chunk in _chunks(detach):
+        db.session.execute(
+            update(MachineDetail).where(MachineDetail.Machine_ID.in_(chunk)).values(Hosted_On_ID=None),
+            execution_options={"synchronize_session": False}
+        )
+    return {"created": len(missing), "attached": len(attach), "detached": len(detach)}
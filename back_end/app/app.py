@@ -2,17 +2,29 @@ from flask import Flask
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from back_end.database.models import db
+from back_end.database.migrations import run_migrations
+from back_end.database.profiles import configure_db_profile, init_db_profile
 from back_end.API.Logging_API import setup_logging, logging_api
 from core.config import Config
 from back_end.API.Front_End_API import front_end_api
 from back_end.API.Metrics_Gathering_API import metrics_api
+from back_end.API.Internal_API import internal_api
+from back_end.app.instrumentation import init_instrumentation
+from back_end.app.profiling import init_request_profiling, init_slow_query_log
+from back_end.app.http_cache import init_http_cache
+from back_end.ELT.Ingest_Queue import init_ingest_queue
+from back_end.ELT.Rollups import init_rollup_compactor
+from back_end.ELT.Retention import init_retention_pruner
+from back_end.ELT.Machine_Data import machine_id_cache
+from back_end.ELT.Live_Hub import live_hub
+from back_end.ELT.Hypervisors import hypervisor_cache
 
-def create_app():
-    # Set up logging before anything else
-    setup_logging()
-
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+
+    # Set up logging before anything else that might log
+    setup_logging(use_queue=app.config['LOG_QUEUE_ENABLED'], queue_size=app.config['LOG_QUEUE_SIZE'])
 
     # Enable CORS for all domains (development)
     CORS(app)
@@ -21,16 +33,37 @@ def create_app():
     # CORS(app, resources={r"/api/*": {"origins": "https://your-frontend-domain.com"}})
 
     # Initialise extensions
+    configure_db_profile(app)
     db.init_app(app)
+    init_db_profile(app)
+    init_instrumentation(app)
+    init_request_profiling(app)
+    init_slow_query_log(app)
+    init_http_cache(app)
     JWTManager(app)
 
     # Register blueprints
     app.register_blueprint(front_end_api)
     app.register_blueprint(metrics_api)
     app.register_blueprint(logging_api)
+    app.register_blueprint(internal_api)
 
     # Create tables immediately after app is created (Flask 3.x compatible)
     with app.app_context():
         db.create_all()
+        run_migrations()
+
+    machine_id_cache.maxsize = app.config['MACHINE_ID_CACHE_SIZE']
+    live_hub.max_subscribers = app.config['LIVE_MAX_SUBSCRIBERS']
+    live_hub.max_events = app.config['LIVE_QUEUE_SIZE']
+    hypervisor_cache.ttl = app.config['HV_AGGREGATE_CACHE_TTL']
+    hypervisor_cache.clear()
+
+    # Start the write-behind ingest writer if INGEST_MODE is 'queue'
+    init_ingest_queue(app)
+    # Start the rollup compactor if ROLLUPS_ENABLED is set
+    init_rollup_compactor(app)
+    # Start the retention pruner if RETENTION_ENABLED is set
+    init_retention_pruner(app)
 
     return app
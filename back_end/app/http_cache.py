@@ -0,0 +1,154 @@
+# the purpose of this file is to let polling clients skip unchanged responses: ETags derived from
+# in-process version counters (answered with 304 before the view or the DB is touched), and
+# gzip/brotli compression of large JSON responses
+
+import gzip
+import hashlib
+import threading
+import uuid
+from functools import wraps
+from flask import request, make_response
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from werkzeug.http import unquote_etag
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from back_end.database.models import db, UserProfile, MachineDetail, SavedDashboard
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# --- Version Counters ---
+
+class ResourceVersions:
+    """
+    Monotonic per-resource counters, bumped after every commit that changes the resource.
+    Counters live in this process; ETags also carry a per-process token so a restart never
+    revalidates a stale copy. Assumes a single backend process, like the other in-process caches.
+    """
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex[:8]
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def get(self, name):
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._versions)
+
+resource_versions = ResourceVersions()
+
+# Which counter each model's changes bump
+VERSIONED_MODELS = {
+    MachineDetail: 'machines',
+    UserProfile: 'users',
+    SavedDashboard: 'dashboards'
+}
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_resources(session, flush_context):
+    changed = session.info.setdefault('changed_resources', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        name = VERSIONED_MODELS.get(type(instance))
+        if name:
+            changed.add(name)
+
+def mark_changed(*names):
+    """
+    Flags resources changed by bulk/Core statements, which bypass the flush tracking above.
+    The counters are bumped when the current transaction commits.
+    """
+    db.session.info.setdefault('changed_resources', set()).update(names)
+
+@event.listens_for(Session, 'after_commit')
+def _bump_changed_resources(session):
+    # Bumped only once committed, so a reader can never pair the new version with old data
+    changed = session.info.pop('changed_resources', None)
+    if changed:
+        resource_versions.bump(*changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_resources(session):
+    session.info.pop('changed_resources', None)
+
+# --- Conditional GET ---
+
+def _etag_for(names):
+    claims = get_jwt()
+    parts = [resource_versions.token, str(get_jwt_identity()), str(bool(claims.get('admin'))), request.full_path]
+    parts += [f"{name}={resource_versions.get(name)}" for name in names]
+    # Weak, because the same version may be sent gzip- or brotli-encoded
+    return 'W/"' + hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:20] + '"'
+
+def conditional(*names):
+    """
+    View decorator for JWT-protected GET endpoints whose response only depends on the caller and the
+    resources in `names`. A request whose If-None-Match still matches gets 304 without running the view.
+    Must be applied below @jwt_required / @admin_required.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return fn(*args, **kwargs)
+            etag = _etag_for(names)
+            if request.if_none_match.contains_weak(unquote_etag(etag)[0]):
+                response = make_response('', 304)
+                response.headers['ETag'] = etag
+                return response
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                response.headers['ETag'] = etag
+                response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# --- Compression ---
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def init_http_cache(app):
+    """
+    Compresses JSON responses of at least COMPRESS_MIN_BYTES with brotli or gzip, whichever the
+    client accepts (brotli only when the package is installed). Streams are left alone.
+    """
+    min_bytes = app.config['COMPRESS_MIN_BYTES']
+    level = app.config['COMPRESS_LEVEL']
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed or response.mimetype != 'application/json'
+                or 'Content-Encoding' in response.headers or response.status_code < 200
+                or response.status_code in (204, 304)):
+            return response
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        if len(body) < min_bytes:
+            return response
+        encoding = _choose_encoding()
+        if encoding is None:
+            return response
+        if encoding == 'br':
+            body = brotli.compress(body, quality=min(level, 11))
+        else:
+            body = gzip.compress(body, compresslevel=level)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
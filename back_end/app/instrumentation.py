@@ -0,0 +1,177 @@
+# the purpose of this file is to measure where backend time goes: request latency histograms and status
+# counts per blueprint and route, plus SQL statement counts and time per request from engine events
+
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from back_end.database.models import db
+
+# Upper bounds in seconds; chosen to separate cached reads (~1ms) from heavy history/snapshot queries
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# --- Metric Types ---
+
+class Histogram:
+    """
+    Cumulative Prometheus-style histogram over fixed upper bounds. Callers hold the registry lock.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        labels = list(labels)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{_labels(labels, le=le)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {self.sum!r}')
+        lines.append(f'{name}_count{_labels(labels)} {self.count}')
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+# --- Registry ---
+
+class Instrumentation:
+    """
+    In-process metrics registry for one app. Request metrics are keyed by (blueprint, route, method),
+    where route is the URL rule rather than the concrete path, so label cardinality stays bounded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._sql_count = {}
+        self._sql_seconds = {}
+        self._status = {}
+        self._sql_totals = {"request": [0, 0.0], "background": [0, 0.0]}
+
+    def _histogram(self, store, key, buckets):
+        histogram = store.get(key)
+        if histogram is None:
+            histogram = store[key] = Histogram(buckets)
+        return histogram
+
+    def observe_request(self, key, status, seconds, sql_count, sql_seconds):
+        with self._lock:
+            self._histogram(self._latency, key, LATENCY_BUCKETS).observe(seconds)
+            self._histogram(self._sql_count, key, SQL_COUNT_BUCKETS).observe(sql_count)
+            self._histogram(self._sql_seconds, key, LATENCY_BUCKETS).observe(sql_seconds)
+            status_key = key + (str(status),)
+            self._status[status_key] = self._status.get(status_key, 0) + 1
+
+    def observe_sql(self, seconds):
+        """
+        Records one SQL statement. Inside a request it is also charged to that request.
+        """
+        context = "request" if has_request_context() else "background"
+        if context == "request":
+            g._sql_count = g.get('_sql_count', 0) + 1
+            g._sql_seconds = g.get('_sql_seconds', 0.0) + seconds
+        with self._lock:
+            totals = self._sql_totals[context]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def render_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition format (version 0.0.4).
+        """
+        key_labels = ('blueprint', 'route', 'method')
+        lines = []
+        with self._lock:
+            for name, help_text, store in (
+                ('http_request_duration_seconds', 'Request latency by blueprint and route.', self._latency),
+                ('http_request_sql_statements', 'SQL statements issued per request.', self._sql_count),
+                ('http_request_sql_duration_seconds', 'Time spent in SQL per request.', self._sql_seconds)
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for key, histogram in sorted(store.items()):
+                    lines.extend(histogram.render(name, zip(key_labels, key)))
+
+            lines.append('# HELP http_requests_total Requests by blueprint, route and status.')
+            lines.append('# TYPE http_requests_total counter')
+            for key, count in sorted(self._status.items()):
+                lines.append(f'http_requests_total{_labels(zip(key_labels + ("status",), key))} {count}')
+
+            lines.append('# HELP sql_statements_total SQL statements executed, inside requests or by background workers.')
+            lines.append('# TYPE sql_statements_total counter')
+            for context, (count, _seconds) in sorted(self._sql_totals.items()):
+                lines.append(f'sql_statements_total{_labels([("context", context)])} {count}')
+            lines.append('# HELP sql_duration_seconds_total Time spent executing SQL.')
+            lines.append('# TYPE sql_duration_seconds_total counter')
+            for context, (_count, seconds) in sorted(self._sql_totals.items()):
+                lines.append(f'sql_duration_seconds_total{_labels([("context", context)])} {seconds!r}')
+        return '\n'.join(lines) + '\n'
+
+# --- Hooks ---
+
+def _route_key():
+    rule = request.url_rule
+    # Unmatched paths (404s) share one label so scanners cannot blow up the series count
+    return (request.blueprint or 'app', rule.rule if rule else 'unmatched', request.method)
+
+def init_instrumentation(app):
+    """
+    Installs the request hooks and SQL engine listeners for an app when INSTRUMENTATION_ENABLED is set.
+    Must run after db.init_app(app).
+    """
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return None
+    instrumentation = Instrumentation()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        instrumentation.observe_sql(time.perf_counter() - conn.info['query_started'].pop())
+
+    def handle_error(context):
+        # A failed statement never reaches after_cursor_execute; drop its start time
+        if context.connection is not None and context.connection.info.get('query_started'):
+            context.connection.info['query_started'].pop()
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(db.engine, 'handle_error', handle_error)
+
+    @app.before_request
+    def start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get('_request_started')
+        if started is not None:
+            instrumentation.observe_request(
+                _route_key(),
+                response.status_code,
+                time.perf_counter() - started,
+                g.get('_sql_count', 0),
+                g.get('_sql_seconds', 0.0)
+            )
+        return response
+
+    app.extensions['instrumentation'] = instrumentation
+    return instrumentation
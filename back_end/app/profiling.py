@@ -0,0 +1,130 @@
+# the purpose of this file is to help explain slow requests in production: admins can have a single
+# request run under cProfile, and SQL statements over a time threshold are logged with their route
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import time
+from datetime import datetime
+from flask import g, request, has_request_context
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from sqlalchemy import event
+from back_end.database.models import db
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('slow_query')
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SUMMARY_LINES = 40
+
+# --- Request Profiling ---
+
+def _profile_requested():
+    return request.headers.get(PROFILE_HEADER) == '1' or request.args.get('profile') == '1'
+
+def _caller_is_admin():
+    try:
+        verify_jwt_in_request(optional=True)
+        return bool(get_jwt().get('admin'))
+    except Exception:
+        return False
+
+def _profile_name():
+    rule = request.url_rule.rule if request.url_rule else request.path
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', rule).strip('_') or 'root'
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{request.method}_{slug}"
+
+def _write_profile(profiler, directory):
+    """
+    Saves the raw .prof (for snakeviz / pstats) and a cumulative-time text summary. Returns the base name.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = _profile_name()
+    profiler.dump_stats(os.path.join(directory, name + '.prof'))
+    summary = io.StringIO()
+    summary.write(f"{request.method} {request.full_path}\n\n")
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_SUMMARY_LINES)
+    with open(os.path.join(directory, name + '.txt'), 'w') as f:
+        f.write(summary.getvalue())
+    return name
+
+def init_request_profiling(app):
+    """
+    Lets admin callers profile one request by sending 'X-Profile: 1' or '?profile=1'. The profile is
+    written under PROFILE_DIR and its name returned in the X-Profile-File response header.
+    Requests from anyone else are served normally and never profiled.
+    """
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    directory = app.config['PROFILE_DIR']
+
+    @app.before_request
+    def start_profiler():
+        if _profile_requested() and _caller_is_admin():
+            g._profiler = cProfile.Profile()
+            g._profiler.enable()
+
+    @app.after_request
+    def save_profile(response):
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            try:
+                response.headers['X-Profile-File'] = _write_profile(profiler, directory)
+            except OSError:
+                logger.exception("Could not write request profile")
+        return response
+
+    @app.teardown_request
+    def stop_profiler(error=None):
+        # Only still set when after_request never ran
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+# --- Slow Query Log ---
+
+def _redacted_parameters(parameters, executemany):
+    # Values can hold hostnames, usernames or password hashes, so only their types are logged
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return {key: f"<{type(value).__name__}>" for key, value in parameters.items()}
+    return [f"<{type(value).__name__}>" for value in parameters or ()]
+
+def init_slow_query_log(app):
+    """
+    Logs every SQL statement slower than SLOW_QUERY_THRESHOLD_MS to the 'slow_query' logger with the
+    route that issued it. A threshold of 0 turns the log off. Must run after db.init_app(app).
+    """
+    threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS', 0)
+    if threshold_ms <= 0:
+        return
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info['slow_query_started'].pop()) * 1000
+        if elapsed_ms < threshold_ms:
+            return
+        if has_request_context():
+            source = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+        else:
+            source = "background"
+        slow_query_logger.warning(
+            "Slow query %.1fms [%s]: %s params=%s",
+            elapsed_ms, source, ' '.join(statement.split()), _redacted_parameters(parameters, executemany)
+        )
+
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get('slow_query_started'):
+            context.connection.info['slow_query_started'].pop()
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(db.engine, 'handle_error', handle_error)
@@ -0,0 +1,224 @@
+# the purpose of this file is to time the key backend endpoints against a seeded database through the
+# Flask test client, and to compare each run with a stored JSON baseline to catch regressions
+#
+# Usage: python -m back_end.benchmarks.run_benchmarks --machines 5000 --samples-per-machine 10000
+# The benchmark database is dropped and re-seeded; never point --database-url at a real database.
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from core.config import Config
+from core.wire_format import WIRE_MIMETYPE, encode_samples
+from back_end.app.app import create_app
+from back_end.ELT.Machine_Data import machine_id_cache
+from back_end.benchmarks.seed import seed_database, dataset_size, bench_hostname
+
+DEFAULT_DATABASE_URL = 'sqlite:///benchmark.db'  # relative to the Flask instance folder
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_THRESHOLD = 1.25   # fail when a benchmark's p50 is more than 25% slower than the baseline...
+DEFAULT_MIN_DELTA_MS = 1.0  # ...and slower by at least this much, so sub-millisecond noise never fails a run
+
+# --- Benchmarks ---
+
+def _sample(hostname, index):
+    return {
+        "hostname": hostname,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "current_cpu_usage": float(index % 100),
+        "current_memory_usage": {"total": 16 * 1024 ** 3, "used": 8 * 1024 ** 3, "percent": 50.0},
+        "current_disk_usage": [{"mountpoint": "/", "total": 200 * 1024 ** 3, "used": 100 * 1024 ** 3, "percent": 50.0}]
+    }
+
+def build_benchmarks(machines):
+    """
+    Returns {name: callable(client, headers, iteration) -> response} for every timed endpoint.
+    Per-machine endpoints rotate through the seeded machines so no single row stays hot in cache.
+    """
+    def machine(iteration):
+        return bench_hostname(iteration * 7919 % machines)
+
+    def hypervisor(iteration):
+        # seed_database puts a hypervisor first in every group of vms_per_hv + 1 (default 10) machines
+        index = iteration * 7919 % machines
+        return bench_hostname(index - index % 10)
+
+    return {
+        "list_machines": lambda client, headers, i: client.get('/api/front_end/machines/list', headers=headers),
+        "machines_snapshot": lambda client, headers, i: client.get('/api/front_end/machines/snapshot', headers=headers),
+        "machine_info": lambda client, headers, i: client.get(
+            f'/api/front_end/machine/info/{machine(i)}', headers=headers),
+        "get_latest_metrics": lambda client, headers, i: client.get(
+            f'/api/front_end/machine/info/{machine(i)}/metrics', headers=headers),
+        # No from/to, so this times the endpoint's default one-hour window
+        "history_1h": lambda client, headers, i: client.get(
+            f'/api/front_end/machine/info/{machine(i)}/history', headers=headers),
+        "hypervisors": lambda client, headers, i: client.get('/api/front_end/hypervisors', headers=headers),
+        "hypervisor_detail": lambda client, headers, i: client.get(
+            f'/api/front_end/hypervisors/{hypervisor(i)}', headers=headers),
+        "ingest_single": lambda client, headers, i: client.post(
+            '/api/gathering/metrics', json=_sample(machine(i), i)),
+        "ingest_batch_100": lambda client, headers, i: client.post(
+            '/api/gathering/metrics/batch', json={"samples": [_sample(machine(i + n), n) for n in range(100)]}),
+        "ingest_batch_100_binary": lambda client, headers, i: client.post(
+            '/api/gathering/metrics/batch', data=encode_samples([_sample(machine(i + n), n) for n in range(100)]),
+            content_type=WIRE_MIMETYPE)
+    }
+
+def _percentile(sorted_values, pct):
+    rank = max(1, math.ceil(len(sorted_values) * pct / 100))
+    return sorted_values[rank - 1]
+
+def time_benchmark(run, client, headers, repeat, warmup=2):
+    """
+    Calls one benchmark warmup + repeat times and returns latency statistics in milliseconds.
+    Raises RuntimeError if the endpoint answers with an error status.
+    """
+    for i in range(warmup):
+        run(client, headers, i)
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        response = run(client, headers, warmup + i)
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Benchmark request failed with {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    timings.sort()
+    return {
+        "p50_ms": round(_percentile(timings, 50), 3),
+        "p95_ms": round(_percentile(timings, 95), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "min_ms": round(timings[0], 3),
+        "repeat": repeat
+    }
+
+# --- Baseline Comparison ---
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """
+    Compares each benchmark's p50 with the baseline. Returns a list of regression descriptions,
+    empty when nothing regressed. Baselines taken on a different dataset size are not comparable.
+    """
+    if baseline.get("dataset") != results.get("dataset"):
+        raise ValueError(f"Baseline dataset {baseline.get('dataset')} does not match this run's {results.get('dataset')}")
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            continue
+        ratio = current["p50_ms"] / previous["p50_ms"] if previous["p50_ms"] else float('inf')
+        if ratio > threshold and current["p50_ms"] - previous["p50_ms"] >= min_delta_ms:
+            regressions.append(
+                f"{name}: p50 {current['p50_ms']:.2f}ms vs baseline {previous['p50_ms']:.2f}ms ({ratio:.2f}x)"
+            )
+    return regressions
+
+# --- Runner ---
+
+def run_benchmarks(database_url=DEFAULT_DATABASE_URL, machines=5000, samples_per_machine=100, disks_per_sample=1,
+                   repeat=20, reseed=False, only=None):
+    """
+    Seeds the benchmark database unless it already holds the requested dataset, times every
+    benchmark and returns the results as a JSON-serialisable dict.
+    """
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        INGEST_MODE = 'sync'
+        ROLLUPS_ENABLED = False
+        RETENTION_ENABLED = False
+        HV_AGGREGATE_CACHE_TTL = 0  # time the aggregate query itself
+
+    # Hostname -> Machine_ID entries from another database must never leak into or out of a run
+    machine_id_cache.invalidate()
+    app = create_app(BenchmarkConfig)
+    app.config['TESTING'] = True
+    seed_seconds = None
+    try:
+        with app.app_context():
+            seeded_machines, seeded_samples = dataset_size()
+            # Ingest benchmarks add a few rows per run, so only a smaller or different dataset triggers a re-seed
+            if reseed or seeded_machines != machines or seeded_samples < machines * samples_per_machine:
+                seed_seconds = round(seed_database(machines, samples_per_machine, disks_per_sample), 1)
+            token = create_access_token(identity='1', additional_claims={'admin': True})
+        headers = {'Authorization': f'Bearer {token}'}
+
+        benchmarks = build_benchmarks(machines)
+        results = {}
+        with app.test_client() as client:
+            for name, run in benchmarks.items():
+                if only and name not in only:
+                    continue
+                results[name] = time_benchmark(run, client, headers, repeat)
+    finally:
+        machine_id_cache.invalidate()
+
+    return {
+        "dataset": {
+            "machines": machines,
+            "samples": machines * samples_per_machine,
+            "disks_per_sample": disks_per_sample
+        },
+        "seed_seconds": seed_seconds,
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "benchmarks": results
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the backend's key endpoints against a seeded database.")
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL,
+                        help="benchmark database; it is dropped and re-seeded when it holds too few rows")
+    parser.add_argument("--machines", type=int, default=5000)
+    parser.add_argument("--samples-per-machine", type=int, default=100)
+    parser.add_argument("--disks-per-sample", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per benchmark")
+    parser.add_argument("--reseed", action="store_true",
+                        help="re-seed even if the dataset already matches (ingest benchmarks add rows on every run)")
+    parser.add_argument("--only", nargs="*", help="run only these benchmarks")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed p50 slowdown ratio")
+    parser.add_argument("--output", help="also write this run's results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Runs the suite and prints the results. Returns 1 if any benchmark regressed against the baseline.
+    """
+    args = parse_args(argv)
+    results = run_benchmarks(
+        database_url=args.database_url,
+        machines=args.machines,
+        samples_per_machine=args.samples_per_machine,
+        disks_per_sample=args.disks_per_sample,
+        repeat=args.repeat,
+        reseed=args.reseed,
+        only=args.only
+    )
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(output + "\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one", file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline, threshold=args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
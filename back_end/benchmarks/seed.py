@@ -0,0 +1,110 @@
+# the purpose of this file is to fill a benchmark database with a configurable number of machines
+# and samples quickly, using chunked bulk inserts with the metrics indexes built once at the end
+
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from back_end.database.models import db, MachineDetail, MachineMetric, MachineDiskUsage
+from back_end.database.migrations import run_migrations
+
+logger = logging.getLogger(__name__)
+
+SEED_CHUNK = 50000  # rows per executemany
+MOUNTPOINTS = ("/", "/var", "/home", "/data")
+
+def bench_hostname(index):
+    return f"bench-{index + 1}"
+
+def dataset_size():
+    """
+    Returns (machines, samples) currently in the database.
+    """
+    return (
+        db.session.query(func.count(MachineDetail.Machine_ID)).scalar(),
+        db.session.query(func.count(MachineMetric.Metrics_ID)).scalar()
+    )
+
+def _insert_chunked(model, rows):
+    # Core executemany on the table skips the ORM's per-row bulk bookkeeping
+    connection = db.session.connection()
+    stmt = insert(model.__table__)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= SEED_CHUNK:
+            connection.execute(stmt, chunk)
+            chunk = []
+    if chunk:
+        connection.execute(stmt, chunk)
+
+def _machine_rows(machines, vms_per_hv):
+    for index in range(machines):
+        is_hypervisor = index % (vms_per_hv + 1) == 0
+        yield {
+            "Machine_ID": index + 1,
+            "Hostname": bench_hostname(index),
+            "Platform": "Linux-5.15.0",
+            "Is_Hypervisor": is_hypervisor,
+            "Max_Cores": 32 if is_hypervisor else 4,
+            "Max_Memory": (256 if is_hypervisor else 16) * 1024 ** 3,
+            "Max_Disk": (4096 if is_hypervisor else 200) * 1024 ** 3,
+            "Hosted_On_ID": None if is_hypervisor else index - index % (vms_per_hv + 1) + 1
+        }
+
+def _metric_rows(machines, samples_per_machine, interval, end, rng):
+    # Samples are written oldest first across all machines, the order live ingest produces them in
+    metrics_id = 0
+    start = end - timedelta(seconds=interval * samples_per_machine)
+    for step in range(samples_per_machine):
+        timestamp = start + timedelta(seconds=interval * step)
+        for machine_id in range(1, machines + 1):
+            metrics_id += 1
+            yield {
+                "Metrics_ID": metrics_id,
+                "Machine_ID": machine_id,
+                "Timestamp": timestamp,
+                "Current_CPU_Usage": rng.uniform(0, 100),
+                "Memory_Total": 16 * 1024 ** 3,
+                "Memory_Used": rng.randint(1, 16) * 1024 ** 3,
+                "Memory_Percent": rng.uniform(0, 100)
+            }
+
+def _disk_rows(total_samples, disks_per_sample, rng):
+    for metrics_id in range(1, total_samples + 1):
+        for mountpoint in MOUNTPOINTS[:disks_per_sample]:
+            yield {
+                "Metrics_ID": metrics_id,
+                "Mountpoint": mountpoint,
+                "Total": 200 * 1024 ** 3,
+                "Used": rng.randint(1, 200) * 1024 ** 3,
+                "Percent": rng.uniform(0, 100)
+            }
+
+def seed_database(machines, samples_per_machine, disks_per_sample=1, vms_per_hv=9, interval=60, seed=0):
+    """
+    Replaces the contents of the current app's database with `machines` machines (one HV followed by
+    vms_per_hv VMs) and samples_per_machine samples each, `interval` seconds apart and ending now.
+    Must be called inside an app context. Returns the number of seconds seeding took.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    metric_indexes = list(MachineMetric.__table__.indexes)
+
+    db.drop_all()
+    db.create_all()
+    # Building the indexes once after the load is much faster than maintaining them per row
+    for index in metric_indexes:
+        index.drop(bind=db.engine)
+
+    _insert_chunked(MachineDetail, _machine_rows(machines, vms_per_hv))
+    _insert_chunked(MachineMetric, _metric_rows(machines, samples_per_machine, interval, datetime.utcnow(), rng))
+    _insert_chunked(MachineDiskUsage, _disk_rows(machines * samples_per_machine, disks_per_sample, rng))
+    db.session.commit()
+
+    # Recreates the dropped indexes and backfills machine_latest
+    run_migrations()
+    elapsed = time.perf_counter() - started
+    logger.info("Seeded %d machines and %d samples in %.1fs", machines, machines * samples_per_machine, elapsed)
+    return elapsed
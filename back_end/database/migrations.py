@@ -0,0 +1,151 @@
+# the purpose of this file is to bring an existing database up to date with the models,
+# since db.create_all() only creates missing tables and never changes existing ones
+
+import logging
+from sqlalchemy import select, insert, func, and_, inspect, text
+from sqlalchemy.exc import OperationalError
+from back_end.database.models import db, MachineMetric, MachineLatest
+
+# Legacy rows are converted this many at a time so no single transaction holds the lock for long
+MIGRATION_CHUNK = 50000
+
+logger = logging.getLogger(__name__)
+
+def run_migrations():
+    """
+    Applies every schema/data migration step. Each step is idempotent, so this runs on every start.
+    Must be called inside an app context, after db.create_all().
+    """
+    _add_missing_columns()
+    _migrate_json_metric_columns()
+    _rebuild_legacy_machine_latest()
+    _dedupe_machine_metrics()
+    _create_missing_indexes()
+    _backfill_machine_latest()
+
+def _column_names(table):
+    return {column['name'] for column in inspect(db.engine).get_columns(table)}
+
+# Nullable columns added to existing tables after those tables were first released: (table, column, SQL type)
+ADDED_COLUMNS = [
+    ('machine_details', 'Register_Fingerprint', 'VARCHAR(64)'),
+    ('machine_metrics', 'Sample_ID', 'BIGINT')
+]
+
+def _add_missing_columns():
+    for table, name, sql_type in ADDED_COLUMNS:
+        if name not in _column_names(table):
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN "{name}" {sql_type}'))
+    db.session.commit()
+
+def _migrate_json_metric_columns():
+    """
+    One-time move of the legacy JSON text Current_Memory_Usage/Current_Disk_Usage columns on
+    machine_metrics into the typed Memory_* columns and machine_disk_usage rows. Uses SQLite's JSON1
+    functions, which is where the legacy columns ever existed. The legacy columns are dropped afterwards.
+    """
+    columns = _column_names('machine_metrics')
+    for name, sql_type in (('Memory_Total', 'BIGINT'), ('Memory_Used', 'BIGINT'), ('Memory_Percent', 'FLOAT')):
+        if name not in columns:
+            db.session.execute(text(f'ALTER TABLE machine_metrics ADD COLUMN "{name}" {sql_type}'))
+    db.session.commit()
+    if 'Current_Memory_Usage' not in columns:
+        return
+
+    highest = db.session.execute(text('SELECT MAX(Metrics_ID) FROM machine_metrics')).scalar() or 0
+    logger.info("Migrating JSON memory/disk columns for machine_metrics rows up to Metrics_ID %d", highest)
+    for low in range(0, highest, MIGRATION_CHUNK):
+        bounds = {"low": low, "high": low + MIGRATION_CHUNK}
+        db.session.execute(text(
+            "UPDATE machine_metrics SET "
+            "Memory_Total = json_extract(Current_Memory_Usage, '$.total'), "
+            "Memory_Used = json_extract(Current_Memory_Usage, '$.used'), "
+            "Memory_Percent = json_extract(Current_Memory_Usage, '$.percent') "
+            "WHERE Metrics_ID > :low AND Metrics_ID <= :high AND json_valid(Current_Memory_Usage)"
+        ), bounds)
+        db.session.execute(text(
+            "INSERT OR IGNORE INTO machine_disk_usage (Metrics_ID, Mountpoint, Total, Used, Percent) "
+            "SELECT m.Metrics_ID, json_extract(d.value, '$.mountpoint'), json_extract(d.value, '$.total'), "
+            "json_extract(d.value, '$.used'), json_extract(d.value, '$.percent') "
+            "FROM machine_metrics m, json_each(m.Current_Disk_Usage) d "
+            "WHERE m.Metrics_ID > :low AND m.Metrics_ID <= :high "
+            "AND json_valid(m.Current_Disk_Usage) AND json_type(m.Current_Disk_Usage) = 'array' "
+            "AND json_extract(d.value, '$.mountpoint') IS NOT NULL"
+        ), bounds)
+        db.session.commit()
+
+    try:
+        db.session.execute(text('ALTER TABLE machine_metrics DROP COLUMN Current_Memory_Usage'))
+        db.session.execute(text('ALTER TABLE machine_metrics DROP COLUMN Current_Disk_Usage'))
+        db.session.commit()
+    except OperationalError:
+        # SQLite before 3.35 cannot drop columns; empty them so they cost nothing and are not re-read
+        db.session.rollback()
+        db.session.execute(text(
+            'UPDATE machine_metrics SET Current_Memory_Usage = NULL, Current_Disk_Usage = NULL'
+        ))
+        db.session.commit()
+
+def _rebuild_legacy_machine_latest():
+    """
+    machine_latest is derived data, so a copy from before it carried Metrics_ID is dropped and
+    recreated; _backfill_machine_latest then refills it from machine_metrics.
+    """
+    if 'Metrics_ID' in _column_names('machine_latest'):
+        return
+    MachineLatest.__table__.drop(db.engine)
+    MachineLatest.__table__.create(db.engine)
+
+def _dedupe_machine_metrics():
+    """
+    Removes duplicate (Machine_ID, Timestamp) samples left by retried uploads before the unique index
+    that now prevents them is created, keeping the first stored copy. The old non-unique index it
+    replaces is dropped. machine_latest rows pointing at a removed copy are refilled by the backfill step.
+    """
+    index_names = {index['name'] for index in inspect(db.engine).get_indexes('machine_metrics')}
+    if 'uq_machine_metrics_machine_timestamp' in index_names:
+        return
+    has_duplicates = db.session.execute(text(
+        'SELECT 1 FROM machine_metrics GROUP BY Machine_ID, Timestamp HAVING COUNT(*) > 1 LIMIT 1'
+    )).first()
+    if has_duplicates:
+        duplicates = (
+            'SELECT Metrics_ID FROM machine_metrics WHERE Metrics_ID NOT IN '
+            '(SELECT MIN(Metrics_ID) FROM machine_metrics GROUP BY Machine_ID, Timestamp)'
+        )
+        db.session.execute(text(f'DELETE FROM machine_disk_usage WHERE Metrics_ID IN ({duplicates})'))
+        db.session.execute(text(f'DELETE FROM machine_latest WHERE Metrics_ID IN ({duplicates})'))
+        result = db.session.execute(text(f'DELETE FROM machine_metrics WHERE Metrics_ID IN ({duplicates})'))
+        logger.info("Removed %d duplicate machine_metrics rows", result.rowcount)
+    db.session.execute(text('DROP INDEX IF EXISTS ix_machine_metrics_machine_timestamp'))
+    db.session.commit()
+
+def _create_missing_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+def _backfill_machine_latest():
+    """
+    Fills machine_latest for machines that have metrics but no latest row yet
+    (e.g. databases created before machine_latest existed).
+    """
+    newest = select(
+        MachineMetric.Machine_ID,
+        func.max(MachineMetric.Timestamp).label('Timestamp')
+    ).where(
+        MachineMetric.Machine_ID.not_in(select(MachineLatest.Machine_ID))
+    ).group_by(MachineMetric.Machine_ID).subquery()
+
+    columns = ['Machine_ID', 'Metrics_ID', 'Timestamp', 'Current_CPU_Usage', 'Memory_Total', 'Memory_Used', 'Memory_Percent']
+    rows = select(*[MachineMetric.__table__.c[column] for column in columns]).join(newest, and_(
+        MachineMetric.Machine_ID == newest.c.Machine_ID,
+        MachineMetric.Timestamp == newest.c.Timestamp
+    ))
+
+    # Two samples can share the newest timestamp; keep whichever lands first
+    stmt = insert(MachineLatest).from_select(columns, rows).prefix_with('OR IGNORE', dialect='sqlite')
+    result = db.session.execute(stmt)
+    db.session.commit()
+    if result.rowcount:
+        logger.info("Backfilled machine_latest for %d machines", result.rowcount)
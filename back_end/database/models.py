@@ -13,6 +13,10 @@ class UserProfile(db.Model):
 
 class MachineDetail(db.Model):
     __tablename__ = 'machine_details'
+    __table_args__ = (
+        # Serves hosted-VM lookups: topology sync and per-hypervisor aggregates
+        db.Index('ix_machine_details_hosted_on', 'Hosted_On_ID'),
+    )
     Machine_ID = db.Column(db.Integer, primary_key=True)
     Hostname = db.Column(db.String, unique=True, nullable=False)
     Platform = db.Column(db.String)
@@ -20,6 +24,8 @@ class MachineDetail(db.Model):
     Max_Cores = db.Column(db.Integer)
     Max_Memory = db.Column(db.BigInteger)  # bytes
     Max_Disk = db.Column(db.BigInteger)    # bytes
+    # machine_fingerprint() of the last applied registration; a matching re-registration is a no-op
+    Register_Fingerprint = db.Column(db.String(64))
 
     Owner_ID = db.Column(db.Integer, db.ForeignKey('user_profiles.User_ID'))
     owner = db.relationship('UserProfile', back_populates='machines')
@@ -29,17 +35,78 @@ class MachineDetail(db.Model):
     hosted_on = db.relationship('MachineDetail', remote_side=[Machine_ID], backref='hosted_vms')
 
     metrics = db.relationship('MachineMetric', back_populates='machine', cascade="all, delete-orphan")
+    latest = db.relationship('MachineLatest', uselist=False, cascade="all, delete-orphan")
+    rollups = db.relationship('MetricRollup', cascade="all, delete-orphan")
 
 class MachineMetric(db.Model):
     __tablename__ = 'machine_metrics'
+    __table_args__ = (
+        # One sample per machine and timestamp, so retried or replayed uploads are ignored on insert;
+        # also serves per-machine time-range and latest-sample lookups
+        db.Index('uq_machine_metrics_machine_timestamp', 'Machine_ID', 'Timestamp', unique=True),
+        # Agents may tag samples with an ID; a sample ID is stored at most once per machine
+        db.Index('uq_machine_metrics_machine_sample', 'Machine_ID', 'Sample_ID', unique=True,
+                 sqlite_where=db.text('"Sample_ID" IS NOT NULL'), postgresql_where=db.text('"Sample_ID" IS NOT NULL')),
+        # Serves the retention pruner's oldest-first chunked deletes
+        db.Index('ix_machine_metrics_timestamp', 'Timestamp'),
+    )
     Metrics_ID = db.Column(db.Integer, primary_key=True)
     Machine_ID = db.Column(db.Integer, db.ForeignKey('machine_details.Machine_ID'))
     Timestamp = db.Column(db.DateTime, nullable=False)
+    Sample_ID = db.Column(db.BigInteger)  # optional, set by the sending agent
     Current_CPU_Usage = db.Column(db.Float)
-    Current_Memory_Usage = db.Column(db.Text)  # Store as JSON string
-    Current_Disk_Usage = db.Column(db.Text)    # Store as JSON string
+    Memory_Total = db.Column(db.BigInteger)  # bytes
+    Memory_Used = db.Column(db.BigInteger)   # bytes
+    Memory_Percent = db.Column(db.Float)
 
     machine = db.relationship('MachineDetail', back_populates='metrics')
+    disks = db.relationship('MachineDiskUsage', cascade="all, delete-orphan")
+
+class MachineDiskUsage(db.Model):
+    # Usage of one mountpoint within one metrics sample
+    __tablename__ = 'machine_disk_usage'
+    Metrics_ID = db.Column(db.Integer, db.ForeignKey('machine_metrics.Metrics_ID'), primary_key=True)
+    Mountpoint = db.Column(db.String, primary_key=True)
+    Total = db.Column(db.BigInteger)  # bytes
+    Used = db.Column(db.BigInteger)   # bytes
+    Percent = db.Column(db.Float)
+
+class MachineLatest(db.Model):
+    # One row per machine holding its newest sample, upserted by ingest in the same transaction.
+    # Disk usage for the sample is read from machine_disk_usage through Metrics_ID.
+    __tablename__ = 'machine_latest'
+    Machine_ID = db.Column(db.Integer, db.ForeignKey('machine_details.Machine_ID'), primary_key=True)
+    Metrics_ID = db.Column(db.Integer, nullable=False)
+    Timestamp = db.Column(db.DateTime, nullable=False)
+    Current_CPU_Usage = db.Column(db.Float)
+    Memory_Total = db.Column(db.BigInteger)  # bytes
+    Memory_Used = db.Column(db.BigInteger)   # bytes
+    Memory_Percent = db.Column(db.Float)
+
+
+class MetricRollup(db.Model):
+    # Min/avg/max/count of one metric for one machine over one time bucket, kept by the rollup compactor
+    __tablename__ = 'metric_rollups'
+    __table_args__ = (
+        # Serves the retention pruner's per-tier chunked deletes
+        db.Index('ix_metric_rollups_resolution_bucket', 'Resolution', 'Bucket_Start'),
+    )
+    RESOLUTIONS = (60, 300, 3600)  # bucket widths in seconds: 1 minute, 5 minutes, 1 hour
+
+    Machine_ID = db.Column(db.Integer, db.ForeignKey('machine_details.Machine_ID'), primary_key=True)
+    Resolution = db.Column(db.Integer, primary_key=True)
+    Metric = db.Column(db.String, primary_key=True)  # 'cpu', 'memory' or 'disk:<mountpoint>'
+    Bucket_Start = db.Column(db.DateTime, primary_key=True)
+    Min_Value = db.Column(db.Float, nullable=False)
+    Avg_Value = db.Column(db.Float, nullable=False)
+    Max_Value = db.Column(db.Float, nullable=False)
+    Sample_Count = db.Column(db.Integer, nullable=False)
+
+class RollupState(db.Model):
+    # High-water mark of the raw machine_metrics rows already folded into metric_rollups
+    __tablename__ = 'rollup_state'
+    Name = db.Column(db.String, primary_key=True)
+    Last_Metrics_ID = db.Column(db.Integer, nullable=False, default=0)
 
 
 class SavedDashboard(db.Model):
@@ -0,0 +1,83 @@
+# the purpose of this file is to apply the database tuning profile selected by DB_PROFILE:
+# SQLite pragmas on every new connection, explicit pool sizing, and a clear error when lock waits time out
+
+import logging
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from back_end.database.models import db
+
+logger = logging.getLogger(__name__)
+
+DB_PROFILES = ('default', 'production')
+
+def _is_file_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def configure_db_profile(app):
+    """
+    Sets SQLALCHEMY_ENGINE_OPTIONS for the selected profile. Must run before db.init_app(app).
+    """
+    profile = app.config.get('DB_PROFILE', 'default')
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{profile}'. Expected one of: {', '.join(DB_PROFILES)}")
+    if profile != 'production' or not _is_file_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.update({
+        "pool_size": app.config['DB_POOL_SIZE'],
+        "max_overflow": app.config['DB_MAX_OVERFLOW'],
+        "pool_timeout": app.config['DB_POOL_TIMEOUT'],
+        # sqlite3's own busy handler, in seconds; matches PRAGMA busy_timeout below
+        "connect_args": {"timeout": app.config['DB_LOCK_TIMEOUT_MS'] / 1000, "check_same_thread": False}
+    })
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+def init_db_profile(app):
+    """
+    Installs the per-connection pragmas for the selected profile and the lock/pool error handlers.
+    Must run after db.init_app(app) and before the first connection is opened.
+    """
+    if app.config.get('DB_PROFILE', 'default') == 'production' and _is_file_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        pragmas = dict(app.config['SQLITE_PRAGMAS'], busy_timeout=app.config['DB_LOCK_TIMEOUT_MS'])
+        with app.app_context():
+            event.listen(db.engine, 'connect', _pragma_setter(pragmas))
+        logger.info("Database profile 'production' active with pragmas: %s", pragmas)
+
+    lock_timeout_ms = app.config['DB_LOCK_TIMEOUT_MS']
+
+    @app.errorhandler(OperationalError)
+    def database_locked(error):
+        if 'database is locked' not in str(error.orig):
+            raise error
+        db.session.rollback()
+        logger.warning("Database lock wait exceeded %d ms: %s", lock_timeout_ms, error.statement)
+        response = jsonify({
+            "status": "error",
+            "message": f"Database is busy: lock wait exceeded {lock_timeout_ms} ms. Retry later."
+        })
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    @app.errorhandler(PoolTimeoutError)
+    def database_pool_exhausted(error):
+        logger.warning("Database connection pool exhausted: %s", error)
+        response = jsonify({
+            "status": "error",
+            "message": "Database connection pool exhausted. Retry later."
+        })
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+def _pragma_setter(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    return set_pragmas
@@ -0,0 +1,23 @@
+import pytest
+from back_end.benchmarks.run_benchmarks import run_benchmarks, compare_to_baseline
+
+def test_benchmark_suite_runs_on_seeded_database(tmp_path):
+    """Test that a tiny benchmark run seeds the database and times every endpoint without errors."""
+    results = run_benchmarks(
+        database_url=f"sqlite:///{tmp_path / 'benchmark.db'}", machines=20, samples_per_machine=5, repeat=2
+    )
+    assert results['dataset']['samples'] == 100
+    assert results['seed_seconds'] is not None
+    assert {'list_machines', 'get_latest_metrics', 'ingest_batch_100'} <= set(results['benchmarks'])
+    assert all(b['p50_ms'] > 0 for b in results['benchmarks'].values())
+
+def test_compare_to_baseline_flags_only_real_slowdowns():
+    """Test that only slowdowns past both the ratio and the absolute threshold count as regressions."""
+    dataset = {'machines': 1, 'samples': 1, 'disks_per_sample': 1}
+    baseline = {'dataset': dataset, 'benchmarks': {'fast': {'p50_ms': 0.2}, 'slow': {'p50_ms': 10.0}}}
+    results = {'dataset': dataset, 'benchmarks': {'fast': {'p50_ms': 0.5}, 'slow': {'p50_ms': 20.0}}}
+    regressions = compare_to_baseline(results, baseline, threshold=1.25, min_delta_ms=1.0)
+    assert len(regressions) == 1 and regressions[0].startswith('slow')
+
+    with pytest.raises(ValueError):
+        compare_to_baseline(dict(results, dataset={'machines': 2}), baseline)
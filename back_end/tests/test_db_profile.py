@@ -0,0 +1,42 @@
+import pytest
+from back_end.app.app import create_app
+from back_end.database.models import db
+from core.config import Config
+
+def test_production_profile_applies_pragmas(tmp_path):
+    """Test that the production profile switches SQLite to WAL with the configured busy timeout."""
+    class ProductionConfig(Config):
+        DB_PROFILE = 'production'
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'production.db'}"
+        DB_LOCK_TIMEOUT_MS = 1234
+
+    app = create_app(ProductionConfig)
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(db.text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert db.session.execute(db.text('PRAGMA busy_timeout')).scalar() == 1234
+        assert db.engine.pool.size() == ProductionConfig.DB_POOL_SIZE
+
+def test_unknown_profile_is_rejected():
+    """Test that a misspelled DB_PROFILE fails at startup instead of silently using defaults."""
+    class BadConfig(Config):
+        DB_PROFILE = 'prod'
+
+    with pytest.raises(ValueError):
+        create_app(BadConfig)
+
+def test_lock_timeout_returns_503():
+    """Test that a lock wait that times out is reported as a clear, retryable 503."""
+    import sqlite3
+    from sqlalchemy.exc import OperationalError
+
+    app = create_app()
+
+    @app.route('/api/test/locked')
+    def locked():
+        raise OperationalError('INSERT INTO machine_metrics ...', {}, sqlite3.OperationalError('database is locked'))
+
+    response = app.test_client().get('/api/test/locked')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert 'lock wait exceeded' in response.get_json()['message']
@@ -0,0 +1,81 @@
+import pytest
+from back_end.app.app import create_app
+from core.config import Config
+
+class RollupConfig(Config):
+    ROLLUPS_ENABLED = True
+    ROLLUP_COMPACT_INTERVAL = 3600
+
+@pytest.fixture
+def client():
+    """Fixture to provide a test client for the Flask app."""
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+@pytest.fixture
+def auth_headers(client):
+    from flask_jwt_extended import create_access_token
+    with client.application.app_context():
+        token = create_access_token(identity='1')
+    return {'Authorization': f'Bearer {token}'}
+
+def post_minute_of_samples(client, hostname):
+    client.post('/api/gathering/register_machine', json={'hostname': hostname, 'vm_list': []})
+    samples = [
+        {
+            'hostname': hostname,
+            'timestamp': f'2031-01-01T00:00:{second:02d}Z',
+            'current_cpu_usage': float(second),
+            'current_memory_usage': {'total': 100, 'used': second, 'percent': float(second)},
+            'current_disk_usage': [{'mountpoint': '/', 'total': 100, 'used': 10, 'percent': 10.0}]
+        }
+        for second in range(60)
+    ]
+    client.post('/api/gathering/metrics/batch', json={'samples': samples})
+
+def test_history_is_downsampled(client, auth_headers):
+    """Test that the history endpoint buckets samples into at most `points` min/avg/max values."""
+    post_minute_of_samples(client, 'history-vm')
+
+    response = client.get(
+        '/api/front_end/machine/info/history-vm/history?from=2031-01-01T00:00:00Z&to=2031-01-01T00:01:00Z&points=6',
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['bucket_seconds'] == 10
+    assert len(data['cpu']) == 6
+    assert data['cpu'][0]['min'] == 0.0 and data['cpu'][0]['max'] == 9.0
+    assert data['memory'][5]['avg'] == pytest.approx(54.5)
+    assert len(data['disk']['/']) == 6
+
+def test_history_rejects_bad_range(client, auth_headers):
+    """Test that a reversed time range is rejected."""
+    client.post('/api/gathering/register_machine', json={'hostname': 'history-vm', 'vm_list': []})
+    response = client.get(
+        '/api/front_end/machine/info/history-vm/history?from=2031-01-02T00:00:00Z&to=2031-01-01T00:00:00Z',
+        headers=auth_headers
+    )
+    assert response.status_code == 400
+
+def test_history_reads_rollups_for_wide_buckets(auth_headers):
+    """Test that hour-wide buckets are served from the compacted 1h rollup tier."""
+    app = create_app(RollupConfig)
+    app.config['TESTING'] = True
+    compactor = app.extensions['rollup_compactor']
+    with app.test_client() as client:
+        post_minute_of_samples(client, 'rollup-vm')
+        compactor.run_once()
+        response = client.get(
+            '/api/front_end/machine/info/rollup-vm/history?from=2031-01-01T00:00:00Z&to=2031-01-01T02:00:00Z&points=2',
+            headers=auth_headers
+        )
+    compactor.stop()
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['source'] == 'rollup_3600s'
+    assert data['cpu'][0]['min'] == 0.0 and data['cpu'][0]['max'] == 59.0
+    assert data['cpu'][0]['avg'] == pytest.approx(29.5)
+    assert data['disk']['/'][0]['max'] == 10.0
@@ -0,0 +1,77 @@
+import gzip
+import json
+import pytest
+from sqlalchemy import delete
+from flask_jwt_extended import create_access_token
+from back_end.app.app import create_app
+from back_end.database.models import db, MachineDetail
+from back_end.ELT.Machine_Data import machine_id_cache
+
+@pytest.fixture
+def app():
+    """Fixture to provide the Flask app."""
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def new_machine(app):
+    """Fixture providing a hostname that is not registered, removed again after the test."""
+    def remove():
+        with app.app_context():
+            db.session.execute(delete(MachineDetail).where(MachineDetail.Hostname.like('etag-new-vm%')))
+            db.session.commit()
+        machine_id_cache.invalidate()
+    remove()  # also clears rows left by earlier runs
+    yield 'etag-new-vm'
+    remove()
+
+def _headers(app, **extra):
+    with app.app_context():
+        token = create_access_token(identity='1', additional_claims={'admin': True})
+    return dict({'Authorization': f'Bearer {token}'}, **extra)
+
+def test_unchanged_machine_list_returns_304(app, new_machine):
+    """Test that a matching If-None-Match gets 304 until a new machine registers."""
+    client = app.test_client()
+    client.post('/api/gathering/register_machine', json={'hostname': 'test-vm', 'vm_list': []})
+    response = client.get('/api/front_end/machines/list', headers=_headers(app))
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get('/api/front_end/machines/list', headers=_headers(app, **{'If-None-Match': etag}))
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+    # A machine that is not registered yet, since re-registering identical facts changes nothing
+    client.post('/api/gathering/register_machine', json={'hostname': new_machine, 'vm_list': []})
+    response = client.get('/api/front_end/machines/list', headers=_headers(app, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_etag_differs_per_caller(app):
+    """Test that two callers never share an ETag, since their filtered lists can differ."""
+    client = app.test_client()
+    with app.app_context():
+        other = create_access_token(identity='2', additional_claims={'admin': False})
+    admin_etag = client.get('/api/front_end/machines/list', headers=_headers(app)).headers['ETag']
+    response = client.get('/api/front_end/machines/list', headers={
+        'Authorization': f'Bearer {other}', 'If-None-Match': admin_etag
+    })
+    assert response.status_code == 200
+
+def test_large_json_is_gzip_compressed():
+    """Test that large JSON responses are compressed when the client accepts gzip."""
+    from core.config import Config
+
+    class CompressEverythingConfig(Config):
+        COMPRESS_MIN_BYTES = 1
+
+    app = create_app(CompressEverythingConfig)
+    client = app.test_client()
+    client.post('/api/gathering/register_machine', json={'hostname': 'test-vm', 'vm_list': []})
+    response = client.get('/api/front_end/machines/list', headers=_headers(app, **{'Accept-Encoding': 'gzip'}))
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert isinstance(json.loads(gzip.decompress(response.get_data())), list)
+    assert 'Accept-Encoding' in response.headers['Vary']
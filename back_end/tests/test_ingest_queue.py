@@ -0,0 +1,63 @@
+import pytest
+from back_end.app.app import create_app
+from core.config import Config
+
+class QueueConfig(Config):
+    INGEST_MODE = 'queue'
+    INGEST_QUEUE_MAXSIZE = 1
+    METRICS_SCRAPE_TOKEN = 'test-scrape-token'
+
+SCRAPE_HEADERS = {'Authorization': 'Bearer test-scrape-token'}
+
+SAMPLE = {
+    'hostname': 'test-vm',
+    'timestamp': '2023-01-01T00:00:00Z',
+    'current_cpu_usage': 50.0,
+    'current_memory_usage': {'total': 8 * 1024*3, 'used': 4 * 1024*3, 'percent': 50.0},
+    'current_disk_usage': [{'mountpoint': '/', 'total': 100 * 1024*3, 'used': 50 * 1024*3, 'percent': 50.0}]
+}
+
+@pytest.fixture
+def client():
+    """Fixture to provide a test client for an app running in write-behind ingest mode."""
+    app = create_app(QueueConfig)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        client.post('/api/gathering/register_machine', json={
+            'hostname': 'test-vm',
+            'platform': 'Linux',
+            'is_hypervisor': False,
+            'max_cores': 4,
+            'max_memory': 8 * 1024**3,
+            'max_disk': 100 * 1024**3,
+            'vm_list': []
+        })
+        yield client
+    app.extensions['ingest_queue'].stop()
+
+def test_queued_metrics_are_written(client):
+    """Test that queued metrics return 202, are committed by the writer, and a re-sent sample is a duplicate."""
+    from datetime import datetime
+    # A fresh timestamp, so the sample is new in the shared test database on every run
+    sample = dict(SAMPLE, timestamp=datetime.utcnow().isoformat() + 'Z')
+    ingest_queue = client.application.extensions['ingest_queue']
+    response = client.post('/api/gathering/metrics', json=sample)
+    assert response.status_code == 202
+    ingest_queue.stop()
+    stats = client.get('/api/gathering/stats', headers=SCRAPE_HEADERS).get_json()['ingest_queue']
+    assert (stats['written'], stats['duplicates'], stats['dropped']) == (1, 0, 0)
+    assert stats['depth'] == 0
+
+    ingest_queue.start()
+    assert client.post('/api/gathering/metrics', json=sample).status_code == 202
+    ingest_queue.stop()
+    stats = client.get('/api/gathering/stats', headers=SCRAPE_HEADERS).get_json()['ingest_queue']
+    assert (stats['written'], stats['duplicates'], stats['dropped']) == (1, 1, 0)
+
+def test_full_queue_returns_429(client):
+    """Test that a full ingest queue answers 429 with Retry-After."""
+    client.application.extensions['ingest_queue'].stop()
+    assert client.post('/api/gathering/metrics', json=SAMPLE).status_code == 202
+    response = client.post('/api/gathering/metrics', json=SAMPLE)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
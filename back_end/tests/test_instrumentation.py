@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import delete
+from flask_jwt_extended import create_access_token
+from back_end.app.app import create_app
+from back_end.database.models import db, MachineDetail
+
+@pytest.fixture
+def client():
+    """Fixture to provide a test client for the Flask app."""
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+def _bearer(app, admin):
+    with app.app_context():
+        token = create_access_token(identity='1', additional_claims={'admin': admin})
+    return {'Authorization': f'Bearer {token}'}
+
+def test_internal_metrics_exposes_route_histograms(client):
+    """Test that request latency, status counts and SQL per request are exported in Prometheus format."""
+    with client.application.app_context():
+        db.session.execute(delete(MachineDetail).where(MachineDetail.Hostname == 'instrumented-vm'))
+        db.session.commit()
+    # The first registration writes the machine (201), the identical second one is answered as unchanged (200)
+    payload = {'hostname': 'instrumented-vm', 'vm_list': []}
+    assert client.post('/api/gathering/register_machine', json=payload).status_code == 201
+    assert client.post('/api/gathering/register_machine', json=payload).status_code == 200
+    client.get('/api/does-not-exist')
+    response = client.get('/api/internal/metrics', headers=_bearer(client.application, admin=True))
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    labels = 'blueprint="metrics_api",route="/api/gathering/register_machine",method="POST"'
+    assert f'http_request_duration_seconds_count{{{labels}}} 2' in body
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in body
+    assert f'http_requests_total{{{labels},status="201"}} 1' in body
+    assert f'http_requests_total{{{labels},status="200"}} 1' in body
+    assert 'route="unmatched"' in body
+    # Both registrations read the database, so each request must have been charged SQL
+    assert f'http_request_sql_statements_count{{{labels}}} 2' in body
+    assert f'http_request_sql_statements_bucket{{{labels},le="0"}} 0' in body
+
+def test_internal_metrics_disabled():
+    """Test that the metrics endpoint is unavailable when instrumentation is turned off."""
+    from core.config import Config
+
+    class NoInstrumentationConfig(Config):
+        INSTRUMENTATION_ENABLED = False
+
+    app = create_app(NoInstrumentationConfig)
+    response = app.test_client().get('/api/internal/metrics', headers=_bearer(app, admin=True))
+    assert response.status_code == 404
+
+def test_internal_endpoints_require_admin_or_scrape_token():
+    """Test that the metrics and stats endpoints refuse anonymous and non-admin callers but accept the scrape token."""
+    from core.config import Config
+
+    class ScrapeConfig(Config):
+        METRICS_SCRAPE_TOKEN = 'test-scrape-token'
+
+    app = create_app(ScrapeConfig)
+    client = app.test_client()
+    for path in ('/api/internal/metrics', '/api/gathering/stats'):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers=_bearer(app, admin=False)).status_code == 403
+        assert client.get(path, headers={'Authorization': 'Bearer test-scrape-token'}).status_code == 200
+        assert client.get(path, headers=_bearer(app, admin=True)).status_code == 200
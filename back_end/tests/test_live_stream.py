@@ -0,0 +1,52 @@
+import json
+import pytest
+from flask_jwt_extended import create_access_token
+from back_end.app.app import create_app
+from back_end.ELT.Live_Hub import Subscription, live_hub
+
+@pytest.fixture
+def app():
+    """Fixture to provide the Flask app."""
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+def _events(chunk):
+    text = chunk.decode() if isinstance(chunk, bytes) else chunk
+    event = next(line[len('event: '):] for line in text.splitlines() if line.startswith('event: '))
+    data = next(line[len('data: '):] for line in text.splitlines() if line.startswith('data: '))
+    return event, json.loads(data)
+
+def test_stream_pushes_new_samples(app):
+    """Test that a sample ingested after subscribing is pushed to the stream without another request."""
+    client = app.test_client()
+    client.post('/api/gathering/register_machine', json={'hostname': 'test-vm', 'vm_list': []})
+    with app.app_context():
+        token = create_access_token(identity='1', additional_claims={'admin': True})
+
+    response = client.get(f'/api/front_end/machines/stream?hostnames=test-vm&jwt={token}', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.iter_encoded()
+    event, data = _events(next(chunks))
+    assert event == 'subscribed'
+    machine_id = data['machines']['test-vm']
+
+    client.post('/api/gathering/metrics', json={'hostname': 'test-vm', 'current_cpu_usage': 12.5})
+    event, data = _events(next(chunks))
+    assert event == 'metrics'
+    assert data[-1]['machine_id'] == machine_id
+    assert data[-1]['current_cpu_usage'] == 12.5
+
+    subscribers = live_hub.stats()['subscribers']
+    response.close()
+    assert live_hub.stats()['subscribers'] == subscribers - 1
+
+def test_slow_subscriber_drops_oldest_events():
+    """Test that a subscriber that falls behind keeps only the newest events and counts the rest."""
+    subscription = Subscription(machine_ids={1}, max_events=2)
+    for n in range(5):
+        subscription.offer({'machine_id': 1, 'n': n})
+    events, dropped = subscription.drain(timeout=0)
+    assert [e['n'] for e in events] == [3, 4]
+    assert dropped == 3
@@ -23,4 +23,51 @@ def test_logging_endpoint_missing_message(client):
     response = client.post('/api/logging/frontend_log', json={
         'level': 'INFO'
     })
-    assert response.status_code in (204, 400)
\ No newline at end of file
+    assert response.status_code in (204, 400)
+
+def test_logging_batch_endpoint(client):
+    """Test that the batch logging endpoint accepts many lines and rejects a malformed body."""
+    response = client.post('/api/logging/frontend_log/batch', json={'logs': [
+        {'level': 'WARNING', 'message': 'first', 'user': 'test'},
+        {'level': 'ERROR', 'message': 'second', 'user': 'test'}
+    ]})
+    assert response.status_code == 204
+    response = client.post('/api/logging/frontend_log/batch', json={'logs': 'not a list'})
+    assert response.status_code == 400
+
+def test_queue_logging_mode(tmp_path):
+    """Test that queue mode writes through the background listener and repeated setup does not stack handlers."""
+    import logging
+    from core.config import Config
+    from back_end.API.Logging_API import setup_logging
+
+    class QueueLoggingConfig(Config):
+        LOG_QUEUE_ENABLED = True
+
+    app = create_app(QueueLoggingConfig)
+    client = app.test_client()
+    root_handlers = len(logging.getLogger().handlers)
+    create_app(QueueLoggingConfig)
+    assert len(logging.getLogger().handlers) == root_handlers
+
+    response = client.get('/api/logging/stats')
+    assert response.status_code == 200
+    stats = response.get_json()['logging']
+    assert stats['mode'] == 'queue'
+    assert stats['dropped'] == 0
+
+    setup_logging(log_dir=str(tmp_path), use_queue=True, console=False)
+    logging.getLogger('frontend').warning('queued line')
+    setup_logging()  # stopping the listener flushes the queue to the file
+    assert 'queued line' in (tmp_path / 'app.log').read_text()
+
+def test_queue_handler_drops_when_full():
+    """Test that a full log queue drops records instead of blocking the caller."""
+    import logging
+    import queue
+    from back_end.API.Logging_API import BoundedQueueHandler
+    handler = BoundedQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, 'line', None, None)
+    handler.emit(record)
+    handler.emit(record)
+    assert handler.dropped == 1
@@ -10,8 +10,30 @@ def client():
         yield client
 
 def test_register_machine(client):
-    """Test registering a machine (VM or HV) via the API."""
-    response = client.post('/api/gathering/register_machine', json={
+    """Test registering a machine (VM or HV) via the API: 201 the first time, 200 for identical facts."""
+    from sqlalchemy import delete
+    from back_end.database.models import db, MachineDetail
+    with client.application.app_context():
+        db.session.execute(delete(MachineDetail).where(MachineDetail.Hostname == 'register-test-vm'))
+        db.session.commit()
+    payload = {
+        'hostname': 'register-test-vm',
+        'platform': 'Linux',
+        'is_hypervisor': False,
+        'max_cores': 4,
+        'max_memory': 8 * 1024**3,
+        'max_disk': 100 * 1024**3,
+        'vm_list': []
+    }
+    response = client.post('/api/gathering/register_machine', json=payload)
+    assert response.status_code == 201
+    response = client.post('/api/gathering/register_machine', json=payload)
+    assert response.status_code == 200
+
+def test_machine_id_cache_serves_registered_hostnames(client):
+    """Test that ingest lookups for a registered machine are served from the hostname cache."""
+    from back_end.ELT.Machine_Data import machine_id_cache
+    client.post('/api/gathering/register_machine', json={
         'hostname': 'test-vm',
         'platform': 'Linux',
         'is_hypervisor': False,
@@ -20,4 +42,170 @@ def test_register_machine(client):
         'max_disk': 100 * 1024**3,
         'vm_list': []
     })
+    hits = machine_id_cache.stats()['hits']
+    client.post('/api/gathering/metrics', json={'hostname': 'test-vm', 'current_cpu_usage': 10.0})
+    assert machine_id_cache.stats()['hits'] == hits + 1
+
+def test_machine_id_cache_forgets_deleted_machines(client):
+    """Test that deleting a machine drops it from the hostname cache."""
+    from back_end.database.models import db, MachineDetail
+    from back_end.ELT.Machine_Data import machine_id_cache
+    client.post('/api/gathering/register_machine', json={'hostname': 'cache-delete-vm', 'vm_list': []})
+    with client.application.app_context():
+        machine = MachineDetail.query.filter_by(Hostname='cache-delete-vm').first()
+        db.session.delete(machine)
+        db.session.commit()
+    misses = machine_id_cache.stats()['misses']
+    response = client.post('/api/gathering/metrics', json={'hostname': 'cache-delete-vm'})
+    assert response.status_code == 400
+    assert machine_id_cache.stats()['misses'] == misses + 1
+
+def test_machines_snapshot_includes_latest_sample(client):
+    """Test that the fleet snapshot returns machine details joined with their latest sample."""
+    from flask_jwt_extended import create_access_token
+    client.post('/api/gathering/register_machine', json={'hostname': 'snapshot-vm', 'vm_list': []})
+    client.post('/api/gathering/metrics', json={
+        'hostname': 'snapshot-vm', 'current_cpu_usage': 42.0,
+        'current_memory_usage': {'total': 8, 'used': 4, 'percent': 50.0}, 'current_disk_usage': []
+    })
+    with client.application.app_context():
+        token = create_access_token(identity='1', additional_claims={'admin': True})
+    response = client.get('/api/front_end/machines/snapshot', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    machine = next(m for m in response.get_json() if m['Hostname'] == 'snapshot-vm')
+    assert machine['Latest']['Current_CPU_Usage'] == 42.0
+
+def test_machines_disk_usage_filters_in_sql(client):
+    """Test that the fleet disk-usage query returns only mountpoints at or above the threshold."""
+    from flask_jwt_extended import create_access_token
+    client.post('/api/gathering/register_machine', json={'hostname': 'full-disk-vm', 'vm_list': []})
+    client.post('/api/gathering/metrics', json={
+        'hostname': 'full-disk-vm', 'current_cpu_usage': 5.0,
+        'current_disk_usage': [
+            {'mountpoint': '/', 'total': 100, 'used': 97, 'percent': 97.0},
+            {'mountpoint': '/boot', 'total': 100, 'used': 10, 'percent': 10.0}
+        ]
+    })
+    with client.application.app_context():
+        token = create_access_token(identity='1', additional_claims={'admin': True})
+    response = client.get('/api/front_end/machines/disk_usage?min_percent=90',
+                          headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    mounts = [d['mountpoint'] for d in response.get_json()['disks'] if d['Hostname'] == 'full-disk-vm']
+    assert mounts == ['/']
+
+def test_register_hypervisor_syncs_hosted_vms(client):
+    """Test that a hypervisor's vm_list creates, attaches and detaches hosted VMs."""
+    from sqlalchemy import delete
+    from back_end.database.models import db, MachineDetail
+    with client.application.app_context():
+        db.session.execute(delete(MachineDetail).where(MachineDetail.Hostname.like('topo-%')))
+        db.session.commit()
+    client.post('/api/gathering/register_machine', json={'hostname': 'topo-vm-1', 'vm_list': []})
+
+    response = client.post('/api/gathering/register_machine', json={
+        'hostname': 'topo-hv', 'is_hypervisor': True, 'vm_list': ['topo-vm-1', 'topo-vm-2', 'topo-vm-3']
+    })
+    assert response.status_code == 201
+    assert response.get_json()['topology'] == {'created': 2, 'attached': 1, 'detached': 0}
+
+    response = client.post('/api/gathering/register_machine', json={
+        'hostname': 'topo-hv', 'is_hypervisor': True, 'vm_list': ['topo-vm-1', 'topo-vm-2', 'topo-vm-3']
+    })
+    assert response.status_code == 200
+
+    response = client.post('/api/gathering/register_machine', json={
+        'hostname': 'topo-hv', 'is_hypervisor': True, 'vm_list': ['topo-vm-1']
+    })
+    assert response.get_json()['topology'] == {'created': 0, 'attached': 0, 'detached': 2}
+    with client.application.app_context():
+        hv = MachineDetail.query.filter_by(Hostname='topo-hv').first()
+        assert [vm.Hostname for vm in hv.hosted_vms] == ['topo-vm-1']
+
+    response = client.post('/api/gathering/register_machine', json={'hostname': 'topo-hv', 'vm_list': 'topo-vm-1'})
+    assert response.status_code == 400
+
+def test_hypervisor_aggregates_sum_hosted_vms(client):
+    """Test that the hypervisor endpoint sums allocation and latest usage over its hosted VMs."""
+    from sqlalchemy import delete
+    from flask_jwt_extended import create_access_token
+    from back_end.database.models import db, MachineDetail
+    with client.application.app_context():
+        db.session.execute(delete(MachineDetail).where(MachineDetail.Hostname.like('agg-%')))
+        db.session.commit()
+    for hostname, cpu in (('agg-vm-1', 50.0), ('agg-vm-2', 25.0)):
+        client.post('/api/gathering/register_machine', json={
+            'hostname': hostname, 'max_cores': 4, 'max_memory': 1000, 'max_disk': 5000, 'vm_list': []
+        })
+        client.post('/api/gathering/metrics', json={
+            'hostname': hostname, 'current_cpu_usage': cpu,
+            'current_memory_usage': {'total': 1000, 'used': 400, 'percent': 40.0},
+            'current_disk_usage': [
+                {'mountpoint': '/', 'total': 4000, 'used': 1000, 'percent': 25.0},
+                {'mountpoint': '/data', 'total': 1000, 'used': 500, 'percent': 50.0}
+            ]
+        })
+    client.post('/api/gathering/register_machine', json={
+        'hostname': 'agg-hv', 'is_hypervisor': True, 'vm_list': ['agg-vm-1', 'agg-vm-2', 'agg-vm-3']
+    })
+    with client.application.app_context():
+        token = create_access_token(identity='1', additional_claims={'admin': True})
+
+    response = client.get('/api/front_end/hypervisors/agg-hv', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    hv = response.get_json()
+    assert hv['VM_Count'] == 3
+    assert hv['Reporting_VM_Count'] == 2
+    assert hv['Allocated'] == {'cores': 8, 'memory': 2000, 'disk': 10000}
+    assert hv['Usage']['cpu_cores'] == 3.0
+    assert hv['Usage']['memory_used'] == 800
+    assert hv['Usage']['disk_used'] == 3000
+
+    response = client.get('/api/front_end/hypervisors', headers={'Authorization': f'Bearer {token}'})
+    assert 'agg-hv' in [h['Hostname'] for h in response.get_json()]
+    response = client.get('/api/front_end/hypervisors/agg-vm-1', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 404
+
+    # agg-hv has no owner, so a regular user must not see its aggregates
+    with client.application.app_context():
+        user_token = create_access_token(identity='2', additional_claims={'admin': False})
+    response = client.get('/api/front_end/hypervisors/agg-hv', headers={'Authorization': f'Bearer {user_token}'})
+    assert response.status_code == 404
+
+def test_register_machine_unchanged_facts_skip_the_write(client):
+    """Test that re-registering identical facts answers 200 'unchanged' and changed facts are applied."""
+    from back_end.database.models import db, MachineDetail
+    payload = {'hostname': 'fingerprint-vm', 'platform': 'Linux', 'max_cores': 2, 'vm_list': []}
+    client.post('/api/gathering/register_machine', json=dict(payload, max_cores=1))
+    response = client.post('/api/gathering/register_machine', json=payload)
     assert response.status_code == 201
+
+    response = client.post('/api/gathering/register_machine', json=payload)
+    assert response.status_code == 200
+    assert response.get_json()['message'] == 'Machine unchanged'
+
+    response = client.post('/api/gathering/register_machine', json=dict(payload, max_cores=8))
+    assert response.status_code == 201
+    with client.application.app_context():
+        assert db.session.query(MachineDetail.Max_Cores).filter_by(Hostname='fingerprint-vm').scalar() == 8
+
+def test_unchanged_hypervisor_reclaims_migrated_vms(client):
+    """Test that an unchanged hypervisor re-registering still takes back VMs another hypervisor claimed."""
+    from sqlalchemy import delete
+    from back_end.database.models import db, MachineDetail
+    with client.application.app_context():
+        db.session.execute(delete(MachineDetail).where(MachineDetail.Hostname.like('migrate-%')))
+        db.session.commit()
+    hv_a = {'hostname': 'migrate-hv-a', 'is_hypervisor': True, 'vm_list': ['migrate-vm-1']}
+    client.post('/api/gathering/register_machine', json=hv_a)
+    client.post('/api/gathering/register_machine', json={
+        'hostname': 'migrate-hv-b', 'is_hypervisor': True, 'vm_list': ['migrate-vm-1']
+    })
+
+    response = client.post('/api/gathering/register_machine', json=hv_a)
+    assert response.status_code == 200
+    assert response.get_json()['message'] == 'Machine unchanged'
+    assert response.get_json()['topology'] == {'created': 0, 'attached': 1, 'detached': 0}
+    with client.application.app_context():
+        vm = MachineDetail.query.filter_by(Hostname='migrate-vm-1').first()
+        assert vm.hosted_on.Hostname == 'migrate-hv-a'
@@ -29,4 +29,163 @@ def test_send_metrics(client):
         'current_memory_usage': {'total': 8 * 1024*3, 'used': 4 * 1024*3, 'percent': 50.0},
         'current_disk_usage': [{'mountpoint': '/', 'total': 100 * 1024*3, 'used': 50 * 1024*3, 'percent': 50.0}]
     })
-    assert response.status_code == 201
\ No newline at end of file
+    assert response.status_code == 201
+
+def test_send_metrics_batch(client):
+    """Test that the batch endpoint accepts known hostnames and rejects unknown ones per item."""
+    client.post('/api/gathering/register_machine', json={
+        'hostname': 'test-vm',
+        'platform': 'Linux',
+        'is_hypervisor': False,
+        'max_cores': 4,
+        'max_memory': 8 * 1024**3,
+        'max_disk': 100 * 1024**3,
+        'vm_list': []
+    })
+    sample = {
+        'hostname': 'test-vm',
+        'timestamp': '2023-01-01T00:00:01Z',
+        'current_cpu_usage': 25.0,
+        'current_memory_usage': {'total': 8 * 1024*3, 'used': 2 * 1024*3, 'percent': 25.0},
+        'current_disk_usage': [{'mountpoint': '/', 'total': 100 * 1024*3, 'used': 25 * 1024*3, 'percent': 25.0}]
+    }
+    response = client.post('/api/gathering/metrics/batch', json={'samples': [
+        sample,
+        dict(sample, hostname='not-registered-vm'),
+        dict(sample, current_cpu_usage='high'),
+        dict(sample, hostname=['test-vm']),
+        dict(sample, hostname={})
+    ]})
+    assert response.status_code == 201
+    data = response.get_json()
+    assert data['accepted'] == 1
+    assert data['rejected'] == 4
+    assert [r['status'] for r in data['results']] == ['accepted', 'rejected', 'rejected', 'rejected', 'rejected']
+    assert data['results'][3]['message'] == 'hostname must be a string'
+
+
+def test_send_metrics_batch_requires_list(client):
+    """Test that the batch endpoint rejects payloads without a list of samples."""
+    response = client.post('/api/gathering/metrics/batch', json={'samples': 'nope'})
+    assert response.status_code == 400
+
+
+def test_latest_metrics_ignores_older_samples(client):
+    """Test that the latest-metrics endpoint returns the newest sample even if an older one arrives last."""
+    from flask_jwt_extended import create_access_token
+    client.post('/api/gathering/register_machine', json={'hostname': 'latest-vm', 'vm_list': []})
+    client.post('/api/gathering/metrics', json={
+        'hostname': 'latest-vm', 'timestamp': '2030-01-01T00:00:10Z', 'current_cpu_usage': 75.0,
+        'current_memory_usage': {'total': 8, 'used': 4, 'percent': 50.0}, 'current_disk_usage': []
+    })
+    client.post('/api/gathering/metrics', json={
+        'hostname': 'latest-vm', 'timestamp': '2030-01-01T00:00:05Z', 'current_cpu_usage': 10.0,
+        'current_memory_usage': {'total': 8, 'used': 4, 'percent': 50.0}, 'current_disk_usage': []
+    })
+    with client.application.app_context():
+        token = create_access_token(identity='1')
+    response = client.get('/api/front_end/machine/info/latest-vm/metrics',
+                          headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert response.get_json()['Current_CPU_Usage'] == 75.0
+
+
+def test_send_metrics_batch_gzip(client):
+    """Test that the batch endpoint accepts a gzip-compressed body."""
+    import gzip
+    import json
+    client.post('/api/gathering/register_machine', json={'hostname': 'test-vm', 'vm_list': []})
+    body = gzip.compress(json.dumps({'samples': [{'hostname': 'test-vm', 'current_cpu_usage': 1.0}]}).encode())
+    response = client.post('/api/gathering/metrics/batch', data=body,
+                           headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    assert response.status_code == 201
+    assert response.get_json()['accepted'] == 1
+
+    response = client.post('/api/gathering/metrics/batch', data=b'not gzip',
+                           headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    assert response.status_code == 400
+
+    # A valid gzip header followed by a corrupt deflate stream
+    corrupt = gzip.compress(b'{"samples": []}')[:10] + b'\xff' * 20
+    response = client.post('/api/gathering/metrics/batch', data=corrupt,
+                           headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    assert response.status_code == 400
+
+    # A body that only exceeds the limit once decompressed is too large, not malformed
+    client.application.config['METRICS_MAX_DECOMPRESSED_BYTES'] = 1024
+    response = client.post('/api/gathering/metrics/batch', data=gzip.compress(b' ' * 4096 + b'[]'),
+                           headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    assert response.status_code == 413
+
+
+def test_send_metrics_batch_ndjson(client):
+    """Test that the batch endpoint accepts one sample per line as NDJSON."""
+    client.post('/api/gathering/register_machine', json={'hostname': 'test-vm', 'vm_list': []})
+    body = b'{"hostname": "test-vm", "current_cpu_usage": 1.0}\n\n{"hostname": "test-vm", "current_cpu_usage": 2.0}\n'
+    response = client.post('/api/gathering/metrics/batch', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 201
+    assert response.get_json()['accepted'] == 2
+
+    response = client.post('/api/gathering/metrics/batch', data=b'{"hostname": \n', content_type='application/x-ndjson')
+    assert response.status_code == 400
+
+
+def test_replayed_samples_are_stored_once(client):
+    """Test that re-sent samples, by timestamp or by sample_id, are reported as duplicates and not stored twice."""
+    import uuid
+    from back_end.database.models import db, MachineMetric
+    from back_end.ELT.Machine_Data import resolve_machine_id
+    hostname = f'dedupe-vm-{uuid.uuid4().hex[:8]}'
+    client.post('/api/gathering/register_machine', json={'hostname': hostname, 'vm_list': []})
+    samples = [
+        {'hostname': hostname, 'timestamp': '2024-01-01T00:00:00Z', 'sample_id': 1, 'current_cpu_usage': 1.0},
+        {'hostname': hostname, 'timestamp': '2024-01-01T00:00:01Z', 'sample_id': 2, 'current_cpu_usage': 2.0}
+    ]
+    response = client.post('/api/gathering/metrics/batch', json={'samples': samples})
+    assert (response.get_json()['new'], response.get_json()['duplicates']) == (2, 0)
+
+    # A retry of the whole batch, plus a sample re-sent with a fresh timestamp but the same sample_id
+    replay = samples + [
+        dict(samples[0], timestamp='2024-01-01T00:00:05Z'),
+        dict(samples[1], sample_id=3, timestamp='2024-01-01T00:00:02Z')
+    ]
+    response = client.post('/api/gathering/metrics/batch', json={'samples': replay})
+    assert (response.get_json()['new'], response.get_json()['duplicates']) == (1, 3)
+
+    response = client.post('/api/gathering/metrics', json=samples[0])
+    assert response.status_code == 201
+    assert response.get_json()['duplicates'] == 1
+    with client.application.app_context():
+        machine_id = resolve_machine_id(hostname)
+        assert db.session.query(MachineMetric).filter_by(Machine_ID=machine_id).count() == 3
+
+    response = client.post('/api/gathering/metrics', json=dict(samples[0], sample_id=-1))
+    assert response.status_code == 400
+
+
+def test_send_metrics_binary_wire_format(client):
+    """Test that both metrics endpoints accept the binary wire format, plain or gzip-compressed."""
+    import gzip
+    from core.wire_format import WIRE_MIMETYPE, encode_samples
+    client.post('/api/gathering/register_machine', json={'hostname': 'test-vm', 'vm_list': []})
+    samples = [{
+        'hostname': 'test-vm', 'current_cpu_usage': 3.0,
+        'current_memory_usage': {'total': 8, 'used': 4, 'percent': 50.0},
+        'current_disk_usage': [{'mountpoint': '/', 'total': 100, 'used': 50, 'percent': 50.0}]
+    }] * 2
+    response = client.post('/api/gathering/metrics/batch', data=gzip.compress(encode_samples(samples)),
+                           headers={'Content-Type': WIRE_MIMETYPE, 'Content-Encoding': 'gzip'})
+    assert response.status_code == 201
+    assert response.get_json()['accepted'] == 2
+
+    response = client.post('/api/gathering/metrics', data=encode_samples(samples[:1]), content_type=WIRE_MIMETYPE)
+    assert response.status_code == 201
+
+    response = client.post('/api/gathering/metrics/batch', data=encode_samples(samples)[:-3], content_type=WIRE_MIMETYPE)
+    assert response.status_code == 400
+    # Unsupported encodings and content types answer 415 so the agent can resend as gzip-compressed JSON
+    response = client.post('/api/gathering/metrics/batch', data=b'{}', content_type='application/json',
+                           headers={'Content-Encoding': 'br'})
+    assert response.status_code == 415
+    response = client.post('/api/gathering/metrics/batch', data=b'\x80', content_type='application/msgpack')
+    assert response.status_code == 415
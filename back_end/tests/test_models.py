@@ -23,4 +23,36 @@ def test_userprofile_model(app):
         user = UserProfile(Username='modeltest', Password_Hash='hash')
         db.session.add(user)
         db.session.commit()
-        assert UserProfile.query.filter_by(Username='modeltest').first() is not None
\ No newline at end of file
+        assert UserProfile.query.filter_by(Username='modeltest').first() is not None
+
+def test_migration_converts_legacy_json_metrics(tmp_path):
+    """Test that JSON text memory/disk columns from older databases are moved into typed storage."""
+    import sqlite3
+    from core.config import Config
+    from back_end.database.models import MachineMetric, MachineDiskUsage
+
+    db_path = tmp_path / 'legacy.db'
+    connection = sqlite3.connect(db_path)
+    connection.executescript("""
+        CREATE TABLE machine_metrics (
+            Metrics_ID INTEGER PRIMARY KEY, Machine_ID INTEGER, Timestamp DATETIME NOT NULL,
+            Current_CPU_Usage FLOAT, Current_Memory_Usage TEXT, Current_Disk_Usage TEXT
+        );
+        INSERT INTO machine_metrics VALUES (1, 1, '2023-01-01 00:00:00.000000', 50.0,
+            '{"total": 8, "used": 4, "percent": 50.0}',
+            '[{"mountpoint": "/", "total": 100, "used": 95, "percent": 95.0}]');
+    """)
+    connection.commit()
+    connection.close()
+
+    class LegacyConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+
+    app = create_app(LegacyConfig)
+    with app.app_context():
+        metric = db.session.get(MachineMetric, 1)
+        assert (metric.Memory_Total, metric.Memory_Used, metric.Memory_Percent) == (8, 4, 50.0)
+        disk = db.session.get(MachineDiskUsage, (1, '/'))
+        assert disk.Percent == 95.0
+        columns = [row[1] for row in db.session.execute(db.text('PRAGMA table_info(machine_metrics)'))]
+        assert 'Current_Memory_Usage' not in columns
@@ -0,0 +1,52 @@
+import logging
+import pytest
+from flask_jwt_extended import create_access_token
+from core.config import Config
+from back_end.app.app import create_app
+
+@pytest.fixture
+def app(tmp_path):
+    """Fixture to provide an app that profiles into a temporary directory and logs every query as slow."""
+    class ProfilingConfig(Config):
+        PROFILE_DIR = str(tmp_path / 'profiles')
+        SLOW_QUERY_THRESHOLD_MS = 0.000001
+
+    app = create_app(ProfilingConfig)
+    app.config['TESTING'] = True
+    return app
+
+def _token(app, admin):
+    with app.app_context():
+        return create_access_token(identity='1', additional_claims={'admin': admin})
+
+def test_admin_can_profile_a_request(app, tmp_path):
+    """Test that an admin request with X-Profile writes a profile and names it in the response."""
+    client = app.test_client()
+    response = client.get('/api/front_end/machines/list', headers={
+        'Authorization': f'Bearer {_token(app, True)}', 'X-Profile': '1'
+    })
+    assert response.status_code == 200
+    name = response.headers['X-Profile-File']
+    assert (tmp_path / 'profiles' / f'{name}.prof').exists()
+    assert 'cumulative' in (tmp_path / 'profiles' / f'{name}.txt').read_text()
+
+def test_non_admin_profile_flag_is_ignored(app, tmp_path):
+    """Test that non-admin callers are served normally and never profiled."""
+    client = app.test_client()
+    response = client.get('/api/front_end/machines/list?profile=1', headers={
+        'Authorization': f'Bearer {_token(app, False)}'
+    })
+    assert response.status_code == 200
+    assert 'X-Profile-File' not in response.headers
+    assert not (tmp_path / 'profiles').exists()
+
+def test_slow_query_log_redacts_parameters(app, caplog):
+    """Test that slow queries are logged with their route and without parameter values."""
+    client = app.test_client()
+    with caplog.at_level(logging.WARNING, logger='slow_query'):
+        client.get('/api/front_end/machine/info/secret-hostname-123', headers={
+            'Authorization': f'Bearer {_token(app, True)}'
+        })
+    messages = [r.getMessage() for r in caplog.records if r.name == 'slow_query']
+    assert any('GET /api/front_end/machine/info/<hostname>' in m for m in messages)
+    assert not any('secret-hostname-123' in m for m in messages)
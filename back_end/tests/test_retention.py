@@ -0,0 +1,41 @@
+import pytest
+from datetime import datetime
+from back_end.app.app import create_app
+from back_end.database.models import MachineMetric
+from core.config import Config
+
+class RetentionConfig(Config):
+    RETENTION_ENABLED = True
+    RETENTION_INTERVAL = 3600
+    RETENTION_RAW_DAYS = 1
+    RETENTION_CHUNK_SIZE = 10
+    RETENTION_CHUNK_PAUSE = 0
+    METRICS_SCRAPE_TOKEN = 'test-scrape-token'
+
+SCRAPE_HEADERS = {'Authorization': 'Bearer test-scrape-token'}
+
+@pytest.fixture
+def app():
+    app = create_app(RetentionConfig)
+    app.config['TESTING'] = True
+    yield app
+    app.extensions['retention_pruner'].stop()
+
+def test_retention_prunes_expired_rows_in_chunks(app):
+    """Test that the pruner deletes only expired raw rows, across several chunks."""
+    client = app.test_client()
+    client.post('/api/gathering/register_machine', json={'hostname': 'retention-vm', 'vm_list': []})
+    old = [{'hostname': 'retention-vm', 'timestamp': f'2001-01-01T00:00:{s:02d}Z', 'current_cpu_usage': 1.0}
+           for s in range(25)]
+    new = [{'hostname': 'retention-vm', 'timestamp': '2100-01-01T00:00:00Z', 'current_cpu_usage': 2.0}]
+    client.post('/api/gathering/metrics/batch', json={'samples': old + new})
+
+    pruner = app.extensions['retention_pruner']
+    pruner.run_once(now=datetime(2001, 1, 3))
+
+    with app.app_context():
+        assert MachineMetric.query.filter(MachineMetric.Timestamp < datetime(2001, 1, 2)).count() == 0
+        assert MachineMetric.query.filter(MachineMetric.Timestamp >= datetime(2100, 1, 1)).count() >= 1
+    stats = client.get('/api/gathering/stats', headers=SCRAPE_HEADERS).get_json()['retention']
+    assert stats['raw_rows_pruned'] >= 25
+    assert stats['max_lock_ms'] > 0
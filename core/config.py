@@ -13,6 +13,78 @@ class Config:
         'sqlite:///mydatabase.db'
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # 'default' leaves SQLAlchemy/SQLite untouched, 'production' applies the pragmas and pool sizing below
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'default')
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # bytes
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative means KiB
+        'temp_store': 'MEMORY'
+    }
+    DB_LOCK_TIMEOUT_MS = int(os.environ.get('DB_LOCK_TIMEOUT_MS', 5000))  # fail with 503 after waiting this long
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your_jwt_secret_key_here')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
-    CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000')
\ No newline at end of file
+    CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000')
+    # Metrics ingest
+    METRICS_BATCH_MAX_SAMPLES = int(os.environ.get('METRICS_BATCH_MAX_SAMPLES', 5000))
+    METRICS_MAX_DECOMPRESSED_BYTES = int(os.environ.get('METRICS_MAX_DECOMPRESSED_BYTES', 64 * 1024 * 1024))
+    # 'sync' commits each metrics request before replying, 'queue' replies 202 and commits in batches
+    INGEST_MODE = os.environ.get('INGEST_MODE', 'sync')
+    INGEST_QUEUE_MAXSIZE = int(os.environ.get('INGEST_QUEUE_MAXSIZE', 10000))
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+    INGEST_FLUSH_INTERVAL = float(os.environ.get('INGEST_FLUSH_INTERVAL', 1.0))  # seconds
+    INGEST_RETRY_AFTER = int(os.environ.get('INGEST_RETRY_AFTER', 1))  # seconds, sent with 429
+    MACHINE_ID_CACHE_SIZE = int(os.environ.get('MACHINE_ID_CACHE_SIZE', 10000))  # hostnames
+
+    # Metrics history graphs
+    HISTORY_DEFAULT_POINTS = int(os.environ.get('HISTORY_DEFAULT_POINTS', 300))
+    HISTORY_MAX_POINTS = int(os.environ.get('HISTORY_MAX_POINTS', 2000))
+
+    # Per-hypervisor aggregates (/api/front_end/hypervisors) are cached this long; 0 disables the cache
+    HV_AGGREGATE_CACHE_TTL = float(os.environ.get('HV_AGGREGATE_CACHE_TTL', 5))  # seconds
+
+    # Response compression (gzip, or brotli when installed) for JSON responses at least this large
+    COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+
+    # Live metrics stream (/api/front_end/machines/stream)
+    LIVE_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_MAX_SUBSCRIBERS', 1000))  # open streams per process
+    LIVE_QUEUE_SIZE = int(os.environ.get('LIVE_QUEUE_SIZE', 1000))  # buffered samples per stream before dropping
+    LIVE_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', 15))
+    LIVE_MAX_HOSTNAMES = int(os.environ.get('LIVE_MAX_HOSTNAMES', 500))  # per stream
+
+    # Rollups (1m / 5m / 1h) maintained by a background compactor and used by history queries
+    ROLLUPS_ENABLED = os.environ.get('ROLLUPS_ENABLED', 'false').lower() == 'true'
+    ROLLUP_COMPACT_INTERVAL = float(os.environ.get('ROLLUP_COMPACT_INTERVAL', 30))  # seconds
+    ROLLUP_COMPACT_BATCH = int(os.environ.get('ROLLUP_COMPACT_BATCH', 50000))  # raw rows per transaction
+
+    # Retention: raw samples are pruned after RETENTION_RAW_DAYS, each rollup tier after its own period
+    RETENTION_ENABLED = os.environ.get('RETENTION_ENABLED', 'false').lower() == 'true'
+    RETENTION_RAW_DAYS = int(os.environ.get('RETENTION_RAW_DAYS', 7))
+    RETENTION_ROLLUP_DAYS = {
+        60: int(os.environ.get('RETENTION_1M_DAYS', 30)),
+        300: int(os.environ.get('RETENTION_5M_DAYS', 90)),
+        3600: int(os.environ.get('RETENTION_1H_DAYS', 730))
+    }
+    RETENTION_CHUNK_SIZE = int(os.environ.get('RETENTION_CHUNK_SIZE', 1000))  # rows per delete transaction
+    RETENTION_CHUNK_PAUSE = float(os.environ.get('RETENTION_CHUNK_PAUSE', 0.05))  # seconds between chunks
+    RETENTION_INTERVAL = float(os.environ.get('RETENTION_INTERVAL', 3600))  # seconds between runs
+
+    # Request latency / SQL instrumentation, exposed at /api/internal/metrics
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    # /api/internal/metrics and /api/gathering/stats need an admin JWT, or this token as 'Authorization: Bearer <token>'
+    METRICS_SCRAPE_TOKEN = os.environ.get('METRICS_SCRAPE_TOKEN')
+    # Admins can profile a single request with 'X-Profile: 1' or '?profile=1'; results go to PROFILE_DIR
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() == 'true'
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join('logs', 'profiles'))
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 250))  # 0 disables the slow-query log
+
+    # Logging: queue mode hands records to a background writer thread instead of writing on the request thread
+    LOG_QUEUE_ENABLED = os.environ.get('LOG_QUEUE_ENABLED', 'false').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))  # records beyond this are dropped and counted
+    LOG_BATCH_MAX_RECORDS = int(os.environ.get('LOG_BATCH_MAX_RECORDS', 1000))  # per /frontend_log/batch request
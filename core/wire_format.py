@@ -0,0 +1,164 @@
+# the purpose of this file is to define the compact binary encoding of metrics samples shared by the
+# agent (encoder) and the ingest API (decoder), as a smaller and cheaper-to-parse alternative to JSON
+#
+# Layout (version 1, little-endian):
+#   header   '<2sBI'   magic b'MW', version, sample count
+#   strings  '<H'      count, then per string '<H' byte length + UTF-8 bytes (hostnames and mountpoints,
+#                      each stored once per body and referenced by index)
+#   sample   '<HBqqdqqdH'  hostname index, flags, timestamp (epoch microseconds), sample_id, cpu percent,
+#                          memory total, memory used, memory percent, disk count
+#   disk     '<HBqqd'  mountpoint index, flags, total, used, percent
+# Absent fields are zero on the wire and marked absent by the flag bits below.
+
+import struct
+from datetime import datetime, timedelta, timezone
+
+WIRE_MIMETYPE = 'application/x-metrics-samples'
+WIRE_MAGIC = b'MW'
+WIRE_VERSION = 1
+
+_HEADER = struct.Struct('<2sBI')
+_COUNT = struct.Struct('<H')
+_SAMPLE = struct.Struct('<HBqqdqqdH')
+_DISK = struct.Struct('<HBqqd')
+
+# Sample flags
+_HAS_TIMESTAMP = 1
+_HAS_SAMPLE_ID = 2
+_HAS_CPU = 4
+_HAS_MEMORY_TOTAL = 8
+_HAS_MEMORY_USED = 16
+_HAS_MEMORY_PERCENT = 32
+# Disk flags
+_HAS_TOTAL = 1
+_HAS_USED = 2
+_HAS_PERCENT = 4
+
+_EPOCH = datetime(1970, 1, 1)
+
+class WireFormatError(ValueError):
+    """Raised when samples cannot be encoded, or a body is not a valid encoding."""
+
+def _epoch_microseconds(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - _EPOCH) // timedelta(microseconds=1)
+
+def _flagged(value, flag):
+    # (wire value, flag bit) for an optional field
+    return (0, 0) if value is None else (value, flag)
+
+# --- Encoding ---
+
+def encode_samples(samples):
+    """
+    Encodes a list of sample dicts (the JSON ingest shape) into the binary format.
+    Timestamps may be ISO-8601 strings or datetimes; naive values are taken as UTC.
+    Raises WireFormatError if a sample cannot be represented.
+    """
+    strings = {}
+
+    def string_index(value):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    try:
+        packed = []
+        for sample in samples:
+            memory = sample.get('current_memory_usage') or {}
+            disks = sample.get('current_disk_usage') or []
+            timestamp = sample.get('timestamp')
+            timestamp, has_timestamp = _flagged(_epoch_microseconds(timestamp) if timestamp else None, _HAS_TIMESTAMP)
+            sample_id, has_sample_id = _flagged(sample.get('sample_id'), _HAS_SAMPLE_ID)
+            cpu, has_cpu = _flagged(sample.get('current_cpu_usage'), _HAS_CPU)
+            total, has_total = _flagged(memory.get('total'), _HAS_MEMORY_TOTAL)
+            used, has_used = _flagged(memory.get('used'), _HAS_MEMORY_USED)
+            percent, has_percent = _flagged(memory.get('percent'), _HAS_MEMORY_PERCENT)
+            packed.append(_SAMPLE.pack(
+                string_index(sample['hostname']),
+                has_timestamp | has_sample_id | has_cpu | has_total | has_used | has_percent,
+                timestamp, sample_id, cpu, total, used, percent, len(disks)
+            ))
+            for disk in disks:
+                disk_total, disk_has_total = _flagged(disk.get('total'), _HAS_TOTAL)
+                disk_used, disk_has_used = _flagged(disk.get('used'), _HAS_USED)
+                disk_percent, disk_has_percent = _flagged(disk.get('percent'), _HAS_PERCENT)
+                packed.append(_DISK.pack(
+                    string_index(disk['mountpoint']),
+                    disk_has_total | disk_has_used | disk_has_percent,
+                    disk_total, disk_used, disk_percent
+                ))
+
+        header = [_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, len(samples)), _COUNT.pack(len(strings))]
+        for value in strings:
+            encoded = value.encode('utf-8')
+            header.append(_COUNT.pack(len(encoded)))
+            header.append(encoded)
+    except (KeyError, TypeError, ValueError, struct.error) as e:
+        raise WireFormatError(f"Cannot encode samples: {e}")
+    return b''.join(header + packed)
+
+# --- Decoding ---
+
+def decode_samples(data):
+    """
+    Decodes a binary body into a list of sample dicts in the JSON ingest shape, except that
+    timestamps are naive UTC datetimes. Raises WireFormatError on any malformed input.
+    """
+    try:
+        magic, version, sample_count = _HEADER.unpack_from(data, 0)
+        if magic != WIRE_MAGIC:
+            raise WireFormatError("Not a metrics wire format body")
+        if version != WIRE_VERSION:
+            raise WireFormatError(f"Unsupported wire format version {version}")
+        offset = _HEADER.size
+        (string_count,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        strings = []
+        for _ in range(string_count):
+            (length,) = _COUNT.unpack_from(data, offset)
+            offset += _COUNT.size
+            if offset + length > len(data):
+                raise WireFormatError("Truncated string table")
+            strings.append(bytes(data[offset:offset + length]).decode('utf-8'))
+            offset += length
+
+        samples = []
+        for _ in range(sample_count):
+            (host, flags, timestamp, sample_id, cpu, total, used, percent,
+             disk_count) = _SAMPLE.unpack_from(data, offset)
+            offset += _SAMPLE.size
+            sample = {"hostname": strings[host]}
+            if flags & _HAS_TIMESTAMP:
+                sample["timestamp"] = _EPOCH + timedelta(microseconds=timestamp)
+            if flags & _HAS_SAMPLE_ID:
+                sample["sample_id"] = sample_id
+            if flags & _HAS_CPU:
+                sample["current_cpu_usage"] = cpu
+            if flags & (_HAS_MEMORY_TOTAL | _HAS_MEMORY_USED | _HAS_MEMORY_PERCENT):
+                sample["current_memory_usage"] = {
+                    "total": total if flags & _HAS_MEMORY_TOTAL else None,
+                    "used": used if flags & _HAS_MEMORY_USED else None,
+                    "percent": percent if flags & _HAS_MEMORY_PERCENT else None
+                }
+            disks = []
+            for _ in range(disk_count):
+                mountpoint, disk_flags, disk_total, disk_used, disk_percent = _DISK.unpack_from(data, offset)
+                offset += _DISK.size
+                disks.append({
+                    "mountpoint": strings[mountpoint],
+                    "total": disk_total if disk_flags & _HAS_TOTAL else None,
+                    "used": disk_used if disk_flags & _HAS_USED else None,
+                    "percent": disk_percent if disk_flags & _HAS_PERCENT else None
+                })
+            sample["current_disk_usage"] = disks
+            samples.append(sample)
+    except (struct.error, IndexError, UnicodeDecodeError, OverflowError) as e:
+        raise WireFormatError(f"Malformed wire format body: {e}")
+    if offset != len(data):
+        raise WireFormatError("Trailing bytes after the last sample")
+    return samples
@@ -0,0 +1,105 @@
+# the purpose of this file is to hold the HTTP plumbing shared by the agents: one pooled keep-alive
+# session per process, and a buffer that ships remote log lines to the backend in periodic batches
+
+import logging
+import threading
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# --- Pooled Session ---
+
+def create_http_session(pool_size=10):
+    """
+    Returns a requests.Session whose connections are kept alive and reused across calls,
+    holding up to pool_size open connections per host.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# --- Batched Remote Logging ---
+
+class RemoteLogBuffer:
+    """
+    Buffers remote log lines at or above `level` and posts them as one batch every `interval` seconds.
+    Lines below `level` stay in the local log only. At most max_records lines are held; beyond that
+    the oldest are dropped and counted.
+    """
+
+    def __init__(self, endpoint, user, session, level="WARNING", interval=10.0, max_records=1000):
+        self.endpoint = endpoint
+        self.user = user
+        self.session = session
+        self.level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        self.interval = interval
+        self.max_records = max_records
+        self.dropped = 0
+        self.sent = 0
+        self._records = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add(self, message, level="INFO"):
+        """
+        Queues a line for the next batch. Returns False if it is below the remote log level.
+        """
+        if logging.getLevelName(level.upper()) < self.level:
+            return False
+        record = {
+            "level": level.upper(),
+            "message": message,
+            "user": self.user,
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }
+        with self._lock:
+            self._records.append(record)
+            if len(self._records) > self.max_records:
+                overflow = len(self._records) - self.max_records
+                del self._records[:overflow]
+                self.dropped += overflow
+        return True
+
+    def flush(self):
+        """
+        Posts everything buffered so far as one request. Returns the number of lines sent.
+        Lines that fail to send are dropped so an unreachable backend cannot grow the buffer.
+        """
+        with self._lock:
+            records, self._records = self._records, []
+        if not records:
+            return 0
+        try:
+            self.session.post(self.endpoint, json={"logs": records}, timeout=3)
+        except Exception as e:
+            self.dropped += len(records)
+            logger.error(f"Failed to send {len(records)} remote log lines: {e}")
+            return 0
+        self.sent += len(records)
+        return len(records)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="remote-log-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
@@ -1,22 +1,40 @@
-import requests
+import argparse
 import random
 import time
 from datetime import datetime
 import logging
 import os
 import json
+import math
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
 
-# --- CONFIGURABLE VARIABLES ---
-SEND_INTERVAL_SECONDS = 5    # How often to send metrics (seconds)
-FOREVER = True               # If True, send metrics forever; if False, send for DURATION_SECONDS
-DURATION_SECONDS = 60        # Only used if FOREVER is False
+try:
+    from metrics_gathering.agent_http import create_http_session, RemoteLogBuffer
+except ImportError:  # run directly as a script from inside metrics_gathering/
+    from agent_http import create_http_session, RemoteLogBuffer
+
+# --- CONFIGURABLE VARIABLES (defaults for the command line options) ---
+SEND_INTERVAL_SECONDS = 5    # How often each machine sends a sample when no --rate is given (seconds)
+DURATION_SECONDS = 60        # How long to generate load; 0 runs until interrupted
 
 NUM_HVS = 10                 # Number of hypervisors to simulate
 VMS_PER_HV = 5               # Number of VMs per hypervisor
 
-REGISTER_ENDPOINT = "http://localhost:5000/api/gathering/register_machine"
-METRICS_ENDPOINT = "http://localhost:5000/api/gathering/metrics"
-LOGGING_API_ENDPOINT = "http://localhost:5000/api/logging/frontend_log"  # Backend logging API endpoint
+PROCESSES = 1                # Worker processes, for loads one interpreter cannot drive
+THREADS_PER_PROCESS = 8      # Concurrent senders (each with its own keep-alive session) per process
+BATCH_SIZE = 100             # Samples per request in batch and stream modes
+
+BASE_URL = os.getenv("METRICS_BASE_URL", "http://localhost:5000")
+REGISTER_ENDPOINT = BASE_URL + "/api/gathering/register_machine"
+METRICS_ENDPOINT = BASE_URL + "/api/gathering/metrics"
+BATCH_METRICS_ENDPOINT = BASE_URL + "/api/gathering/metrics/batch"
+LOGGING_BATCH_API_ENDPOINT = BASE_URL + "/api/logging/frontend_log/batch"  # Backend batch logging API endpoint
+REMOTE_LOG_LEVEL = os.getenv("REMOTE_LOG_LEVEL", "WARNING")  # lines below this level stay in the local log
+REMOTE_LOG_FLUSH_INTERVAL = 10  # seconds between remote log batches
+
+SEND_MODES = ("single", "batch", "stream")
 
 # --- Logging Setup ---
 # Ensure logs directory exists
@@ -31,48 +49,83 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def send_remote_log(message, level="INFO", user="test_data_generator"):
+# One keep-alive connection pool shared by registration and remote logging; senders each get their own
+http_session = create_http_session()
+
+remote_log = RemoteLogBuffer(
+    LOGGING_BATCH_API_ENDPOINT,
+    user="test_data_generator",
+    session=http_session,
+    level=REMOTE_LOG_LEVEL,
+    interval=REMOTE_LOG_FLUSH_INTERVAL
+)
+
+def send_remote_log(message, level="INFO"):
     """
-    Send a log message to the backend logging API endpoint.
+    Queue a log message for the next batch sent to the backend logging API.
     """
-    log_payload = {
-        "level": level,
-        "message": message,
-        "user": user
-    }
-    try:
-        requests.post(LOGGING_API_ENDPOINT, json=log_payload, timeout=3)
-    except Exception as e:
-        logger.error(f"Failed to send remote log: {e}")
+    remote_log.add(message, level=level)
+
+# --- Fake Machines ---
 
-def register_machine(hostname, is_hypervisor=False, vm_list=None):
+def build_machines(num_hvs=NUM_HVS, vms_per_hv=VMS_PER_HV):
     """
-    Register a machine (HV or VM) with the backend.
+    Returns (hostname, is_hypervisor, vm_list) for every simulated HV followed by its VMs.
+    """
+    machines = []
+    for i in range(num_hvs):
+        hv = f"hv-{i+1}"
+        vms = [f"{hv}-vm-{j+1}" for j in range(vms_per_hv)]
+        machines.append((hv, True, vms))
+        machines.extend((vm, False, []) for vm in vms)
+    return machines
+
+def register_machine(hostname, is_hypervisor=False, vm_list=None, session=http_session):
     """
+    Register a machine (HV or VM) with the backend. Returns True on success.
+    Capacities are derived from the hostname, so a repeated run re-sends identical facts and the
+    backend answers "unchanged" instead of rewriting every machine.
+    """
+    facts = random.Random(hostname)
     payload = {
         "hostname": hostname,
         "platform": "Linux-5.15.0",
         "is_hypervisor": is_hypervisor,
-        "max_cores": random.randint(8, 32) if is_hypervisor else random.randint(2, 8),
-        "max_memory": random.randint(32, 128) * 1024*3 if is_hypervisor else random.randint(4, 32) * 1024*3,
-        "max_disk": random.randint(500, 2000) * 1024*3 if is_hypervisor else random.randint(50, 500) * 1024*3,
+        "max_cores": facts.randint(8, 32) if is_hypervisor else facts.randint(2, 8),
+        "max_memory": facts.randint(32, 128) * 1024*3 if is_hypervisor else facts.randint(4, 32) * 1024*3,
+        "max_disk": facts.randint(500, 2000) * 1024*3 if is_hypervisor else facts.randint(50, 500) * 1024*3,
         "vm_list": vm_list if vm_list else []
     }
     try:
-        response = requests.post(REGISTER_ENDPOINT, json=payload, timeout=3)
-        msg = f"Registered test machine: {hostname} (is_hypervisor={is_hypervisor}) - Status: {response.status_code}"
-        logger.info(msg)
-        send_remote_log(msg, level="INFO")
+        response = session.post(REGISTER_ENDPOINT, json=payload, timeout=10)
+        logger.debug(f"Registered test machine: {hostname} (is_hypervisor={is_hypervisor}) - Status: {response.status_code}")
+        return response.status_code < 400
     except Exception as e:
         msg = f"Failed to register test machine {hostname}: {e}"
         logger.error(msg)
         send_remote_log(msg, level="ERROR")
+        return False
 
-def send_metrics(hostname, is_hypervisor=False):
+def register_all(machines, threads=THREADS_PER_PROCESS):
     """
-    Send fake metrics for a given machine to the backend.
+    Registers every machine using `threads` concurrent sessions. Returns the number that failed.
     """
-    payload = {
+    local = threading.local()
+
+    def register(machine):
+        if not hasattr(local, "session"):
+            local.session = create_http_session(pool_size=1)
+        hostname, is_hypervisor, vm_list = machine
+        return register_machine(hostname, is_hypervisor, vm_list, session=local.session)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return sum(1 for ok in pool.map(register, machines) if not ok)
+
+def build_sample(hostname, is_hypervisor=False):
+    """
+    Builds one fake metrics sample for a machine.
+    """
+    return {
         "hostname": hostname,
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "current_cpu_usage": random.uniform(0, 100),
@@ -90,41 +143,247 @@ def send_metrics(hostname, is_hypervisor=False):
             }
         ]
     }
+
+# --- Sending ---
+
+# Per-sample outcome counts reported by the ingest endpoints
+OUTCOMES = ("accepted", "rejected", "new", "duplicates")
+
+def response_outcomes(status, body, sample_count):
+    """
+    Returns the per-sample outcome counts for one response. The batch endpoint reports them in its body;
+    a single-sample response is accepted or rejected as a whole (new/duplicates are unknown when queued).
+    """
+    body = body if isinstance(body, dict) else {}
+    if "accepted" in body:
+        return {outcome: body.get(outcome, 0) for outcome in OUTCOMES}
+    accepted = sample_count if status < 400 else 0
+    return {
+        "accepted": accepted,
+        "rejected": sample_count - accepted,
+        "new": body.get("new", 0),
+        "duplicates": body.get("duplicates", 0)
+    }
+
+def send_request(session, mode, samples):
+    """
+    Sends samples in one request using the given mode and returns (HTTP status code, outcome counts).
+    'single' expects exactly one sample; 'stream' sends NDJSON with chunked transfer encoding.
+    """
+    if mode == "single":
+        response = session.post(METRICS_ENDPOINT, json=samples[0], timeout=10)
+    elif mode == "batch":
+        response = session.post(BATCH_METRICS_ENDPOINT, json={"samples": samples}, timeout=30)
+    else:
+        lines = (json.dumps(sample).encode("utf-8") + b"\n" for sample in samples)
+        response = session.post(
+            BATCH_METRICS_ENDPOINT, data=lines, headers={"Content-Type": "application/x-ndjson"}, timeout=30
+        )
     try:
-        response = requests.post(METRICS_ENDPOINT, json=payload, timeout=3)
-        msg = f"Sent test metrics for {hostname} - Status: {response.status_code}"
-        logger.info(msg)
-        logger.debug(f"Test metrics payload: {json.dumps(payload)}")
-        send_remote_log(msg, level="INFO")
-    except Exception as e:
-        msg = f"Failed to send test metrics for {hostname}: {e}"
-        logger.error(msg)
-        send_remote_log(msg, level="ERROR")
+        body = response.json()
+    except ValueError:
+        body = None
+    return response.status_code, response_outcomes(response.status_code, body, len(samples))
+
+def new_results():
+    results = {"requests": 0, "samples": 0, "failed_samples": 0, "latencies": [], "errors": {}}
+    results.update({outcome: 0 for outcome in OUTCOMES})
+    return results
+
+def merge_results(results):
+    merged = new_results()
+    for result in results:
+        for key in ("requests", "samples", "failed_samples") + OUTCOMES:
+            merged[key] += result[key]
+        merged["latencies"].extend(result["latencies"])
+        for error, count in result["errors"].items():
+            merged["errors"][error] = merged["errors"].get(error, 0) + count
+    return merged
+
+def run_sender(machines, mode, batch_size, rate, deadline, stop_event, session=None):
+    """
+    Sends samples for `machines` round-robin at `rate` samples per second (0 means as fast as possible)
+    until `deadline` (a time.time() value, or None) or stop_event. Returns the raw results.
+    """
+    session = session or create_http_session(pool_size=1)
+    per_request = 1 if mode == "single" else batch_size
+    results = new_results()
+    position = 0
+    next_send = time.monotonic()
+    while not stop_event.is_set() and (deadline is None or time.time() < deadline):
+        if rate:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                stop_event.wait(delay)
+                continue
+            next_send += per_request / rate
+        samples = []
+        for _ in range(per_request):
+            hostname, is_hypervisor, _vms = machines[position % len(machines)]
+            samples.append(build_sample(hostname, is_hypervisor))
+            position += 1
+
+        started = time.perf_counter()
+        outcomes = {}
+        try:
+            status, outcomes = send_request(session, mode, samples)
+            error = None if status < 400 else f"HTTP {status}"
+        except Exception as e:
+            error = type(e).__name__
+        results["latencies"].append(time.perf_counter() - started)
+        results["requests"] += 1
+        results["samples"] += len(samples)
+        for outcome, count in outcomes.items():
+            results[outcome] += count
+        if error:
+            results["errors"][error] = results["errors"].get(error, 0) + 1
+            results["failed_samples"] += len(samples)
+    return results
+
+def run_process(machines, mode, batch_size, rate, deadline, threads):
+    """
+    Runs `threads` senders in this process, splitting the machines and the target rate between them.
+    Stops early on Ctrl-C and still returns what was measured.
+    """
+    slices = [machines[i::threads] for i in range(threads)]
+    slices = [machine_slice for machine_slice in slices if machine_slice]
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(slices)) as pool:
+        futures = [
+            pool.submit(run_sender, machine_slice, mode, batch_size, rate / len(slices), deadline, stop_event)
+            for machine_slice in slices
+        ]
+        try:
+            while not all(future.done() for future in futures):
+                wait(futures, timeout=0.5)
+        except KeyboardInterrupt:
+            stop_event.set()
+        return merge_results([future.result() for future in futures])
+
+# --- Reporting ---
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list, or None if it is empty.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(len(sorted_values) * pct / 100))
+    return sorted_values[rank - 1]
+
+def build_report(results, elapsed, settings):
+    """
+    Summarises merged sender results as a JSON-serialisable dict.
+    """
+    latencies = sorted(results["latencies"])
+    errors = sum(results["errors"].values())
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "settings": settings,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": results["requests"],
+        "samples_sent": results["samples"],
+        # As reported by the server: a 201 batch can still reject samples or skip them as duplicates
+        "samples_accepted": results["accepted"],
+        "samples_rejected": results["rejected"],
+        "samples_new": results["new"],
+        "samples_duplicate": results["duplicates"],
+        "samples_failed": results["failed_samples"],
+        "requests_per_second": round(results["requests"] / elapsed, 2) if elapsed else 0.0,
+        "samples_per_second": round(results["accepted"] / elapsed, 2) if elapsed else 0.0,
+        "new_samples_per_second": round(results["new"] / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+            "mean": ms(sum(latencies) / len(latencies) if latencies else None)
+        },
+        "errors": {
+            "total": errors,
+            "rate": round(errors / results["requests"], 4) if results["requests"] else 0.0,
+            "by_type": results["errors"]
+        }
+    }
+
+# --- Command Line ---
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate fake machine metrics load against the backend.")
+    parser.add_argument("--hvs", type=int, default=NUM_HVS, help="number of hypervisors to simulate")
+    parser.add_argument("--vms-per-hv", type=int, default=VMS_PER_HV, help="number of VMs per hypervisor")
+    parser.add_argument("--mode", choices=SEND_MODES, default="single",
+                        help="one sample per request, JSON batches, or NDJSON streamed batches")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="samples per request in batch/stream mode")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="target samples per second across all senders (0 = unlimited; "
+                             f"default: one sample per machine every {SEND_INTERVAL_SECONDS}s)")
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS, help="seconds to run, 0 = until Ctrl-C")
+    parser.add_argument("--processes", type=int, default=PROCESSES, help="worker processes")
+    parser.add_argument("--threads", type=int, default=THREADS_PER_PROCESS, help="concurrent senders per process")
+    parser.add_argument("--skip-register", action="store_true", help="assume the machines are already registered")
+    parser.add_argument("--report", help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    machines = build_machines(args.hvs, args.vms_per_hv)
+    rate = args.rate if args.rate is not None else len(machines) / SEND_INTERVAL_SECONDS
+    processes = max(1, min(args.processes, len(machines)))
+    settings = {
+        "machines": len(machines),
+        "mode": args.mode,
+        "batch_size": args.batch_size if args.mode != "single" else 1,
+        "target_rate": rate,
+        "duration_seconds": args.duration,
+        "processes": processes,
+        "threads_per_process": args.threads
+    }
+
+    if not args.skip_register:
+        started = time.perf_counter()
+        failed = register_all(machines, threads=args.threads * processes)
+        logger.info(f"Registered {len(machines) - failed}/{len(machines)} test machines in {time.perf_counter() - started:.1f}s")
+        if failed:
+            send_remote_log(f"Failed to register {failed} of {len(machines)} test machines", level="WARNING")
+
+    logger.info(f"Starting {args.mode} load: {json.dumps(settings)}")
+    deadline = time.time() + args.duration if args.duration else None
+    started = time.perf_counter()
+    if processes == 1:
+        results = run_process(machines, args.mode, args.batch_size, rate, deadline, args.threads)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(run_process, machines[i::processes], args.mode, args.batch_size,
+                            rate / processes, deadline, args.threads)
+                for i in range(processes)
+            ]
+            while True:
+                try:
+                    results = merge_results([future.result() for future in futures])
+                    break
+                except KeyboardInterrupt:
+                    # The workers got the same Ctrl-C and are wrapping up; wait for their results
+                    continue
+    report = build_report(results, time.perf_counter() - started, settings)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(output + "\n")
+    logger.info(f"Load run finished: {json.dumps(report)}")
+    send_remote_log(
+        f"Load run finished: {report['samples_per_second']} samples/s, error rate {report['errors']['rate']}",
+        level="INFO"
+    )
+    return report
 
 if __name__ == "__main__":
-    # Generate HV and VM names
-    hv_names = [f"hv-{i+1}" for i in range(NUM_HVS)]
-    vm_names = {hv: [f"{hv}-vm-{j+1}" for j in range(VMS_PER_HV)] for hv in hv_names}
-
-    # Register all HVs and their VMs
-    for hv in hv_names:
-        register_machine(hv, is_hypervisor=True, vm_list=vm_names[hv])
-        for vm in vm_names[hv]:
-            register_machine(vm, is_hypervisor=False)
-
-    logger.info("Test registration complete. Starting metrics loop...")
-    send_remote_log("Test registration complete. Starting metrics loop...", level="INFO")
-
-    # Main loop: send metrics at the configured interval
-    start_time = time.time()
-    while True:
-        for hv in hv_names:
-            send_metrics(hv, is_hypervisor=True)
-            for vm in vm_names[hv]:
-                send_metrics(vm, is_hypervisor=False)
-        if not FOREVER and (time.time() - start_time) >= DURATION_SECONDS:
-            msg = f"Finished sending test metrics for {DURATION_SECONDS} seconds."
-            logger.info(msg)
-            send_remote_log(msg, level="INFO")
-            break
-        time.sleep(SEND_INTERVAL_SECONDS)
\ No newline at end of file
+    remote_log.start()
+    atexit.register(remote_log.stop)
+    main()
@@ -1,4 +1,3 @@
-import requests
 import psutil
 import socket
 import time
@@ -7,9 +6,33 @@ import subprocess
 import os
 import logging
 import json
+import gzip
+import random
+import sqlite3
+import threading
+import atexit
 from datetime import datetime
 
+try:
+    from metrics_gathering.agent_http import create_http_session, RemoteLogBuffer
+except ImportError:  # run directly as a script from inside metrics_gathering/
+    from agent_http import create_http_session, RemoteLogBuffer
+
+try:
+    from core.wire_format import WIRE_MIMETYPE, WireFormatError, encode_samples
+except ImportError:  # running without the repo's core package; uploads fall back to JSON
+    WIRE_MIMETYPE, encode_samples = None, None
+
+    class WireFormatError(ValueError):
+        """Stand-in so the name exists when core.wire_format is unavailable."""
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
 SEND_METRICS_INTERVAL = 1 # in seconds
+STATIC_FACTS_REFRESH_INTERVAL = int(os.getenv("STATIC_FACTS_REFRESH_INTERVAL", 300)) # in seconds
 
 # --- Logging Setup (local file) ---
 if not os.path.exists("logs"):
@@ -24,6 +47,27 @@ logger = logging.getLogger(__name__)
 API_ENDPOINT = os.getenv("METRICS_API_ENDPOINT", "http://localhost:5000/api/gathering/metrics")
 REGISTER_ENDPOINT = os.getenv("REGISTER_MACHINE_ENDPOINT", "http://localhost:5000/api/gathering/register_machine")
 LOGGING_API_ENDPOINT = os.getenv("LOGGING_API_ENDPOINT", "http://localhost:5000/api/logging/frontend_log")  # Backend logging API
+LOGGING_BATCH_API_ENDPOINT = os.getenv("LOGGING_BATCH_API_ENDPOINT", LOGGING_API_ENDPOINT + "/batch")
+BATCH_API_ENDPOINT = os.getenv("METRICS_BATCH_API_ENDPOINT", "http://localhost:5000/api/gathering/metrics/batch")
+
+# --- Spool / Upload Settings ---
+SPOOL_PATH = os.getenv("METRICS_SPOOL_PATH", "spool/metrics_spool.db")
+SPOOL_MAX_SAMPLES = int(os.getenv("METRICS_SPOOL_MAX_SAMPLES", 100000))  # oldest samples are dropped beyond this
+UPLOAD_BATCH_SIZE = int(os.getenv("METRICS_UPLOAD_BATCH_SIZE", 500))
+UPLOAD_IDLE_INTERVAL = 1          # seconds to wait when the spool is empty
+UPLOAD_BACKOFF_MAX = 60           # seconds, cap for exponential backoff
+UPLOAD_STATS_LOG_INTERVAL = 60    # seconds between throughput / spool depth log lines
+UPLOAD_REJECTED_STATUSES = (400, 413)  # the only answers after which a batch is dropped, not retried
+UPLOAD_FORMAT = os.getenv("METRICS_UPLOAD_FORMAT", "binary")  # 'binary' (core/wire_format.py) or 'json'
+UPLOAD_ENCODING = os.getenv("METRICS_UPLOAD_ENCODING", "gzip")  # 'gzip', 'zstd' or 'identity'
+
+# --- Remote Logging Settings ---
+REMOTE_LOG_LEVEL = os.getenv("REMOTE_LOG_LEVEL", "WARNING")  # lines below this level stay in the local log
+REMOTE_LOG_FLUSH_INTERVAL = float(os.getenv("REMOTE_LOG_FLUSH_INTERVAL", 10))  # seconds between remote log batches
+REMOTE_LOG_MAX_BUFFER = 1000      # oldest buffered lines are dropped beyond this
+
+# One keep-alive connection pool shared by registration, uploads and remote logging
+http_session = create_http_session()
 
 def get_hostname():
     return socket.gethostname()
@@ -34,18 +78,22 @@ def get_max_cores():
 def get_max_memory():
     return psutil.virtual_memory().total
 
-def get_max_disk():
+def get_partitions():
+    return [part.mountpoint for part in psutil.disk_partitions()]
+
+def get_max_disk(partitions=None):
     total = 0
-    for part in psutil.disk_partitions():
+    for mountpoint in partitions if partitions is not None else get_partitions():
         try:
-            usage = psutil.disk_usage(part.mountpoint)
+            usage = psutil.disk_usage(mountpoint)
             total += usage.total
-        except PermissionError:
+        except (PermissionError, OSError):
             continue
     return total
 
 def get_current_cpu_usage():
-    return psutil.cpu_percent(interval=1)
+    # Non-blocking: usage since the previous call, so the collector never sleeps inside a sample
+    return psutil.cpu_percent(interval=None)
 
 def get_current_memory_usage():
     vm = psutil.virtual_memory()
@@ -55,18 +103,18 @@ def get_current_memory_usage():
         "percent": vm.percent
     }
 
-def get_current_disk_usage():
+def get_current_disk_usage(partitions=None):
     usage_list = []
-    for part in psutil.disk_partitions():
+    for mountpoint in partitions if partitions is not None else get_partitions():
         try:
-            usage = psutil.disk_usage(part.mountpoint)
+            usage = psutil.disk_usage(mountpoint)
             usage_list.append({
-                "mountpoint": part.mountpoint,
+                "mountpoint": mountpoint,
                 "total": usage.total,
                 "used": usage.used,
                 "percent": usage.percent
             })
-        except PermissionError:
+        except (PermissionError, OSError):
             continue
     return usage_list
 
@@ -95,56 +143,334 @@ def get_vm_list():
     except Exception:
         return []
 
-def register_machine():
+# --- Static Facts ---
+# Facts that rarely change (hypervisor status, cores, partitions...) are detected once and refreshed
+# on a slow schedule, so the per-tick path never forks `virsh` or walks the partition table.
+
+_static_facts = {}
+_static_facts_checked_at = None
+
+def detect_static_facts():
     running_on_hv = is_hypervisor()
-    payload = {
+    partitions = get_partitions()
+    return {
         "hostname": get_hostname(),
         "platform": platform.platform(),
         "is_hypervisor": running_on_hv,
         "max_cores": get_max_cores(),
         "max_memory": get_max_memory(),
-        "max_disk": get_max_disk(),
+        "max_disk": get_max_disk(partitions),
+        "partitions": partitions,
         "vm_list": get_vm_list() if running_on_hv else []
     }
+
+def get_static_facts(force=False):
+    """
+    Returns the cached static facts, re-detecting them when forced or older than STATIC_FACTS_REFRESH_INTERVAL.
+    Re-registers the machine if a refresh finds that something changed.
+    """
+    global _static_facts, _static_facts_checked_at
+    now = time.monotonic()
+    if force or _static_facts_checked_at is None or now - _static_facts_checked_at >= STATIC_FACTS_REFRESH_INTERVAL:
+        previous = _static_facts
+        _static_facts = detect_static_facts()
+        _static_facts_checked_at = now
+        if previous and previous != _static_facts and not force:
+            logger.info("Static facts changed, re-registering machine")
+            register_machine(_static_facts)
+    return _static_facts
+
+def register_machine(facts=None):
+    facts = facts or get_static_facts(force=True)
+    running_on_hv = facts["is_hypervisor"]
+    payload = {key: value for key, value in facts.items() if key != "partitions"}
     try:
-        response = requests.post(REGISTER_ENDPOINT, json=payload, timeout=3)
+        response = http_session.post(REGISTER_ENDPOINT, json=payload, timeout=3)
         logger.info(f"Registered machine: {payload['hostname']} (is_hypervisor={running_on_hv}) - Status: {response.status_code}")
         send_remote_log(f"Registered machine: {payload['hostname']} (is_hypervisor={running_on_hv}) - Status: {response.status_code}", level="INFO")
     except Exception as e:
         logger.error(f"Failed to register {payload['hostname']}: {e}")
         send_remote_log(f"Failed to register {payload['hostname']}: {e}", level="ERROR")
 
-def send_metrics():
-    running_on_hv = is_hypervisor()
-    payload = {
-        "hostname": get_hostname(),
+def collect_metrics():
+    facts = get_static_facts()
+    return {
+        "hostname": facts["hostname"],
         "timestamp": datetime.utcnow().isoformat() + "Z",
+        # Spooled with the sample, so a retried or replayed upload is recognised as a duplicate.
+        # Random rather than a counter, which would restart (and collide) if the spool were lost
+        "sample_id": random.getrandbits(63),
         "current_cpu_usage": get_current_cpu_usage(),
         "current_memory_usage": get_current_memory_usage(),
-        "current_disk_usage": get_current_disk_usage()
+        "current_disk_usage": get_current_disk_usage(facts["partitions"])
     }
-    try:
-        response = requests.post(API_ENDPOINT, json=payload, timeout=3)
-        logger.info(f"Sent metrics for {payload['hostname']} - Status: {response.status_code}")
-        logger.debug(f"Metrics payload: {json.dumps(payload)}")
-        send_remote_log(f"Sent metrics for {payload['hostname']} - Status: {response.status_code}", level="INFO")
-    except Exception as e:
-        logger.error(f"Failed to send metrics for {payload['hostname']}: {e}")
-        send_remote_log(f"Failed to send metrics for {payload['hostname']}: {e}", level="ERROR")
+
+def send_metrics():
+    """
+    Collects a sample and appends it to the durable spool. When no background uploader is
+    running (one-shot use), the spool is also drained inline.
+    """
+    payload = collect_metrics()
+    get_spool().append(payload)
+    logger.debug(f"Spooled metrics payload: {json.dumps(payload)}")
+    if _uploader is None or not _uploader.is_alive():
+        try:
+            upload_spool_batch()
+        except Exception as e:
+            logger.error(f"Failed to send metrics for {payload['hostname']}: {e}")
+            send_remote_log(f"Failed to send metrics for {payload['hostname']}: {e}", level="ERROR")
+
+# --- Durable Spool ---
+
+class MetricsSpool:
+    """
+    Append-only SQLite spool of samples waiting to be uploaded, capped at max_samples.
+    Samples survive agent and backend restarts and are removed only once the backend has accepted them.
+    The depth is counted once when the spool opens and then tracked in memory, so appends never scan the table.
+    """
+
+    def __init__(self, path=SPOOL_PATH, max_samples=SPOOL_MAX_SAMPLES):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.max_samples = max_samples
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS samples (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)")
+        self._conn.commit()
+        self._depth = self._conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+    def append(self, sample):
+        with self._lock:
+            self._conn.execute("INSERT INTO samples (payload) VALUES (?)", (json.dumps(sample),))
+            self._depth += 1
+            excess = self._depth - self.max_samples
+            if excess > 0:
+                self._conn.execute("DELETE FROM samples WHERE id IN (SELECT id FROM samples ORDER BY id LIMIT ?)", (excess,))
+                self._depth -= excess
+                self.dropped += excess
+                logger.warning(f"Spool full, dropped {excess} oldest sample(s)")
+            self._conn.commit()
+
+    def peek(self, limit):
+        """
+        Returns up to `limit` of the oldest samples as (last_id, [sample, ...]).
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT id, payload FROM samples ORDER BY id LIMIT ?", (limit,)).fetchall()
+        if not rows:
+            return None, []
+        return rows[-1][0], [json.loads(payload) for _, payload in rows]
+
+    def ack(self, last_id):
+        """
+        Removes every sample up to and including last_id.
+        """
+        with self._lock:
+            self._depth -= self._conn.execute("DELETE FROM samples WHERE id <= ?", (last_id,)).rowcount
+            self._conn.commit()
+
+    def depth(self):
+        with self._lock:
+            return self._depth
+
+_spool = None
+
+def get_spool():
+    global _spool
+    if _spool is None:
+        _spool = MetricsSpool()
+    return _spool
+
+# --- Batched Upload ---
+
+class UploadError(Exception):
+    """Raised when a batch could not be delivered and should be retried after a backoff."""
+
+def encode_upload(samples, upload_format=UPLOAD_FORMAT, encoding=UPLOAD_ENCODING):
+    """
+    Returns (body, headers) for a batch upload: the binary wire format when configured and available,
+    otherwise JSON (also used for batches the binary format cannot represent), compressed with gzip,
+    zstd (when installed, else gzip) or not at all.
+    """
+    body = None
+    if upload_format == "binary" and encode_samples is not None:
+        try:
+            body, content_type = encode_samples(samples), WIRE_MIMETYPE
+        except WireFormatError as e:
+            logger.warning(f"Sending batch as JSON, binary encoding failed: {e}")
+    if body is None:
+        body, content_type = json.dumps({"samples": samples}).encode("utf-8"), "application/json"
+    headers = {"Content-Type": content_type}
+    if encoding == "zstd" and zstandard is not None:
+        body = zstandard.ZstdCompressor().compress(body)
+        headers["Content-Encoding"] = "zstd"
+    elif encoding != "identity":
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+# Lowered whenever the backend answers 413, so later batches fit its request limits
+_batch_size_limit = None
+
+def upload_batch_size(batch_size=UPLOAD_BATCH_SIZE):
+    return min(batch_size, _batch_size_limit) if _batch_size_limit else batch_size
+
+# Set once the backend has refused the configured format or encoding but accepted gzip-compressed JSON
+_json_fallback = False
+_JSON_GZIP_HEADERS = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+def post_batch(samples):
+    """
+    Posts one batch in the configured upload format. A backend that cannot read it (415, or 400 from
+    a backend that predates the binary format or lacks zstd) gets the same batch again as
+    gzip-compressed JSON, which every backend reads; later batches then go out as JSON directly.
+    """
+    global _json_fallback
+    body, headers = encode_upload(samples, "json", "gzip") if _json_fallback else encode_upload(samples)
+    response = http_session.post(BATCH_API_ENDPOINT, data=body, headers=headers, timeout=10)
+    if response.status_code in (400, 415) and headers != _JSON_GZIP_HEADERS:
+        logger.warning(f"Backend answered {response.status_code} to {headers}, resending as gzip-compressed JSON")
+        body, headers = encode_upload(samples, "json", "gzip")
+        response = http_session.post(BATCH_API_ENDPOINT, data=body, headers=headers, timeout=10)
+        if response.status_code not in (400, 415):
+            _json_fallback = True
+    return response
+
+def upload_spool_batch(batch_size=UPLOAD_BATCH_SIZE):
+    """
+    Uploads the oldest spooled samples as one compressed batch (see encode_upload) and removes them
+    from the spool once the backend has answered. A batch answered 413 is halved and retried, and
+    only a single sample the backend still refuses is dropped. Returns the number of samples removed.
+    Raises UploadError (or a requests exception) when the batch should be retried.
+    """
+    global _batch_size_limit
+    spool = get_spool()
+    batch_size = upload_batch_size(batch_size)
+    while True:
+        last_id, samples = spool.peek(batch_size)
+        if not samples:
+            return 0
+        response = post_batch(samples)
+        if response.status_code != 413 or len(samples) == 1:
+            break
+        batch_size = _batch_size_limit = len(samples) // 2
+        logger.warning(f"Backend answered 413 to {len(samples)} samples, retrying with batches of {batch_size}")
+    if response.status_code in (200, 201):
+        results = response.json().get("results", [])
+        if any(r.get("message") == "Machine not registered" for r in results):
+            # The backend lost or never saw our registration; keep the batch and register again
+            register_machine()
+            raise UploadError("Machine not registered")
+        rejected = sum(1 for r in results if r.get("status") == "rejected")
+        if rejected:
+            logger.warning(f"Backend rejected {rejected} of {len(samples)} spooled samples")
+    elif response.status_code in UPLOAD_REJECTED_STATUSES:
+        # The batch itself is unacceptable; retrying it would never succeed
+        logger.error(f"Dropping {len(samples)} spooled samples, backend answered {response.status_code}")
+    else:
+        # 401/403/404/408/415/429/5xx and the like come from a backend that is redeploying, misrouted
+        # or overloaded, so the samples stay spooled until it accepts them
+        raise UploadError(f"Backend answered {response.status_code}")
+    spool.ack(last_id)
+    return len(samples)
+
+class SpoolUploader(threading.Thread):
+    """
+    Background thread draining the spool in batches, with exponential backoff while the backend
+    is unreachable. Logs upload throughput and spool depth every UPLOAD_STATS_LOG_INTERVAL seconds.
+    """
+
+    def __init__(self, batch_size=UPLOAD_BATCH_SIZE):
+        super().__init__(name="spool-uploader", daemon=True)
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.failures = 0
+        self.uploaded = 0
+
+    def run(self):
+        window_start = time.monotonic()
+        window_uploaded = 0
+        while not self.stop_event.is_set():
+            try:
+                uploaded = upload_spool_batch(self.batch_size)
+                self.failures = 0
+            except Exception as e:
+                self.failures += 1
+                delay = min(UPLOAD_BACKOFF_MAX, 2 ** (self.failures - 1)) * random.uniform(0.5, 1.0)
+                logger.error(f"Metrics upload failed ({e}), retrying in {delay:.1f}s")
+                uploaded = 0
+                self.stop_event.wait(delay)
+            self.uploaded += uploaded
+            window_uploaded += uploaded
+
+            elapsed = time.monotonic() - window_start
+            if elapsed >= UPLOAD_STATS_LOG_INTERVAL:
+                logger.info(
+                    f"Uploaded {window_uploaded} samples in {elapsed:.0f}s ({window_uploaded / elapsed:.1f}/s), "
+                    f"spool depth {get_spool().depth()}, dropped {get_spool().dropped}"
+                )
+                window_start = time.monotonic()
+                window_uploaded = 0
+
+            if uploaded < upload_batch_size(self.batch_size):
+                self.stop_event.wait(UPLOAD_IDLE_INTERVAL)
+
+_uploader = None
+
+def start_uploader():
+    global _uploader
+    if _uploader is None or not _uploader.is_alive():
+        _uploader = SpoolUploader()
+        _uploader.start()
+    return _uploader
+
+remote_log = RemoteLogBuffer(
+    LOGGING_BATCH_API_ENDPOINT,
+    user=get_hostname(),
+    session=http_session,
+    level=REMOTE_LOG_LEVEL,
+    interval=REMOTE_LOG_FLUSH_INTERVAL,
+    max_records=REMOTE_LOG_MAX_BUFFER
+)
 
 def send_remote_log(message, level="INFO"):
-    log_payload = {
-        "level": level,
-        "message": message,
-        "user": get_hostname()
-    }
-    try:
-        requests.post(LOGGING_API_ENDPOINT, json=log_payload, timeout=3)
-    except Exception as e:
-        logger.error(f"Failed to send remote log: {e}")
+    """
+    Queues a log line for the backend. Lines are sent in batches by the remote log flusher
+    and once more when the agent exits.
+    """
+    remote_log.add(message, level=level)
+
+# --- Collector Loop ---
+
+def run_collector(interval=SEND_METRICS_INTERVAL, max_ticks=None):
+    """
+    Sends a sample every `interval` seconds on a fixed monotonic schedule, so the period does not
+    drift by however long collection and sending take. Ticks that are already missed are skipped
+    rather than sent in a burst.
+    """
+    get_current_cpu_usage()  # prime the non-blocking CPU sampler
+    next_tick = time.monotonic()
+    ticks = 0
+    while max_ticks is None or ticks < max_ticks:
+        send_metrics()
+        ticks += 1
+        next_tick += interval
+        delay = next_tick - time.monotonic()
+        if delay < 0:
+            missed = int(-delay // interval) + 1
+            logger.warning(f"Collector fell behind by {-delay:.2f}s, skipping {missed} tick(s)")
+            next_tick += missed * interval
+            delay = next_tick - time.monotonic()
+        if max_ticks is None or ticks < max_ticks:
+            time.sleep(max(delay, 0))
 
 if __name__ == "__main__":
+    remote_log.start()
+    atexit.register(remote_log.stop)
     register_machine()
-    while True:
-        send_metrics()
-        time.sleep(SEND_METRICS_INTERVAL)
\ No newline at end of file
+    start_uploader()
+    run_collector()
\ No newline at end of file
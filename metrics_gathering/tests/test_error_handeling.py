@@ -1,9 +1,17 @@
+import pytest
 from metrics_gathering import metrics_agent
 from unittest.mock import patch
 
-def test_send_metrics_network_failure():
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    """Fixture pointing the agent's spool at a temporary file instead of spool/ under the working directory."""
+    spool = metrics_agent.MetricsSpool(str(tmp_path / 'spool.db'))
+    monkeypatch.setattr(metrics_agent, '_spool', spool)
+    return spool
+
+def test_send_metrics_network_failure(spool):
     """Test that send_metrics handles network failures gracefully."""
-    with patch('metrics_gathering.metrics_agent.requests.post', side_effect=Exception("Network error")):
+    with patch('metrics_gathering.metrics_agent.http_session.post', side_effect=Exception("Network error")):
         try:
             metrics_agent.send_metrics()
         except Exception:
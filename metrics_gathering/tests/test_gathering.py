@@ -1,5 +1,13 @@
+import pytest
 from metrics_gathering import metrics_agent
 
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    """Fixture pointing the agent's spool at a temporary file instead of spool/ under the working directory."""
+    spool = metrics_agent.MetricsSpool(str(tmp_path / 'spool.db'))
+    monkeypatch.setattr(metrics_agent, '_spool', spool)
+    return spool
+
 def test_get_current_cpu_usage():
     """Test that CPU usage is a number between 0 and 100."""
     usage = metrics_agent.get_current_cpu_usage()
@@ -9,4 +17,33 @@ def test_get_current_cpu_usage():
 def test_get_current_memory_usage():
     """Test that memory usage dict contains expected keys."""
     mem = metrics_agent.get_current_memory_usage()
-    assert 'total' in mem and 'used' in mem and 'percent' in mem
\ No newline at end of file
+    assert 'total' in mem and 'used' in mem and 'percent' in mem
+
+def test_static_facts_are_cached_between_ticks(spool):
+    """Test that hypervisor detection is not repeated on every metrics tick."""
+    from unittest.mock import patch
+    metrics_agent.get_static_facts(force=True)
+    with patch('metrics_gathering.metrics_agent.is_hypervisor') as mock_is_hv, \
+         patch('metrics_gathering.metrics_agent.http_session.post'):
+        metrics_agent.send_metrics()
+        metrics_agent.send_metrics()
+        assert not mock_is_hv.called
+
+def test_collector_keeps_a_fixed_cadence():
+    """Test that slow collection does not stretch the period between ticks."""
+    from unittest.mock import patch
+    clock = {'now': 0.0}
+    sleeps = []
+
+    def fake_send():
+        clock['now'] += 0.3  # collection and sending take 0.3s
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock['now'] += seconds
+
+    with patch('metrics_gathering.metrics_agent.send_metrics', side_effect=fake_send), \
+         patch('metrics_gathering.metrics_agent.time.monotonic', side_effect=lambda: clock['now']), \
+         patch('metrics_gathering.metrics_agent.time.sleep', side_effect=fake_sleep):
+        metrics_agent.run_collector(interval=1, max_ticks=3)
+    assert [round(s, 6) for s in sleeps] == [0.7, 0.7]
@@ -0,0 +1,64 @@
+import threading
+from unittest.mock import MagicMock
+from metrics_gathering import generate_test_metrics as generator
+
+def test_build_machines_counts_hvs_and_vms():
+    """Test that every HV is followed by its VMs and lists them for registration."""
+    machines = generator.build_machines(num_hvs=2, vms_per_hv=3)
+    assert len(machines) == 8
+    assert machines[0] == ('hv-1', True, ['hv-1-vm-1', 'hv-1-vm-2', 'hv-1-vm-3'])
+
+def test_registration_facts_are_stable_per_hostname():
+    """Test that re-registering a simulated machine sends identical facts, so the backend can skip the write."""
+    session = MagicMock()
+    session.post.return_value.status_code = 200
+    for _ in range(2):
+        generator.register_machine('hv-1', True, ['hv-1-vm-1'], session=session)
+        generator.register_machine('hv-1-vm-1', session=session)
+    first_hv, first_vm, second_hv, second_vm = [call.kwargs['json'] for call in session.post.call_args_list]
+    assert (first_hv, first_vm) == (second_hv, second_vm)
+    assert first_hv['max_cores'] >= 8 and first_vm['max_cores'] <= 8
+
+def test_sender_batches_and_report():
+    """Test that a batch-mode sender groups samples per request and the report summarises them."""
+    session = MagicMock()
+    session.post.return_value.status_code = 201
+    # 201 even though the server rejected one sample and skipped one as a duplicate
+    session.post.return_value.json.return_value = {'accepted': 3, 'rejected': 1, 'new': 2, 'duplicates': 1}
+    stop_event = threading.Event()
+    calls = []
+
+    def post(url, **kwargs):
+        calls.append(kwargs['json']['samples'])
+        if len(calls) == 3:
+            stop_event.set()
+        return session.post.return_value
+
+    session.post.side_effect = post
+    machines = generator.build_machines(num_hvs=1, vms_per_hv=4)
+    results = generator.run_sender(machines, 'batch', 4, 0, None, stop_event, session=session)
+    assert results['requests'] == 3
+    assert results['samples'] == 12
+    assert [s['hostname'] for s in calls[1]] == ['hv-1-vm-4', 'hv-1', 'hv-1-vm-1', 'hv-1-vm-2']
+
+    report = generator.build_report(results, 2.0, {'mode': 'batch'})
+    assert report['samples_sent'] == 12
+    assert (report['samples_accepted'], report['samples_rejected']) == (9, 3)
+    assert (report['samples_new'], report['samples_duplicate']) == (6, 3)
+    assert report['samples_per_second'] == 4.5
+    assert report['new_samples_per_second'] == 3.0
+    assert report['errors']['rate'] == 0.0
+    assert report['latency_ms']['p50'] is not None
+
+def test_single_sample_outcomes():
+    """Test that single-sample responses count as accepted or rejected as a whole."""
+    assert generator.response_outcomes(201, {'new': 0, 'duplicates': 1}, 1) == \
+        {'accepted': 1, 'rejected': 0, 'new': 0, 'duplicates': 1}
+    assert generator.response_outcomes(400, {'status': 'error'}, 1)['rejected'] == 1
+
+def test_percentile_nearest_rank():
+    """Test the nearest-rank percentile used for latency reporting."""
+    values = list(range(1, 101))
+    assert generator.percentile(values, 50) == 50
+    assert generator.percentile(values, 99) == 99
+    assert generator.percentile([], 50) is None
@@ -1,9 +1,31 @@
+import pytest
 from metrics_gathering import metrics_agent
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
-def test_send_metrics_network():
-    """Test that send_metrics calls requests.post (network call is mocked)."""
-    with patch('metrics_gathering.metrics_agent.requests.post') as mock_post:
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    """Fixture pointing the agent's spool at a temporary file instead of spool/ under the working directory."""
+    spool = metrics_agent.MetricsSpool(str(tmp_path / 'spool.db'))
+    monkeypatch.setattr(metrics_agent, '_spool', spool)
+    return spool
+
+def test_send_metrics_network(spool):
+    """Test that send_metrics posts through the shared session (network call is mocked)."""
+    with patch('metrics_gathering.metrics_agent.http_session.post') as mock_post:
         mock_post.return_value.status_code = 201
         metrics_agent.send_metrics()
-        assert mock_post.called
\ No newline at end of file
+        assert mock_post.called
+
+def test_remote_logs_are_batched_and_filtered():
+    """Test that remote log lines below the remote level stay local and the rest go out in one request."""
+    from metrics_gathering.agent_http import RemoteLogBuffer
+    session = MagicMock()
+    buffer = RemoteLogBuffer('http://backend/api/logging/frontend_log/batch', user='host', session=session, level='WARNING')
+    assert not buffer.add('Sent metrics', level='INFO')
+    buffer.add('disk nearly full', level='WARNING')
+    buffer.add('upload failed', level='ERROR')
+    assert buffer.flush() == 2
+    assert session.post.call_count == 1
+    logs = session.post.call_args.kwargs['json']['logs']
+    assert [entry['level'] for entry in logs] == ['WARNING', 'ERROR']
+    assert buffer.flush() == 0
@@ -0,0 +1,125 @@
+import gzip
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from metrics_gathering import metrics_agent
+from core.wire_format import WIRE_MIMETYPE, WireFormatError, decode_samples, encode_samples
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    """Fixture pointing the agent's spool at a temporary file instead of spool/ under the working directory."""
+    spool = metrics_agent.MetricsSpool(str(tmp_path / 'spool.db'))
+    monkeypatch.setattr(metrics_agent, '_spool', spool)
+    return spool
+
+def test_spool_caps_size_and_acks_in_order(tmp_path):
+    """Test that the spool drops the oldest samples beyond its cap and acks by id."""
+    spool = metrics_agent.MetricsSpool(str(tmp_path / 'spool.db'), max_samples=3)
+    for i in range(5):
+        spool.append({'n': i})
+    assert spool.depth() == 3
+    assert spool.dropped == 2
+    last_id, samples = spool.peek(2)
+    assert [s['n'] for s in samples] == [2, 3]
+    spool.ack(last_id)
+    assert [s['n'] for s in spool.peek(10)[1]] == [4]
+    assert spool.depth() == 1
+    # The in-memory depth is seeded from the file when the spool is reopened
+    assert metrics_agent.MetricsSpool(str(tmp_path / 'spool.db'), max_samples=3).depth() == 1
+
+def test_failed_upload_keeps_samples_spooled(spool):
+    """Test that samples stay spooled while the backend is unreachable and are sent gzip-compressed later."""
+    with patch('metrics_gathering.metrics_agent.http_session.post', side_effect=Exception("Network error")):
+        metrics_agent.send_metrics()
+        metrics_agent.send_metrics()
+    assert spool.depth() == 2
+
+    with patch('metrics_gathering.metrics_agent.http_session.post') as mock_post:
+        mock_post.return_value.status_code = 201
+        mock_post.return_value.json.return_value = {'results': [{'status': 'accepted'}] * 2}
+        assert metrics_agent.upload_spool_batch() == 2
+    assert spool.depth() == 0
+    kwargs = mock_post.call_args.kwargs
+    assert kwargs['headers'] == {'Content-Type': WIRE_MIMETYPE, 'Content-Encoding': 'gzip'}
+    assert len(decode_samples(gzip.decompress(kwargs['data']))) == 2
+
+@pytest.mark.parametrize('status, kept', [(404, 1), (401, 1), (408, 1), (415, 1), (413, 0), (400, 0)])
+def test_upload_retries_unless_the_batch_is_rejected(spool, status, kept):
+    """Test that only 400, or 413 for a single sample, drop a spooled batch; other errors keep it for a retry."""
+    spool.append({'hostname': 'agent-vm', 'current_cpu_usage': 1.0})
+    with patch('metrics_gathering.metrics_agent.http_session.post') as mock_post:
+        mock_post.return_value.status_code = status
+        if kept:
+            with pytest.raises(metrics_agent.UploadError):
+                metrics_agent.upload_spool_batch()
+        else:
+            assert metrics_agent.upload_spool_batch() == 1
+    assert spool.depth() == kept
+
+def test_too_large_batches_are_halved(spool, monkeypatch):
+    """Test that a 413 halves the batch until the backend accepts it, instead of dropping the samples."""
+    monkeypatch.setattr(metrics_agent, '_batch_size_limit', None)
+    too_large = MagicMock(status_code=413)
+    accepted = MagicMock(status_code=201)
+    accepted.json.return_value = {'results': [{'status': 'accepted'}]}
+    for i in range(5):
+        spool.append({'hostname': 'agent-vm', 'current_cpu_usage': float(i)})
+    sizes = []
+
+    def post(url, data, headers, timeout):
+        sizes.append(len(decode_samples(gzip.decompress(data))))
+        return too_large if sizes[-1] > 2 else accepted
+
+    with patch('metrics_gathering.metrics_agent.http_session.post', side_effect=post):
+        assert metrics_agent.upload_spool_batch() == 2
+        assert metrics_agent.upload_spool_batch() == 2
+    assert sizes == [5, 2, 2]
+    assert spool.depth() == 1
+    assert metrics_agent.upload_batch_size() == 2
+
+def test_unsupported_format_is_resent_as_gzip_json(spool, monkeypatch):
+    """Test that a 415 makes the agent resend the same batch as gzip JSON, and keep using JSON afterwards."""
+    monkeypatch.setattr(metrics_agent, '_json_fallback', False)
+    unsupported = MagicMock(status_code=415)
+    accepted = MagicMock(status_code=201)
+    accepted.json.return_value = {'results': [{'status': 'accepted'}]}
+    json_gzip = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+    spool.append({'hostname': 'agent-vm', 'current_cpu_usage': 1.0})
+    with patch('metrics_gathering.metrics_agent.http_session.post', side_effect=[unsupported, accepted]) as mock_post:
+        assert metrics_agent.upload_spool_batch() == 1
+    assert spool.depth() == 0
+    assert [call.kwargs['headers'] for call in mock_post.call_args_list] == [
+        {'Content-Type': WIRE_MIMETYPE, 'Content-Encoding': 'gzip'}, json_gzip
+    ]
+
+    spool.append({'hostname': 'agent-vm', 'current_cpu_usage': 2.0})
+    with patch('metrics_gathering.metrics_agent.http_session.post', return_value=accepted) as mock_post:
+        assert metrics_agent.upload_spool_batch() == 1
+    assert mock_post.call_args.kwargs['headers'] == json_gzip
+
+def test_encode_upload_formats():
+    """Test that uploads can be sent as binary or JSON, compressed or not, and decode to the same samples."""
+    sample = {
+        'hostname': 'agent-vm', 'timestamp': '2024-01-01T00:00:00.250000Z', 'sample_id': 7,
+        'current_cpu_usage': 12.5, 'current_memory_usage': {'total': 8, 'used': 4, 'percent': 50.0},
+        'current_disk_usage': [{'mountpoint': '/', 'total': 100, 'used': None, 'percent': 10.0}]
+    }
+    binary, headers = metrics_agent.encode_upload([sample], upload_format='binary', encoding='identity')
+    assert headers == {'Content-Type': WIRE_MIMETYPE}
+    decoded = decode_samples(binary)[0]
+    assert decoded['timestamp'].isoformat() == '2024-01-01T00:00:00.250000'
+    assert dict(decoded, timestamp=sample['timestamp']) == sample
+
+    body, headers = metrics_agent.encode_upload([sample], upload_format='json', encoding='gzip')
+    assert headers == {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+    assert json.loads(gzip.decompress(body)) == {'samples': [sample]}
+    assert len(binary) < len(json.dumps(sample))
+
+def test_oversized_strings_fall_back_to_json():
+    """Test that a mountpoint too long for the binary string table raises WireFormatError and is sent as JSON."""
+    sample = {'hostname': 'agent-vm', 'current_disk_usage': [{'mountpoint': '/' + 'x' * 70000, 'total': 1}]}
+    with pytest.raises(WireFormatError):
+        encode_samples([sample])
+    body, headers = metrics_agent.encode_upload([sample], upload_format='binary', encoding='identity')
+    assert headers == {'Content-Type': 'application/json'}
+    assert json.loads(body) == {'samples': [sample]}